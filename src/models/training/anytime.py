@@ -0,0 +1,172 @@
+"""Train the forest and boosting models inside a wall-clock budget.
+
+Each model starts with a one-tree (or one-stage) probe fit and grows with
+warm_start: the forest gains `--step` trees per round, boosting gains `--step`
+stages. The time per tree measured on the previous round decides whether the
+next one fits before the deadline; a round that would not is shortened to the
+trees that do. If the budget is already spent before the probe, nothing is
+fitted or saved. The model is saved
+(atomically, so the artifact is always loadable) every `--checkpoint-every`
+seconds and once more at the end. Boosting also stops early once the hist
+engine's own early stopping ends the fit before it reaches max_iter.
+
+The overall budget covers data preparation and is split across models when
+there are more models than worker processes. Progress is written to
+<model>_anytime.json.
+
+    python src/models/training/anytime.py --budget 600
+    python src/models/training/anytime.py --models rf --budget 120 --step 25
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sklearn.metrics import accuracy_score
+
+from artifacts import save_json, save_model
+from model_registry import register_model
+from train import imputes, load_shared_data, prepare_shared_data, resolve_models, trainer_module
+
+
+SUPPORTED = ('random_forest', 'gradient_boosted_trees')
+DEFAULT_STEP = {'random_forest': 20, 'gradient_boosted_trees': 25}
+
+
+def _size(model):
+	"""Trees or stages fitted so far."""
+	if hasattr(model, 'n_iter_'):
+		return int(model.n_iter_)
+	return len(model.estimators_)
+
+
+def _grow(model, size: int):
+	if hasattr(model, 'max_iter'):
+		model.set_params(max_iter=size)
+	else:
+		model.set_params(n_estimators=size)
+	return model
+
+
+def train_within_budget(name: str, work_dir: str, budget: float, step: int = None, checkpoint_every: float = 60.0,
+                        max_size: int = None, models_dir: str = None, params: dict = None):
+	"""Grow one model until the next round would overrun `budget` seconds; returns the progress log.
+
+	With no time left for even the probe round, the result reports zero rounds and
+	the saved artifact is left untouched.
+	"""
+	deadline = time.perf_counter() + budget
+	module = trainer_module(name)
+	impute = imputes(name, params)
+	X_train, X_test, y_train, y_test, _ = load_shared_data(work_dir, module.FEATURES, impute)
+	step = step or DEFAULT_STEP[name]
+
+	def save_and_register():
+		# Checkpoints are registered too, so load_cached serves the best model so far.
+		path = save_model(model, name, models_dir)
+		register_model(path, name, model, module.FEATURES, X_train,
+		               metrics={'accuracy': history[-1]['accuracy'], 'size': size, 'n_train': int(len(y_train)),
+		                        'n_test': int(len(y_test))},
+		               params=params, imputation='mean' if impute else 'none', models_dir=models_dir)
+		return path
+
+	model = _grow(module.build_model(**(params or {})), 1)
+	model.set_params(warm_start=True)
+	history = []
+	size = 0
+	unit_seconds = save_seconds = 0.0
+	last_checkpoint = time.perf_counter()
+	stopped = 'budget'
+	while time.perf_counter() < deadline:
+		start = time.perf_counter()
+		model.fit(X_train, y_train)
+		added, size = _size(model) - size, _size(model)
+		history.append({'size': size, 'elapsed': budget - (deadline - time.perf_counter()),
+		                'accuracy': float(accuracy_score(y_test, model.predict(X_test)))})
+		unit_seconds = (time.perf_counter() - start) / max(added, 1)
+
+		if hasattr(model, 'max_iter') and size < model.max_iter:
+			stopped = 'early_stopping'
+			break
+		if max_size and size >= max_size:
+			stopped = 'max_size'
+			break
+		# A round that would not fit in the remaining time is shortened to what does.
+		left = deadline - time.perf_counter() - save_seconds
+		grow = min(step, int(left / unit_seconds) if unit_seconds > 0 else step)
+		if grow < 1:
+			break
+		next_size = size + grow if not max_size else min(size + grow, max_size)
+		if time.perf_counter() - last_checkpoint >= checkpoint_every:
+			start = time.perf_counter()
+			save_and_register()
+			save_seconds = time.perf_counter() - start
+			last_checkpoint = time.perf_counter()
+			history[-1]['checkpoint'] = True
+		_grow(model, next_size)
+
+	path = None
+	if history:
+		model.set_params(warm_start=False)
+		path = save_and_register()
+	result = {
+		'model': name,
+		'budget_seconds': budget,
+		'elapsed_seconds': budget - (deadline - time.perf_counter()),
+		'rounds': len(history),
+		'size': size,
+		'accuracy': history[-1]['accuracy'] if history else None,
+		'stopped': stopped,
+		'model_path': path,
+		'history': history,
+	}
+	save_json(result, name, 'anytime', models_dir)
+	return result
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--models', nargs='+', default=['rf', 'gbt'])
+	parser.add_argument('--budget', type=float, required=True, help='total wall-clock seconds')
+	parser.add_argument('--step', type=int, default=None, help='trees / stages added per round')
+	parser.add_argument('--max-size', type=int, default=None, help='stop at this many trees / stages')
+	parser.add_argument('--checkpoint-every', type=float, default=60.0, help='seconds between checkpoint saves')
+	parser.add_argument('--workers', type=int, default=None)
+	parser.add_argument('--seed', type=int, default=42, help='train/test split seed (match train.py)')
+	parser.add_argument('--data', default=None)
+	parser.add_argument('--models-dir', default=None)
+	args = parser.parse_args(argv)
+
+	start = time.perf_counter()
+	models = [m for m in resolve_models(args.models) if m in SUPPORTED]
+	workers = args.workers or min(len(models), os.cpu_count() or 1)
+	work_dir = tempfile.mkdtemp(prefix='exoura_anytime_')
+	try:
+		prepare_shared_data(models, work_dir, seed=args.seed, csv_path=args.data)
+		# Models beyond the worker count queue behind the others, so each gets a share of what is left.
+		remaining = args.budget - (time.perf_counter() - start)
+		share = remaining * min(1.0, workers / len(models))
+		print(f"{remaining:.1f}s left after data preparation; {share:.1f}s per model")
+		results = []
+		with ProcessPoolExecutor(max_workers=workers) as pool:
+			futures = [pool.submit(train_within_budget, name, work_dir, share, args.step, args.checkpoint_every,
+			                       args.max_size, args.models_dir) for name in models]
+			for future in as_completed(futures):
+				r = future.result()
+				if not r['rounds']:
+					print(f"  {r['model']}: no time left for a first round; kept the saved model")
+					results.append(r)
+					continue
+				print(f"  {r['model']}: {r['size']} trees/stages, accuracy={r['accuracy']:.4f} "
+				      f"in {r['elapsed_seconds']:.1f}s (stopped: {r['stopped']})")
+				results.append(r)
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+	print(f"Finished in {time.perf_counter() - start:.1f}s of a {args.budget:.0f}s budget")
+	return results
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,82 @@
+import io
+import json
+import os
+
+import joblib
+
+from catalog_cache import get_project_root
+
+
+def get_models_dir(models_dir: str = None):
+	models_dir = models_dir or os.path.join(get_project_root(), 'src', 'models', 'trained_models')
+	os.makedirs(models_dir, exist_ok=True)
+	return models_dir
+
+
+def model_path(name: str, models_dir: str = None):
+	return os.path.join(get_models_dir(models_dir), f'{name}_model.joblib')
+
+
+def confusion_matrix_path(name: str, models_dir: str = None):
+	return os.path.join(get_models_dir(models_dir), f'{name}_confusion_matrix.txt')
+
+
+def save_model(model, name: str, models_dir: str = None):
+	"""Dump to a temporary file and rename, so readers never see a half-written model."""
+	path = model_path(name, models_dir)
+	joblib.dump(model, path + '.tmp')
+	os.replace(path + '.tmp', path)
+	return path
+
+
+def model_size_bytes(model):
+	"""Size of the model as joblib would write it."""
+	buf = io.BytesIO()
+	joblib.dump(model, buf)
+	return buf.tell()
+
+
+def save_confusion_matrix(labels, cnf_matrix, name: str, models_dir: str = None):
+	"""Save a confusion matrix as raw text (TSV)."""
+	path = confusion_matrix_path(name, models_dir)
+	labels = list(labels)
+	with open(path, 'w', encoding='utf-8') as f:
+		f.write('label\t' + '\t'.join(str(l) for l in labels) + '\n')
+		for i, lab in enumerate(labels):
+			row_vals = '\t'.join(str(int(v)) for v in cnf_matrix[i])
+			f.write(f"{lab}\t{row_vals}\n")
+	return path
+
+
+def save_json(payload: dict, name: str, kind: str, models_dir: str = None):
+	"""Write a per-model run artifact such as <name>_loss_curve.json."""
+	path = os.path.join(get_models_dir(models_dir), f'{name}_{kind}.json')
+	with open(path, 'w', encoding='utf-8') as f:
+		json.dump(payload, f, indent=2)
+	return path
+
+
+def holdout_path(name: str, models_dir: str = None):
+	return os.path.join(get_models_dir(models_dir), f'{name}_holdout.json')
+
+
+def load_holdout(name: str, models_dir: str = None):
+	"""Row keys of the train/test split the saved model was fit on, or None for older artifacts."""
+	path = holdout_path(name, models_dir)
+	if not os.path.exists(path):
+		return None
+	with open(path, 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+def best_params_path(name: str, models_dir: str = None):
+	return os.path.join(get_models_dir(models_dir), f'{name}_best_params.json')
+
+
+def load_best_params(name: str, models_dir: str = None):
+	"""Hyperparameters chosen by tune.py, or None if the model has not been tuned."""
+	path = best_params_path(name, models_dir)
+	if not os.path.exists(path):
+		return None
+	with open(path, 'r', encoding='utf-8') as f:
+		return json.load(f)['params']
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from catalog_validation import load_rejected_mask, validate_frame, write_report
+from koi_schema import KOI_COLUMNS, column_dtype, is_label, label_categories, label_code_dtype
+
+
+CACHE_VERSION = 3
+MANIFEST_NAME = 'manifest.json'
+BUILD_CHUNKSIZE = 50_000
+
+
+def get_project_root():
+	training_dir = os.path.dirname(os.path.abspath(__file__))
+	src_dir = os.path.dirname(os.path.dirname(training_dir))
+	return os.path.dirname(src_dir)
+
+
+def default_catalog_path():
+	return os.path.join(get_project_root(), 'src', 'data', 'keplar.csv')
+
+
+def default_cache_dir(csv_path: str):
+	"""Cache lives next to the CSV: src/data/cache/<csv stem>/"""
+	stem = os.path.splitext(os.path.basename(csv_path))[0]
+	return os.path.join(os.path.dirname(os.path.abspath(csv_path)), 'cache', stem)
+
+
+def delta_store_dir(cache_dir: str):
+	"""Ingested deltas are kept beside the cache (<cache dir>.deltas/) so a rebuild never deletes them."""
+	return os.path.abspath(cache_dir) + '.deltas'
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20):
+	h = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(chunk_size), b''):
+			h.update(block)
+	return h.hexdigest()
+
+
+def _column_filename(col: str):
+	return col.replace(os.sep, '_') + '.npy'
+
+
+def _scan_csv(csv_path: str, chunksize: int):
+	"""First pass over the CSV: column order, row count, and per-column kind and category labels.
+
+	A column is numeric when it is a schema column or every non-null value parses
+	as a number; label columns and any other text column become category codes.
+	"""
+	columns, n_rows = None, 0
+	parses, values = {}, {}
+	for chunk in pd.read_csv(csv_path, comment='#', chunksize=chunksize, low_memory=False):
+		columns = columns or list(chunk.columns)
+		n_rows += len(chunk)
+		for col in chunk.columns:
+			series = chunk[col]
+			if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+				continue
+			if not is_label(col):
+				numeric = pd.to_numeric(series, errors='coerce')
+				parses[col] = parses.get(col, True) and numeric.notna().sum() == series.notna().sum()
+			values.setdefault(col, set()).update(series.dropna().astype('string').str.strip().unique())
+
+	meta = {}
+	for col in columns or []:
+		if is_label(col):
+			categories = label_categories(col, values.get(col, ()))
+			meta[col] = {'kind': 'category', 'categories': categories, 'dtype': str(label_code_dtype(categories))}
+		elif col in KOI_COLUMNS or parses.get(col, True):
+			meta[col] = {'kind': 'numeric', 'dtype': str(column_dtype(col))}
+		else:
+			meta[col] = {'kind': 'category', 'categories': sorted(values[col]), 'dtype': 'int32'}
+		meta[col]['file'] = _column_filename(col)
+	return meta, n_rows
+
+
+def _encode_chunk(series: pd.Series, meta: dict):
+	"""Encode one chunk of a column as _scan_csv decided: typed floats, or category codes (-1 = missing)."""
+	if meta['kind'] == 'numeric':
+		return pd.to_numeric(series, errors='coerce').to_numpy(dtype=meta['dtype'], na_value=np.nan)
+	cat = pd.Categorical(series.astype('string').str.strip(), categories=meta['categories'])
+	return np.asarray(cat.codes, dtype=meta['dtype'])
+
+
+def read_manifest(cache_dir: str):
+	path = os.path.join(cache_dir, MANIFEST_NAME)
+	if not os.path.exists(path):
+		return None
+	try:
+		with open(path, 'r', encoding='utf-8') as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+
+
+def write_manifest(cache_dir: str, manifest: dict):
+	tmp_path = os.path.join(cache_dir, MANIFEST_NAME + '.tmp')
+	with open(tmp_path, 'w', encoding='utf-8') as f:
+		json.dump(manifest, f, indent=2)
+	os.replace(tmp_path, os.path.join(cache_dir, MANIFEST_NAME))
+
+
+def build_cache(csv_path: str, cache_dir: str, chunksize: int = BUILD_CHUNKSIZE):
+	"""Parse the CSV in chunks and write one .npy file per column plus a manifest.
+
+	A first pass settles each column's kind and category labels; a second writes
+	every chunk into preallocated column files, so memory is bounded by the chunk
+	size (plus the distinct values of text columns), never the whole catalog.
+	Each raw chunk is validated before encoding; the report and rejected-row mask
+	are written alongside the columns. Deltas ingested into the previous cache are
+	replayed from the delta store before the new cache is installed.
+	"""
+	stat = os.stat(csv_path)
+
+	# Each builder gets its own temp dir, so concurrent builds never delete each other's work.
+	parent = os.path.dirname(os.path.abspath(cache_dir))
+	os.makedirs(parent, exist_ok=True)
+	tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(cache_dir) + '.building-', dir=parent)
+	try:
+		manifest = _write_cache(csv_path, stat, tmp_dir, chunksize)
+		store_dir = delta_store_dir(cache_dir)
+		if os.path.isdir(store_dir):
+			from delta_ingest import replay_deltas  # delta_ingest imports this module
+			manifest = replay_deltas(tmp_dir, manifest, store_dir)
+	except BaseException:
+		shutil.rmtree(tmp_dir, ignore_errors=True)
+		raise
+	install_cache(tmp_dir, cache_dir)
+	return manifest
+
+
+def install_cache(tmp_dir: str, cache_dir: str, keep_existing: bool = True):
+	"""Move a finished build into place, setting any previous cache aside first.
+
+	If another writer installs a cache in between, theirs is kept and `tmp_dir`
+	discarded; with keep_existing=False that is an error instead.
+	"""
+	parent = os.path.dirname(os.path.abspath(cache_dir))
+	old_dir = None
+	if os.path.exists(cache_dir):
+		old_dir = tempfile.mkdtemp(prefix=os.path.basename(cache_dir) + '.old-', dir=parent)
+		try:
+			os.replace(cache_dir, old_dir)
+		except FileNotFoundError:
+			pass  # another builder already moved it
+	try:
+		os.replace(tmp_dir, cache_dir)
+	except OSError:
+		# Another builder installed the same CSV's cache first; keep theirs.
+		shutil.rmtree(tmp_dir, ignore_errors=True)
+		if not keep_existing:
+			raise
+	finally:
+		if old_dir is not None:
+			shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def _write_cache(csv_path: str, stat, tmp_dir: str, chunksize: int):
+	columns, n_rows = _scan_csv(csv_path, chunksize)
+	arrays = {
+		col: np.lib.format.open_memmap(os.path.join(tmp_dir, meta['file']), mode='w+', dtype=meta['dtype'],
+		                               shape=(n_rows,))
+		for col, meta in columns.items()
+	}
+	rules, masks = {}, {}
+	rejected = np.zeros(n_rows, dtype=bool)
+	flagged = np.zeros(n_rows, dtype=bool)
+	start = 0
+	for chunk in pd.read_csv(csv_path, comment='#', chunksize=chunksize, low_memory=False):
+		stop = start + len(chunk)
+		for col, meta in columns.items():
+			arrays[col][start:stop] = _encode_chunk(chunk[col], meta)
+		chunk_rules, chunk_masks, chunk_rejected, chunk_flagged = validate_frame(chunk)
+		for rule, mask in zip(chunk_rules, chunk_masks):
+			rules.setdefault(rule.name, rule)
+			masks.setdefault(rule.name, np.zeros(n_rows, dtype=bool))[start:stop] = mask
+		rejected[start:stop] = chunk_rejected
+		flagged[start:stop] = chunk_flagged
+		start = stop
+	for arr in arrays.values():
+		arr.flush()
+	del arrays
+
+	validation = write_report(tmp_dir, list(rules.values()), list(masks.values()), rejected, flagged,
+	                          source=os.path.abspath(csv_path))
+	manifest = {
+		'version': CACHE_VERSION,
+		'source': os.path.abspath(csv_path),
+		'size': stat.st_size,
+		'mtime_ns': stat.st_mtime_ns,
+		'sha256': file_sha256(csv_path),
+		'n_rows': int(n_rows),
+		'columns': columns,
+		'validation': validation,
+	}
+	write_manifest(tmp_dir, manifest)
+	return manifest
+
+
+def ensure_cache(csv_path: str = None, cache_dir: str = None):
+	"""Return (cache_dir, manifest), rebuilding the cache if the CSV changed.
+
+	A matching size and mtime is trusted as-is. If the mtime moved, the file is
+	re-hashed and the cache is only rebuilt when the content actually changed.
+	"""
+	csv_path = csv_path or default_catalog_path()
+	cache_dir = cache_dir or default_cache_dir(csv_path)
+	manifest = read_manifest(cache_dir)
+	stat = os.stat(csv_path)
+
+	if manifest is not None and manifest.get('version') == CACHE_VERSION:
+		if manifest['size'] == stat.st_size and manifest['mtime_ns'] == stat.st_mtime_ns:
+			return cache_dir, manifest
+		if manifest['size'] == stat.st_size and manifest['sha256'] == file_sha256(csv_path):
+			manifest['mtime_ns'] = stat.st_mtime_ns
+			write_manifest(cache_dir, manifest)
+			return cache_dir, manifest
+
+	return cache_dir, build_cache(csv_path, cache_dir)
+
+
+def load_column(cache_dir: str, manifest: dict, col: str, mmap: bool = True):
+	meta = manifest['columns'][col]
+	arr = np.load(os.path.join(cache_dir, meta['file']), mmap_mode='r' if mmap else None)
+	if meta['kind'] == 'category':
+		return pd.Categorical.from_codes(np.asarray(arr), categories=meta['categories'])
+	return arr
+
+
+def load_columns(columns, csv_path: str = None, cache_dir: str = None, mmap: bool = True, drop_rejected: bool = False):
+	"""Load only the requested columns from the cached catalog as a DataFrame.
+
+	With drop_rejected=True, rows that failed ingest validation are left out.
+	"""
+	cache_dir, manifest = ensure_cache(csv_path, cache_dir)
+	missing = [c for c in columns if c not in manifest['columns']]
+	if missing:
+		raise KeyError(f"Columns not in catalog: {missing}")
+	data = {col: load_column(cache_dir, manifest, col, mmap=mmap) for col in columns}
+	df = pd.DataFrame(data, columns=list(columns))
+	if drop_rejected:
+		rejected = load_rejected_mask(cache_dir)
+		if rejected is not None:
+			df = df[~rejected].reset_index(drop=True)
+	return df
+
+
+def catalog_columns(csv_path: str = None, cache_dir: str = None):
+	_, manifest = ensure_cache(csv_path, cache_dir)
+	return list(manifest['columns'])
+
+
+if __name__ == "__main__":
+	cache_dir, manifest = ensure_cache()
+	print(f"Catalog cache ready: {cache_dir} ({manifest['n_rows']} rows, {len(manifest['columns'])} columns)")
@@ -0,0 +1,140 @@
+import json
+import os
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from koi_schema import KOI_COLUMNS, R_EARTH_IN_R_SUN
+
+
+REPORT_NAME = 'validation.json'
+ROWS_NAME = 'validation_rows.npz'
+REJECTED_NAME = 'rejected.npy'
+
+REJECT = 'reject'
+FLAG = 'flag'
+
+# Flag rows whose measured depth and (Rp/R*)^2 disagree by more than this factor.
+DEPTH_RADIUS_TOLERANCE = 10.0
+
+
+class Rule(NamedTuple):
+	name: str
+	severity: str
+	description: str
+
+
+def _numeric(df: pd.DataFrame, col: str):
+	if col not in df.columns:
+		return None
+	return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _range_checks(df: pd.DataFrame):
+	for col, spec in KOI_COLUMNS.items():
+		if col not in df.columns:
+			continue
+		raw = df[col]
+		values = _numeric(df, col)
+		if not (pd.api.types.is_numeric_dtype(raw) or pd.api.types.is_bool_dtype(raw)):
+			yield (
+				Rule(f'{col}:non_numeric', REJECT, f'{col} is not a number'),
+				raw.notna().to_numpy() & np.isnan(values),
+			)
+		with np.errstate(invalid='ignore'):
+			if spec.valid_min is not None:
+				below = values < spec.valid_min if spec.min_inclusive else values <= spec.valid_min
+				op = '<' if spec.min_inclusive else '<='
+				yield Rule(f'{col}:below_min', REJECT, f'{col} {op} {spec.valid_min:g} {spec.unit}'), below
+			if spec.valid_max is not None:
+				yield Rule(f'{col}:above_max', REJECT, f'{col} > {spec.valid_max:g} {spec.unit}'), values > spec.valid_max
+
+
+def _consistency_checks(df: pd.DataFrame):
+	period = _numeric(df, 'koi_period')
+	duration = _numeric(df, 'koi_duration')
+	depth = _numeric(df, 'koi_depth')
+	prad = _numeric(df, 'koi_prad')
+	srad = _numeric(df, 'koi_srad')
+	impact = _numeric(df, 'koi_impact')
+
+	with np.errstate(invalid='ignore', divide='ignore'):
+		if period is not None and duration is not None:
+			yield (
+				Rule('duration_exceeds_period', REJECT, 'transit duration (hours) >= orbital period (days * 24)'),
+				duration >= period * 24.0,
+			)
+		if depth is not None and prad is not None and srad is not None:
+			expected = (prad * R_EARTH_IN_R_SUN / srad) ** 2 * 1e6
+			ratio = depth / expected
+			yield (
+				Rule('depth_radius_mismatch', FLAG, f'depth and (Rp/R*)^2 disagree by more than {DEPTH_RADIUS_TOLERANCE:g}x'),
+				(ratio > DEPTH_RADIUS_TOLERANCE) | (ratio < 1.0 / DEPTH_RADIUS_TOLERANCE),
+			)
+		if impact is not None:
+			yield Rule('grazing_impact', FLAG, 'impact parameter > 1 (grazing or non-transiting geometry)'), impact > 1.0
+
+
+def validate_frame(df: pd.DataFrame):
+	"""Run every rule over whole columns at once.
+
+	Returns (rules, masks, rejected, flagged): the rules that applied, one boolean
+	row mask per rule, and the combined reject / flag masks.
+	"""
+	n = len(df)
+	rules, masks = [], []
+	for rule, mask in list(_range_checks(df)) + list(_consistency_checks(df)):
+		rules.append(rule)
+		masks.append(np.asarray(mask, dtype=bool))
+	rejected = np.zeros(n, dtype=bool)
+	flagged = np.zeros(n, dtype=bool)
+	for rule, mask in zip(rules, masks):
+		if rule.severity == REJECT:
+			rejected |= mask
+		else:
+			flagged |= mask
+	return rules, masks, rejected, flagged
+
+
+def write_report(out_dir: str, rules, masks, rejected, flagged, source: str = None):
+	"""Write a JSON summary, per-rule row indices (npz) and the rejected-row mask (npy)."""
+	os.makedirs(out_dir, exist_ok=True)
+	summary = {
+		'source': source,
+		'n_rows': int(len(rejected)),
+		'n_rejected': int(rejected.sum()),
+		'n_flagged': int(flagged.sum()),
+		'rules': [
+			{'name': r.name, 'severity': r.severity, 'description': r.description, 'count': int(m.sum())}
+			for r, m in zip(rules, masks) if m.any()
+		],
+	}
+	with open(os.path.join(out_dir, REPORT_NAME), 'w', encoding='utf-8') as f:
+		json.dump(summary, f, indent=2)
+	np.savez_compressed(
+		os.path.join(out_dir, ROWS_NAME),
+		**{r.name: np.flatnonzero(m).astype(np.int32) for r, m in zip(rules, masks) if m.any()},
+	)
+	np.save(os.path.join(out_dir, REJECTED_NAME), rejected)
+	return summary
+
+
+def load_rejected_mask(cache_dir: str):
+	path = os.path.join(cache_dir, REJECTED_NAME)
+	return np.load(path) if os.path.exists(path) else None
+
+
+def format_summary(summary: dict):
+	lines = [f"Validated {summary['n_rows']} rows: {summary['n_rejected']} rejected, {summary['n_flagged']} flagged"]
+	for rule in summary['rules']:
+		lines.append(f"  [{rule['severity']}] {rule['name']}: {rule['count']}  ({rule['description']})")
+	return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+	from catalog_cache import ensure_cache
+
+	cache_dir, manifest = ensure_cache()
+	print(format_summary(manifest['validation']))
+	print(f"Report: {os.path.join(cache_dir, REPORT_NAME)}")
@@ -0,0 +1,279 @@
+"""Shrink a trained tree ensemble into a compact flat-array artifact.
+
+Three steps on top of flat_forest's layout:
+
+1. Cost-complexity pruning (forests only). Every tree is cut back to its
+   minimal cost-complexity subtree at one shared alpha: the largest alpha on
+   a grid whose validation accuracy stays within --budget of the unpruned
+   forest. This is sklearn's ccp_alpha criterion, applied to the fitted trees
+   instead of refitting. Boosting models skip this step: their internal nodes
+   do not hold the value a collapsed leaf would need.
+2. Threshold quantization. Each feature's split thresholds become indices into
+   a sorted per-feature table, stored as uint16. Inputs are binned once per
+   call with searchsorted, so every split decision is unchanged.
+3. Narrow node arrays: uint8 feature ids, int16 child offsets relative to the
+   node, and float16 leaf probabilities (boosting keeps float32 raw scores).
+
+The rows held out when the model was trained (<name>_holdout.json, written by
+train.py) are halved: one half picks alpha, and the other measures the accuracy
+delta against the original model. The source is the model's latest registry
+version, and the artifact is attached to it as <sha>.compact/
+(model_registry.register_compact). Its predictions differ from the original
+model's on some rows, so it is only served when a caller opts in with
+load_registered(mmap=True, layout='compact') or load_cached(..., layout='compact').
+The report goes to <name>_compaction.json.
+
+    python src/models/training/compact_forest.py --budget 0.002
+    python src/models/training/compact_forest.py --models rf --value-dtype float32
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+from artifacts import load_holdout, save_json
+from flat_forest import FlatForest, SUPPORTED, export_forest, extract_trees, flatten_trees, load_flat
+from model_registry import register_compact, registry_dir, resolve
+from train import load_shared_data, prepare_shared_data, resolve_models, trainer_module
+
+
+COMPACT_ARRAYS = ('roots', 'feature', 'threshold', 'children', 'missing_left', 'leaf', 'value', 'bin_table',
+                  'bin_offsets')
+
+
+def weakest_links(tree):
+	"""Per internal node, the alpha at which pruning would first collapse it: (R(t) - R(T_t)) / (leaves(T_t) - 1)."""
+	left, right, cost = tree['left'].tolist(), tree['right'].tolist(), tree['cost']
+	subtree_cost = np.array(cost, dtype=np.float64)
+	leaves = np.ones(len(left))
+	# sklearn numbers children after their parent, so a reverse sweep is bottom-up.
+	for i in range(len(left) - 1, -1, -1):
+		if left[i] >= 0:
+			subtree_cost[i] = subtree_cost[left[i]] + subtree_cost[right[i]]
+			leaves[i] = leaves[left[i]] + leaves[right[i]]
+	internal = np.asarray(left) >= 0
+	return (cost[internal] - subtree_cost[internal]) / (leaves[internal] - 1)
+
+
+def prune_tree(tree, alpha: float):
+	"""Minimal cost-complexity subtree of one extracted tree at alpha, renumbered in preorder."""
+	left, right, cost = tree['left'].tolist(), tree['right'].tolist(), tree['cost'].tolist()
+	best = [0.0] * len(left)
+	collapse = [False] * len(left)
+	for i in range(len(left) - 1, -1, -1):
+		as_leaf = cost[i] + alpha
+		if left[i] < 0:
+			best[i] = as_leaf
+			continue
+		subtree = best[left[i]] + best[right[i]]
+		collapse[i] = as_leaf <= subtree
+		best[i] = min(as_leaf, subtree)
+
+	order, depth = [], {0: 0}
+	stack = [0]
+	while stack:
+		i = stack.pop()
+		order.append(i)
+		if left[i] >= 0 and not collapse[i]:
+			depth[left[i]] = depth[right[i]] = depth[i] + 1
+			stack += [right[i], left[i]]
+	new_id = {old: new for new, old in enumerate(order)}
+	keep = np.array(order)
+	is_leaf = np.array([left[i] < 0 or collapse[i] for i in order])
+
+	def child(side):
+		return np.array([-1 if leaf else new_id[side[i]] for i, leaf in zip(order, is_leaf)], dtype=np.int64)
+
+	pruned = {key: np.asarray(tree[key])[keep] for key in ('feature', 'threshold', 'missing_left', 'value', 'cost')}
+	pruned.update(left=child(left), right=child(right), depth=max(depth[i] for i in order))
+	return pruned
+
+
+def select_alpha(model, trees, X_val, y_val, budget: float, grid: int = 20):
+	"""Largest alpha on a weakest-link quantile grid whose validation accuracy is within budget of alpha=0."""
+	links = np.concatenate([weakest_links(t) for t in trees])
+	alphas = np.unique(np.concatenate([[0.0], np.quantile(links, np.linspace(0.05, 0.95, grid - 1))]))
+	path = []
+	for alpha in alphas:
+		pruned = [prune_tree(t, alpha) for t in trees] if alpha > 0 else trees
+		flat = FlatForest(*flatten_trees(model, 'forest', 'float32', pruned))
+		path.append({'alpha': float(alpha), 'n_nodes': flat.meta['n_nodes'],
+		             'validation_accuracy': float(accuracy_score(y_val, flat.predict(X_val)))})
+	floor = path[0]['validation_accuracy'] - budget
+	chosen = max((p for p in path if p['validation_accuracy'] >= floor), key=lambda p: p['alpha'])
+	return chosen['alpha'], path
+
+
+def narrow_arrays(arrays: dict, meta: dict, value_dtype: str = 'float16'):
+	"""Re-encode flat_forest arrays with binned thresholds, relative children and narrow dtypes."""
+	n_nodes, n_features = len(arrays['feature']), meta['n_features']
+	leaf = arrays['leaf']
+	feature = np.where(leaf, 0, arrays['feature'])
+	threshold = arrays['threshold']
+	if meta['input_dtype'] == 'float32':
+		# Round down so that x <= t still holds for exactly the same float32 inputs.
+		rounded = threshold.astype(np.float32)
+		over = rounded.astype(np.float64) > threshold
+		rounded[over] = np.nextafter(rounded[over], np.float32(-np.inf))
+		threshold = rounded
+
+	tables, codes = [], np.zeros(n_nodes, dtype=np.int64)
+	for f in range(n_features):
+		split = ~leaf & (feature == f)
+		table = np.unique(threshold[split])
+		codes[split] = np.searchsorted(table, threshold[split])
+		tables.append(table)
+	code_dtype = np.uint16 if max(map(len, tables)) < np.iinfo(np.uint16).max else np.uint32
+
+	children = arrays['children'].astype(np.int64) - np.repeat(np.arange(n_nodes), 2)
+	compact = {
+		'roots': arrays['roots'],
+		'feature': feature.astype(np.uint8 if n_features <= 256 else np.uint16),
+		'threshold': codes.astype(code_dtype),
+		'children': children.astype(np.int16 if np.abs(children).max() <= np.iinfo(np.int16).max else np.int32),
+		'missing_left': arrays['missing_left'],
+		'leaf': leaf,
+		'value': arrays['value'].astype(value_dtype if meta['kind'] == 'forest' else np.float32),
+		'bin_table': np.concatenate(tables).astype(threshold.dtype),
+		'bin_offsets': np.concatenate([[0], np.cumsum([len(t) for t in tables])]).astype(np.int32),
+	}
+	compact_meta = dict(meta, layout='compact', children='relative', thresholds='bins',
+	                    nan_code=int(np.iinfo(code_dtype).max), arrays=list(COMPACT_ARRAYS))
+	return compact, compact_meta
+
+
+def _dir_bytes(path: str):
+	return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def _load_ms(load, path: str, repeats: int = 5):
+	timings = []
+	for _ in range(repeats):
+		start = time.perf_counter()
+		load(path)
+		timings.append(time.perf_counter() - start)
+	return 1e3 * float(np.median(timings))
+
+
+def compact_model(name: str, work_dir: str, budget: float = 0.002, value_dtype: str = 'float16', grid: int = 20,
+                  seed: int = 42, models_dir: str = None):
+	"""Prune, quantize and narrow the latest registered version of one model; returns the report.
+
+	`work_dir` must hold the split prepared from the model's saved held-out keys.
+	"""
+	manifest = resolve(name, models_dir=models_dir)
+	impute = manifest.get('imputation', 'mean') == 'mean'
+	X_train, X_test, y_train, y_test, _ = load_shared_data(work_dir, trainer_module(name).FEATURES, impute)
+	X_test = np.asarray(X_test)
+	X_val, X_eval, y_val, y_eval = train_test_split(X_test, y_test, test_size=0.5, random_state=seed, stratify=y_test)
+
+	source = os.path.join(registry_dir(models_dir), manifest['file'])
+	model = joblib.load(source)
+	kind, input_dtype, trees = extract_trees(model)
+	nodes_before = sum(len(t['feature']) for t in trees)
+	alpha, path = 0.0, []
+	if kind == 'forest':
+		alpha, path = select_alpha(model, trees, X_val, y_val, budget, grid)
+		if alpha > 0:
+			trees = [prune_tree(t, alpha) for t in trees]
+	arrays, meta = flatten_trees(model, kind, input_dtype, trees)
+	compact_arrays, compact_meta = narrow_arrays(arrays, meta, value_dtype)
+	compact = FlatForest(compact_arrays, compact_meta)
+	original_pred, compact_pred = model.predict(X_eval), compact.predict(X_eval)
+	accuracy_original = float(accuracy_score(y_eval, original_pred))
+	accuracy_compact = float(accuracy_score(y_eval, compact_pred))
+
+	summary = {'budget': budget, 'alpha': alpha, 'value_dtype': str(compact.value.dtype),
+	           'accuracy_delta': accuracy_compact - accuracy_original, 'n_eval_rows': int(len(y_eval))}
+	manifest = register_compact(name, compact_arrays, compact_meta, summary, manifest['version'], models_dir)
+	out_dir = os.path.join(registry_dir(models_dir), manifest['compact'])
+	flat_dir = tempfile.mkdtemp(prefix='exoura_flat_')
+	try:
+		flat_bytes = _dir_bytes(export_forest(model, os.path.join(flat_dir, 'model.flat')))
+	finally:
+		shutil.rmtree(flat_dir, ignore_errors=True)
+
+	report = {
+		'model': name,
+		'registry_version': manifest['version'],
+		'estimator': type(model).__name__,
+		'budget': budget,
+		'alpha': alpha,
+		'value_dtype': str(compact.value.dtype),
+		'nodes_before': nodes_before,
+		'nodes_after': meta['n_nodes'],
+		'max_depth_after': meta['max_depth'],
+		'bytes_joblib': os.path.getsize(source),
+		'bytes_flat': flat_bytes,
+		'bytes_compact': _dir_bytes(out_dir),
+		'load_ms_joblib': _load_ms(joblib.load, source),
+		'load_ms_compact': _load_ms(lambda p: load_flat(p, mmap_mode=None), out_dir),
+		'accuracy_original': accuracy_original,
+		'accuracy_compact': accuracy_compact,
+		'label_agreement': float(np.mean(original_pred == compact_pred)),
+		'max_proba_diff': float(np.max(np.abs(model.predict_proba(X_eval) - compact.predict_proba(X_eval)))),
+		'n_eval_rows': int(len(y_eval)),
+		'artifact': out_dir,
+		'pruning_path': path,
+	}
+	report['accuracy_delta'] = report['accuracy_compact'] - report['accuracy_original']
+	save_json(report, name, 'compaction', models_dir)
+	return report
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--models', nargs='+', default=['rf', 'gbt'])
+	parser.add_argument('--budget', type=float, default=0.002, help='validation accuracy the pruning may give up')
+	parser.add_argument('--grid', type=int, default=20, help='alphas to try')
+	parser.add_argument('--value-dtype', choices=('float16', 'float32'), default='float16',
+	                    help='forest leaf probabilities')
+	parser.add_argument('--seed', type=int, default=42, help='seed for halving the held-out rows')
+	parser.add_argument('--data', default=None)
+	parser.add_argument('--models-dir', default=None)
+	args = parser.parse_args(argv)
+
+	import pandas as pd
+	models = []
+	for name in resolve_models(args.models):
+		try:
+			estimator = resolve(name, models_dir=args.models_dir)['estimator']
+		except LookupError as e:
+			print(f"Skipping {name}: {e}")
+			continue
+		if estimator not in SUPPORTED:
+			print(f"Skipping {name}: not a tree ensemble")
+		elif load_holdout(name, args.models_dir) is None:
+			print(f"Skipping {name}: no saved held-out split to score on; retrain with train.py first")
+		else:
+			models.append(name)
+	if not models:
+		return []
+	work_dir = tempfile.mkdtemp(prefix='exoura_compact_')
+	try:
+		rows = []
+		for name in models:
+			# Each model is scored on the rows it did not train on, so every one gets its own arrays.
+			model_dir = os.path.join(work_dir, name)
+			prepare_shared_data([name], model_dir, csv_path=args.data, split=load_holdout(name, args.models_dir))
+			rows.append(compact_model(name, model_dir, args.budget, args.value_dtype, args.grid, args.seed,
+			                          args.models_dir))
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+
+	report = pd.DataFrame([{k: v for k, v in r.items() if k not in ('pruning_path', 'artifact')} for r in rows])
+	with pd.option_context('display.width', 200, 'display.max_columns', None):
+		print(report.set_index('model').T.to_string(float_format=lambda v: f'{v:.4g}'))
+	for r in rows:
+		print(f"Saved {r['model']} compact artifact to: {r['artifact']}")
+	return rows
+
+
+if __name__ == "__main__":
+	main()
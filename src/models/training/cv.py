@@ -0,0 +1,142 @@
+"""Cross-validate the three models on identical, cached stratified folds.
+
+Folds are built once over the union of every selected model's features (see
+cv_folds.prepare_folds) and persisted next to the catalog cache with a
+folds.json manifest, so repeated runs and other tools reuse the same splits and
+imputation. Each (model, fold) pair is fitted in its own worker process, which
+memory-maps the fold arrays instead of receiving a pickled copy.
+
+    python src/models/training/cv.py                      # all models, 5 folds
+    python src/models/training/cv.py --models rf lr --folds 10 --workers 4
+"""
+import argparse
+import inspect
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+
+from artifacts import save_json
+from cv_folds import load_fold, prepare_folds, read_folds
+from train import resolve_models, trainer_module, union_features
+
+
+POSITIVE_LABEL = 'CANDIDATE'
+
+
+def build_for_features(module, params: dict = None, features=None):
+	"""module.build_model(**params), passing `features` on to pipelines that pick columns by position."""
+	params = dict(params or {})
+	if features and 'features' in inspect.signature(module.build_model).parameters:
+		params['features'] = list(features)  # column-position-aware pipelines (logistic_regression)
+	return module.build_model(**params)
+
+
+def evaluate_fold(name: str, fold_dir: str, fold: int, params: dict = None, features=None):
+	"""Worker entry point: fit one model on one fold and score it on the held-out part.
+
+	`features` overrides the model's own FEATURES (used by feature_select.py).
+	"""
+	module = trainer_module(name)
+	X_train, X_val, y_train, y_val = load_fold(fold_dir, fold, features or module.FEATURES)
+
+	model = build_for_features(module, params, features)
+	fit = getattr(module, 'fit_model', None)
+	start = time.perf_counter()
+	if fit is not None:
+		fit(model, X_train, y_train)
+	else:
+		model.fit(X_train, y_train)
+	fit_seconds = time.perf_counter() - start
+
+	start = time.perf_counter()
+	y_pred = model.predict(X_val)
+	predict_seconds = time.perf_counter() - start
+
+	result = {
+		'model': name,
+		'fold': fold,
+		'n_train': int(len(y_train)),
+		'n_val': int(len(y_val)),
+		'accuracy': float(accuracy_score(y_val, y_pred)),
+		'precision': float(precision_score(y_val, y_pred, pos_label=POSITIVE_LABEL, zero_division=0)),
+		'recall': float(recall_score(y_val, y_pred, pos_label=POSITIVE_LABEL, zero_division=0)),
+		'f1': float(f1_score(y_val, y_pred, pos_label=POSITIVE_LABEL, zero_division=0)),
+		'roc_auc': None,
+		'fit_seconds': fit_seconds,
+		'predict_seconds': predict_seconds,
+	}
+	if hasattr(model, 'predict_proba') and POSITIVE_LABEL in model.classes_:
+		pos = list(model.classes_).index(POSITIVE_LABEL)
+		result['roc_auc'] = float(roc_auc_score(y_val == POSITIVE_LABEL, model.predict_proba(X_val)[:, pos]))
+	return result
+
+
+def cross_validate(models=None, n_splits: int = 5, seed: int = 42, workers: int = None, csv_path: str = None,
+                   params: dict = None):
+	"""Run every (model, fold) pair in a process pool; returns a per-fold DataFrame and the fold directory."""
+	models = resolve_models(models)
+	params = params or {}
+	fold_dir = prepare_folds(union_features(models), n_splits=n_splits, seed=seed, csv_path=csv_path)
+	n_folds = read_folds(fold_dir)['n_splits']
+
+	tasks = [(name, k) for name in models for k in range(n_folds)]
+	workers = workers or min(len(tasks), os.cpu_count() or 1)
+	rows = []
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		futures = [pool.submit(evaluate_fold, name, fold_dir, k, params.get(name)) for name, k in tasks]
+		for future in as_completed(futures):
+			r = future.result()
+			print(f"  {r['model']} fold {r['fold']}: accuracy={r['accuracy']:.4f}  fit={r['fit_seconds']:.2f}s")
+			rows.append(r)
+
+	results = pd.DataFrame(rows)
+	results['model'] = pd.Categorical(results['model'], categories=models, ordered=True)
+	return results.sort_values(['model', 'fold']).reset_index(drop=True), fold_dir
+
+
+def summarize(results: pd.DataFrame):
+	metrics = ['accuracy', 'precision', 'recall', 'f1', 'roc_auc', 'fit_seconds', 'predict_seconds']
+	return results.groupby('model', observed=True)[metrics].agg(['mean', 'std'])
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--models', nargs='+', default=None, help='rf, gbt, lr or full names (default: all)')
+	parser.add_argument('--folds', type=int, default=5)
+	parser.add_argument('--seed', type=int, default=42, help='fold shuffling seed shared by all models')
+	parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+	parser.add_argument('--data', default=None, help='catalog CSV (default: src/data/keplar.csv)')
+	parser.add_argument('--models-dir', default=None, help='where to write <model>_cv.json')
+	args = parser.parse_args(argv)
+
+	start = time.perf_counter()
+	results, fold_dir = cross_validate(args.models, args.folds, args.seed, args.workers, args.data)
+	wall = time.perf_counter() - start
+
+	with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.4f}'.format):
+		print(f"\nPer-fold results (folds: {fold_dir}):")
+		print(results.to_string(index=False))
+		print("\nSummary (mean / std across folds):")
+		print(summarize(results))
+	print(f"\n{len(results)} fits in {wall:.2f}s wall-clock (sum of fit times {results['fit_seconds'].sum():.2f}s)")
+
+	for name, group in results.groupby('model', observed=True):
+		folds = group.drop(columns='model').to_dict(orient='records')
+		path = save_json({
+			'model': name,
+			'fold_dir': fold_dir,
+			'n_splits': len(folds),
+			'mean_accuracy': float(np.mean(group['accuracy'])),
+			'std_accuracy': float(np.std(group['accuracy'])),
+			'folds': folds,
+		}, name, 'cv', args.models_dir)
+		print(f"Saved {name} CV report to: {path}")
+	return results
+
+
+if __name__ == "__main__":
+	main()
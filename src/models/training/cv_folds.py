@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+
+from catalog_cache import ensure_cache, load_columns
+
+
+LABEL = 'koi_pdisposition'
+FOLDS_NAME = 'folds.json'
+
+
+def _fold_key(manifest: dict, features, n_splits: int, seed: int):
+	h = hashlib.sha1()
+	h.update(manifest['sha256'].encode())
+	h.update(str(len(manifest.get('deltas', []))).encode())
+	h.update(json.dumps([list(features), n_splits, seed]).encode())
+	return h.hexdigest()[:16]
+
+
+def prepare_folds(features, n_splits: int = 5, seed: int = 42, csv_path: str = None):
+	"""Stratified folds, imputed once and cached as .npy next to the catalog cache.
+
+	Each fold's missing values are filled with that fold's training means so
+	validation rows never leak into preprocessing. Returns the fold directory;
+	it is reused as-is while the catalog, features, k and seed stay the same.
+	"""
+	cache_dir, manifest = ensure_cache(csv_path)
+	fold_dir = os.path.join(cache_dir, 'folds', _fold_key(manifest, features, n_splits, seed))
+	if os.path.exists(os.path.join(fold_dir, FOLDS_NAME)):
+		return fold_dir
+
+	df = load_columns(list(features) + [LABEL], csv_path=csv_path, drop_rejected=True)
+	df = df[df[LABEL].notna()].reset_index(drop=True)
+	X = np.ascontiguousarray(df[list(features)].to_numpy(dtype=np.float32, na_value=np.nan))
+	y = df[LABEL]
+	classes = [str(c) for c in y.cat.categories]
+	codes = np.asarray(y.cat.codes, dtype=np.int8)
+
+	os.makedirs(os.path.dirname(fold_dir), exist_ok=True)
+	tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(fold_dir) + '.building-', dir=os.path.dirname(fold_dir))
+	skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+	folds = []
+	for k, (train_idx, val_idx) in enumerate(skf.split(X, codes)):
+		means = np.nanmean(X[train_idx], axis=0)
+		for part, idx in (('train', train_idx), ('val', val_idx)):
+			block = X[idx]
+			rows, cols = np.nonzero(np.isnan(block))
+			block[rows, cols] = means[cols]
+			np.save(os.path.join(tmp_dir, f'X_{part}_{k}.npy'), block)
+			np.save(os.path.join(tmp_dir, f'y_{part}_{k}.npy'), codes[idx])
+			np.save(os.path.join(tmp_dir, f'idx_{part}_{k}.npy'), idx.astype(np.int32))
+		folds.append({'fold': k, 'n_train': int(len(train_idx)), 'n_val': int(len(val_idx))})
+
+	with open(os.path.join(tmp_dir, FOLDS_NAME), 'w', encoding='utf-8') as f:
+		json.dump({
+			'features': list(features),
+			'classes': classes,
+			'n_splits': n_splits,
+			'seed': seed,
+			'n_rows': int(len(df)),
+			'catalog_sha256': manifest['sha256'],
+			'folds': folds,
+		}, f, indent=2)
+	try:
+		os.replace(tmp_dir, fold_dir)
+	except OSError:
+		# Another process built the same folds first; theirs are identical.
+		shutil.rmtree(tmp_dir, ignore_errors=True)
+	return fold_dir
+
+
+def read_folds(fold_dir: str):
+	with open(os.path.join(fold_dir, FOLDS_NAME), 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+def load_fold(fold_dir: str, k: int, feature_cols=None):
+	"""Memory-map one fold: (X_train, X_val, y_train, y_val) with labels decoded to class names."""
+	info = read_folds(fold_dir)
+	classes = np.asarray(info['classes'], dtype=object)
+	X_train = np.load(os.path.join(fold_dir, f'X_train_{k}.npy'), mmap_mode='r')
+	X_val = np.load(os.path.join(fold_dir, f'X_val_{k}.npy'), mmap_mode='r')
+	y_train = classes[np.load(os.path.join(fold_dir, f'y_train_{k}.npy'))]
+	y_val = classes[np.load(os.path.join(fold_dir, f'y_val_{k}.npy'))]
+	if feature_cols is not None and list(feature_cols) != info['features']:
+		cols = [info['features'].index(c) for c in feature_cols]
+		X_train, X_val = X_train[:, cols], X_val[:, cols]
+	return X_train, X_val, y_train, y_val
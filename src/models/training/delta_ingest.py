@@ -0,0 +1,437 @@
+"""Merge delta CSVs of new or updated KOI rows into the columnar cache.
+
+Every ingested delta is copied into a persistent store next to the cache
+(<cache dir>.deltas/, see catalog_cache.delta_store_dir) and logged in
+batches.jsonl. The cache itself is disposable: when the catalog CSV changes
+and the cache is rebuilt, the stored batches are replayed in order before the
+new cache is installed, so ingested deltas are never lost. Delete the store
+directory to drop them.
+
+Ingesting never modifies the live cache: the delta is journaled in the store
+first, then applied to a staged copy of the cache that replaces it in one
+rename, manifest included. Readers see either the old or the new cache, and a
+crash leaves the old one intact; any journaled batch it does not list yet is
+applied by the next ingest (or rebuild).
+
+The manifest also carries running per-column statistics over the rows that
+pass validation. Their means are the imputation means the trainers use
+(cached_column_means), kept current by each delta without rescanning.
+
+    python src/models/training/delta_ingest.py new_kois.csv
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from catalog_cache import delta_store_dir, ensure_cache, install_cache, write_manifest
+from catalog_validation import REJECT, ROWS_NAME, Rule, load_rejected_mask, validate_frame, write_report
+from koi_schema import label_code_dtype
+from streaming_loader import ColumnStats
+
+
+DEFAULT_KEY = 'kepoi_name'
+CHANGELOG_NAME = 'changes.jsonl'
+BATCHES_NAME = 'batches.jsonl'
+STATS_KEY = 'imputation_stats'
+
+
+def _numeric_columns(manifest: dict):
+	return [col for col, meta in manifest['columns'].items() if meta['kind'] == 'numeric']
+
+
+def _column_path(cache_dir: str, manifest: dict, col: str):
+	return os.path.join(cache_dir, manifest['columns'][col]['file'])
+
+
+def _column_stats(values: np.ndarray, col: str):
+	return ColumnStats([col]).update(np.asarray(values, dtype=np.float64).reshape(-1, 1))
+
+
+def _accepted_rows(cache_dir: str, manifest: dict):
+	rejected = load_rejected_mask(cache_dir)
+	accepted = np.ones(manifest['n_rows'], dtype=bool)
+	if rejected is not None:
+		accepted[:len(rejected)] = ~rejected[:manifest['n_rows']]
+	return accepted
+
+
+def _accepted_stats(cache_dir: str, manifest: dict, col: str, accepted):
+	values = np.load(_column_path(cache_dir, manifest, col), mmap_mode='r')
+	return _column_stats(np.asarray(values)[accepted], col)
+
+
+def ensure_stats(cache_dir: str, manifest: dict):
+	"""Make sure the manifest carries running stats for every numeric column, over rows that passed validation."""
+	stats = manifest.setdefault(STATS_KEY, {})
+	missing = [col for col in _numeric_columns(manifest) if col not in stats]
+	if missing:
+		accepted = _accepted_rows(cache_dir, manifest)
+		for col in missing:
+			stats[col] = _accepted_stats(cache_dir, manifest, col, accepted).to_dict()
+		write_manifest(cache_dir, manifest)
+	return stats
+
+
+def cached_column_means(columns, csv_path: str = None, cache_dir: str = None):
+	"""Imputation means over the validated catalog, kept up to date by delta ingestion.
+
+	These match X.mean() over load_columns(..., drop_rejected=True) without
+	loading the columns.
+	"""
+	cache_dir, manifest = ensure_cache(csv_path, cache_dir)
+	stats = ensure_stats(cache_dir, manifest)
+	return pd.Series({col: ColumnStats.from_dict(stats[col]).mean[0] for col in columns}, dtype=np.float64)
+
+
+def _decode_keys(cache_dir: str, manifest: dict, key: str):
+	meta = manifest['columns'][key]
+	values = np.load(_column_path(cache_dir, manifest, key), mmap_mode='r')
+	if meta['kind'] == 'category':
+		categories = np.asarray(meta['categories'] + [None], dtype=object)
+		return categories[np.asarray(values)]
+	return np.asarray(values)
+
+
+def _encode_delta(delta: pd.DataFrame, col: str, meta: dict, n: int):
+	"""Encode a delta column into the store's representation. Returns (values, provided_mask)."""
+	if col not in delta.columns:
+		fill = np.nan if meta['kind'] == 'numeric' else -1
+		return np.full(n, fill, dtype=meta['dtype']), np.zeros(n, dtype=bool)
+
+	raw = delta[col]
+	provided = raw.notna().to_numpy()
+	if meta['kind'] == 'numeric':
+		values = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=meta['dtype'], na_value=np.nan)
+		return values, provided
+
+	text = raw.astype('string').str.strip()
+	new_categories = sorted(set(text.dropna().unique()) - set(meta['categories']))
+	meta['categories'] = meta['categories'] + new_categories
+	codes = pd.Index(meta['categories']).get_indexer(text.fillna(''))
+	codes[~provided] = -1
+	if meta['dtype'] == 'int8':
+		meta['dtype'] = str(label_code_dtype(meta['categories']))
+	return codes.astype(meta['dtype']), provided
+
+
+def _differs(old: np.ndarray, new: np.ndarray):
+	if np.issubdtype(old.dtype, np.floating):
+		return ~((old == new) | (np.isnan(old) & np.isnan(new)))
+	return old != new
+
+
+def _revalidate(cache_dir: str, manifest: dict, rows: np.ndarray):
+	"""Re-run validation for the touched rows and rewrite the full report.
+
+	Per-rule row sets from validation_rows.npz are kept for untouched rows and
+	replaced for touched ones, so the summary counts, the per-rule rows and the
+	rejected mask all describe the cache as it is now.
+	"""
+	n = manifest['n_rows']
+	frame = pd.DataFrame({
+		col: np.asarray(np.load(_column_path(cache_dir, manifest, col), mmap_mode='r')[rows], dtype=np.float64)
+		for col in _numeric_columns(manifest)
+	})
+	touched_rules, touched_masks, _, _ = validate_frame(frame)
+
+	summary = manifest.get('validation', {})
+	known = {r['name']: Rule(r['name'], r['severity'], r['description']) for r in summary.get('rules', [])}
+	merged = {}
+	rows_path = os.path.join(cache_dir, ROWS_NAME)
+	if os.path.exists(rows_path):
+		with np.load(rows_path) as stored:
+			for name in stored.files:
+				mask = np.zeros(n, dtype=bool)
+				mask[stored[name]] = True
+				merged[name] = mask
+	for mask in merged.values():
+		mask[rows] = False
+	for rule, mask in zip(touched_rules, touched_masks):
+		known[rule.name] = rule
+		merged.setdefault(rule.name, np.zeros(n, dtype=bool))[rows] = mask
+
+	rules = [known[name] for name in merged]
+	masks = [merged[name] for name in merged]
+	rejected = np.zeros(n, dtype=bool)
+	flagged = np.zeros(n, dtype=bool)
+	for rule, mask in zip(rules, masks):
+		if rule.severity == REJECT:
+			rejected |= mask
+		else:
+			flagged |= mask
+	manifest['validation'] = write_report(cache_dir, rules, masks, rejected, flagged, source=summary.get('source'))
+	return rejected[rows]
+
+
+def _append_log(cache_dir: str, entry: dict):
+	with open(os.path.join(cache_dir, CHANGELOG_NAME), 'a', encoding='utf-8') as f:
+		f.write(json.dumps(entry) + '\n')
+
+
+def read_changelog(csv_path: str = None, cache_dir: str = None, since_batch: int = 0):
+	cache_dir, _ = ensure_cache(csv_path, cache_dir)
+	path = os.path.join(cache_dir, CHANGELOG_NAME)
+	if not os.path.exists(path):
+		return []
+	with open(path, 'r', encoding='utf-8') as f:
+		entries = [json.loads(line) for line in f if line.strip()]
+	return [e for e in entries if e['batch'] > since_batch]
+
+
+def changed_rows_since(since_batch: int = 0, csv_path: str = None, cache_dir: str = None):
+	"""Sorted row positions that were added or modified after `since_batch`."""
+	rows = set()
+	for entry in read_changelog(csv_path, cache_dir, since_batch):
+		rows.update(entry['new_rows'])
+		rows.update(entry['changed_rows'])
+	return np.asarray(sorted(rows), dtype=np.int64)
+
+
+def _read_batches(store_dir: str):
+	path = os.path.join(store_dir, BATCHES_NAME)
+	if not os.path.exists(path):
+		return []
+	with open(path, 'r', encoding='utf-8') as f:
+		return [json.loads(line) for line in f if line.strip()]
+
+
+def _store_batch(store_dir: str, delta_csv: str, key: str, batch: int):
+	"""Copy the delta into the persistent store and log it for replay."""
+	os.makedirs(store_dir, exist_ok=True)
+	filename = f'batch_{batch:04d}.csv'
+	shutil.copyfile(delta_csv, os.path.join(store_dir, filename + '.tmp'))
+	os.replace(os.path.join(store_dir, filename + '.tmp'), os.path.join(store_dir, filename))
+	record = {'batch': batch, 'file': filename, 'source': os.path.abspath(delta_csv), 'key': key, 'timestamp': time.time()}
+	with open(os.path.join(store_dir, BATCHES_NAME), 'a', encoding='utf-8') as f:
+		f.write(json.dumps(record) + '\n')
+	return record
+
+
+def _drop_batch(store_dir: str, batch: int):
+	"""Remove a journaled batch whose application failed."""
+	records = [r for r in _read_batches(store_dir) if r['batch'] != batch]
+	path = os.path.join(store_dir, BATCHES_NAME)
+	with open(path + '.tmp', 'w', encoding='utf-8') as f:
+		f.writelines(json.dumps(r) + '\n' for r in records)
+	os.replace(path + '.tmp', path)
+	try:
+		os.remove(os.path.join(store_dir, f'batch_{batch:04d}.csv'))
+	except FileNotFoundError:
+		pass
+
+
+def _stage_cache(cache_dir: str, manifest: dict):
+	"""Copy the cache into a new temp dir beside it for a delta to be applied to.
+
+	Column files are hard-linked where the filesystem allows it (apply_delta
+	only ever replaces them, never writes through them); the small report,
+	log and manifest files are copied. Subdirectories hold data derived from
+	a given delta count (cv_folds) and are left behind.
+	"""
+	cache_dir = os.path.abspath(cache_dir)
+	stage_dir = tempfile.mkdtemp(prefix=os.path.basename(cache_dir) + '.delta-', dir=os.path.dirname(cache_dir))
+	column_files = {meta['file'] for meta in manifest['columns'].values()}
+	for name in os.listdir(cache_dir):
+		src, dst = os.path.join(cache_dir, name), os.path.join(stage_dir, name)
+		if os.path.isdir(src):
+			continue
+		if name in column_files:
+			try:
+				os.link(src, dst)
+				continue
+			except OSError:
+				pass
+		shutil.copy2(src, dst)
+	return stage_dir
+
+
+def _save_column(path: str, column):
+	"""Write a column file through a temp file so a hard-linked original is left untouched."""
+	tmp_path = path + '.tmp.npy'
+	np.save(tmp_path, column)
+	os.replace(tmp_path, path)
+
+
+def replay_deltas(cache_dir: str, manifest: dict, store_dir: str):
+	"""Re-apply every stored batch, in order, to a freshly built cache; returns the manifest.
+
+	catalog_cache.build_cache calls this on its temp dir before installing it.
+	"""
+	for record in _read_batches(store_dir):
+		apply_delta(os.path.join(store_dir, record['file']), cache_dir, manifest, record['key'], record['batch'],
+		            source=record['source'])
+	return manifest
+
+
+def ingest_delta(delta_csv: str, csv_path: str = None, cache_dir: str = None, key: str = DEFAULT_KEY):
+	"""Merge a delta CSV into the cache and keep it in the delta store for replay after rebuilds.
+
+	The batch is journaled first, then it (and any earlier journaled batch a
+	crash kept from being applied) is applied to a staged copy of the cache,
+	which is installed in place of the live one.
+	"""
+	cache_dir, manifest = ensure_cache(csv_path, cache_dir)
+	if key not in pd.read_csv(delta_csv, comment='#', nrows=0).columns or key not in manifest['columns']:
+		raise KeyError(f"Key column '{key}' must exist in both the delta and the catalog")
+	store_dir = delta_store_dir(cache_dir)
+	applied = {d['batch'] for d in manifest.get('deltas', [])}
+	batch = max([r['batch'] for r in _read_batches(store_dir)] + list(applied) + [0]) + 1
+	_store_batch(store_dir, delta_csv, key, batch)
+
+	stage_dir = _stage_cache(cache_dir, manifest)
+	try:
+		for record in _read_batches(store_dir):
+			if record['batch'] in applied:
+				continue
+			entry = apply_delta(os.path.join(store_dir, record['file']), stage_dir, manifest, record['key'],
+			                    record['batch'], source=record['source'])
+	except BaseException:
+		shutil.rmtree(stage_dir, ignore_errors=True)
+		_drop_batch(store_dir, batch)
+		raise
+	install_cache(stage_dir, cache_dir, keep_existing=False)
+	return entry
+
+
+def apply_delta(delta_csv: str, cache_dir: str, manifest: dict, key: str = DEFAULT_KEY, batch: int = None,
+                source: str = None):
+	"""Apply one delta CSV of new or updated rows to the cache in `cache_dir`, keyed by `key`.
+
+	Every column the delta touches is written to a new file that replaces the
+	old one, new rows are appended column by column, and the imputation stats
+	are adjusted with the before/after values of the touched rows only. The
+	full catalog CSV is never reparsed. `cache_dir` must not be a live cache:
+	ingest_delta passes a staged copy, replay_deltas a build's temp dir.
+	"""
+	stats = ensure_stats(cache_dir, manifest)
+	delta = pd.read_csv(delta_csv, comment='#', low_memory=False)
+	if key not in delta.columns or key not in manifest['columns']:
+		raise KeyError(f"Key column '{key}' must exist in both the delta and the catalog")
+	source = source or os.path.abspath(delta_csv)
+	batch = batch or len(manifest.get('deltas', [])) + 1
+
+	delta = delta.drop_duplicates(subset=key, keep='last').reset_index(drop=True)
+	unknown = [c for c in delta.columns if c not in manifest['columns']]
+	if unknown:
+		print(f"Ignoring delta columns not in catalog: {unknown}", file=sys.stderr)
+
+	store_keys = pd.Index(_decode_keys(cache_dir, manifest, key))
+	delta_keys = delta[key].astype('string').str.strip().to_numpy(dtype=object)
+	positions = store_keys.get_indexer(delta_keys)
+	existing = positions >= 0
+	n_rows = manifest['n_rows']
+	new_rows = np.arange(n_rows, n_rows + int((~existing).sum()), dtype=np.int64)
+	accepted_before = _accepted_rows(cache_dir, manifest)
+
+	encoded = {}
+	provided = {}
+	for col, meta in manifest['columns'].items():
+		encoded[col], provided[col] = _encode_delta(delta, col, meta, len(delta))
+		if meta['kind'] == 'category':
+			# New categories can overflow int8 label codes; widen the stored column first.
+			path = _column_path(cache_dir, manifest, col)
+			current = np.load(path, mmap_mode='r')
+			if str(current.dtype) != meta['dtype']:
+				widened = np.asarray(current).astype(meta['dtype'])
+				del current
+				_save_column(path, widened)
+
+	changed_mask = np.zeros(len(delta), dtype=bool)
+	changed_columns = {}
+	before = {}
+	rows = positions[existing]
+	for col in manifest['columns']:
+		if col == key or not existing.any():
+			continue
+		path = _column_path(cache_dir, manifest, col)
+		old = np.asarray(np.load(path, mmap_mode='r')[rows])
+		if col in stats:
+			before[col] = old
+		new = encoded[col][existing]
+		diff = _differs(old, new) & provided[col][existing]
+		if not diff.any():
+			continue
+		changed_mask[np.flatnonzero(existing)[diff]] = True
+		changed_columns[col] = int(diff.sum())
+		column = np.load(path)
+		column[rows[diff]] = new[diff]
+		_save_column(path, column)
+
+	if len(new_rows):
+		for col, meta in manifest['columns'].items():
+			path = _column_path(cache_dir, manifest, col)
+			_save_column(path, np.concatenate([np.load(path), encoded[col][~existing]]))
+
+	manifest['n_rows'] = n_rows + len(new_rows)
+	changed_rows = positions[changed_mask].astype(np.int64)
+	touched = np.concatenate([changed_rows, new_rows])
+	rejected_rows = _revalidate(cache_dir, manifest, touched) if len(touched) else np.zeros(0, dtype=bool)
+	_update_stats(cache_dir, manifest, stats, before, changed_mask[existing], changed_rows, new_rows,
+	              accepted_before, _accepted_rows(cache_dir, manifest))
+
+	manifest.setdefault('deltas', []).append({
+		'batch': batch,
+		'source': source,
+		'timestamp': time.time(),
+		'n_new': int(len(new_rows)),
+		'n_changed': int(changed_mask.sum()),
+	})
+	write_manifest(cache_dir, manifest)
+
+	entry = {
+		'batch': batch,
+		'source': source,
+		'new_rows': new_rows.tolist(),
+		'changed_rows': changed_rows.tolist(),
+		'new_keys': [str(k) for k in delta_keys[~existing]],
+		'changed_keys': [str(k) for k in delta_keys[changed_mask]],
+		'changed_columns': changed_columns,
+		'rejected_rows': touched[rejected_rows].tolist(),
+	}
+	_append_log(cache_dir, entry)
+	return entry
+
+
+def _update_stats(cache_dir: str, manifest: dict, stats: dict, before: dict, changed, changed_rows, new_rows,
+                  accepted_before, accepted_after):
+	"""Swap the touched rows' old contributions for their new ones, over rows that pass validation.
+
+	A changed row leaves the stats if it was accepted before and re-enters if it
+	is accepted now, so rows whose validation status flips are handled too.
+	"""
+	for col in stats:
+		values = np.load(_column_path(cache_dir, manifest, col), mmap_mode='r')
+		old = before[col][changed] if col in before else np.zeros(0)
+		removed = _column_stats(old[accepted_before[changed_rows]], col)
+		added = _column_stats(np.concatenate([
+			np.asarray(values[changed_rows])[accepted_after[changed_rows]],
+			np.asarray(values[new_rows])[accepted_after[new_rows]],
+		]), col)
+		s = ColumnStats.from_dict(stats[col])
+		s.n_rows += added.n_rows - removed.n_rows
+		s.count += added.count - removed.count
+		s.total += added.total - removed.total
+		if np.any(removed.min <= s.min) or np.any(removed.max >= s.max):
+			# An extreme value left the stats; rescan this column for exact min/max.
+			full = _accepted_stats(cache_dir, manifest, col, accepted_after)
+			s.min, s.max = full.min, full.max
+		else:
+			s.min = np.fmin(s.min, added.min)
+			s.max = np.fmax(s.max, added.max)
+		stats[col] = s.to_dict()
+
+
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("usage: python delta_ingest.py <delta.csv> [catalog.csv]")
+		sys.exit(1)
+	result = ingest_delta(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+	print(f"Batch {result['batch']}: {len(result['new_rows'])} new rows, {len(result['changed_rows'])} changed rows")
+	for col, n in sorted(result['changed_columns'].items()):
+		print(f"  {col}: {n}")
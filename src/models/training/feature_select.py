@@ -0,0 +1,191 @@
+"""Search for the smallest koi_* feature set that keeps a model's accuracy.
+
+Two parts:
+
+- permutation importance, computed on cached CV folds. All repeats for one
+  column are stacked into a single batch and re-predicted in one call, and
+  columns are spread across worker processes;
+- backward elimination from every numeric koi_* column (minus label leaks, as
+  in the old experiment in random_forest.py). 'recursive' drops the least
+  important column each round and re-ranks the rest; 'greedy' cross-validates
+  every single-column removal and keeps the best one. It stops once accuracy
+  falls below the target.
+
+The smallest set within the target is written to <model>_feature_selection.json.
+
+    python src/models/training/feature_select.py --model rf
+    python src/models/training/feature_select.py --model gbt --method greedy --tolerance 0.01
+    python src/models/training/feature_select.py --model lr --importance-only --start model
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.metrics import accuracy_score
+
+from artifacts import save_json
+from catalog_cache import ensure_cache, load_columns
+from cv import build_for_features, evaluate_fold
+from cv_folds import load_fold, prepare_folds, read_folds
+from train import resolve_models, trainer_module
+
+
+# Columns that restate the disposition (or are derived from it) and would leak the label.
+EXCLUDE = ['koi_disposition', 'koi_pdisposition', 'koi_fpflag_nt', 'koi_fpflag_ss', 'koi_fpflag_co', 'koi_fpflag_ec',
+           'koi_score']
+METHODS = ('recursive', 'greedy')
+
+
+def candidate_features(csv_path: str = None, exclude=EXCLUDE):
+	"""Numeric koi_* columns in the cached catalog that have at least one value."""
+	_, manifest = ensure_cache(csv_path)
+	cols = [
+		c for c, info in manifest['columns'].items()
+		if c.startswith('koi') and c not in exclude and info['kind'] == 'numeric'
+	]
+	present = load_columns(cols, csv_path=csv_path, drop_rejected=True).notna().any()
+	return [c for c in cols if present[c]]
+
+
+def _fit(module, model, X, y):
+	fit = getattr(module, 'fit_model', None)
+	if fit is not None:
+		fit(model, X, y)
+	else:
+		model.fit(X, y)
+	return model
+
+
+def _permuted_accuracy(model, X_val, y_val, cols, n_repeats: int, seed: int):
+	"""Accuracy per repeat after shuffling each column in `cols`, one predict call per column."""
+	X_val = np.asarray(X_val)
+	n = len(y_val)
+	y_rep = np.tile(y_val, n_repeats)
+	out = {}
+	for j in cols:
+		rng = np.random.default_rng([seed, int(j)])
+		perms = rng.permuted(np.tile(np.arange(n), (n_repeats, 1)), axis=1).ravel()
+		X_rep = np.tile(X_val, (n_repeats, 1))
+		X_rep[:, j] = X_val[perms, j]
+		out[int(j)] = (model.predict(X_rep) == y_rep).reshape(n_repeats, n).mean(axis=1)
+	return out
+
+
+def permutation_importance(name: str, features, fold_dir: str, n_repeats: int = 5, seed: int = 0, n_jobs: int = -1,
+                           params: dict = None):
+	"""Mean / std accuracy drop per feature over all folds and repeats, most important first."""
+	module = trainer_module(name)
+	n_folds = read_folds(fold_dir)['n_splits']
+	drops = np.zeros((n_folds, len(features), n_repeats))
+	chunks = np.array_split(np.arange(len(features)), min(len(features), effective_n_jobs(n_jobs)))
+	with Parallel(n_jobs=n_jobs) as parallel:
+		for k in range(n_folds):
+			X_train, X_val, y_train, y_val = load_fold(fold_dir, k, features)
+			model = _fit(module, build_for_features(module, params, features), X_train, y_train)
+			baseline = accuracy_score(y_val, model.predict(X_val))
+			parts = parallel(delayed(_permuted_accuracy)(model, X_val, y_val, c, n_repeats, seed + k) for c in chunks)
+			for part in parts:
+				for j, acc in part.items():
+					drops[k, j] = baseline - acc
+
+	drops = drops.transpose(1, 0, 2).reshape(len(features), -1)
+	return pd.DataFrame({
+		'feature': list(features),
+		'importance_mean': drops.mean(axis=1),
+		'importance_std': drops.std(axis=1),
+	}).sort_values('importance_mean', ascending=False).reset_index(drop=True)
+
+
+def cv_accuracy(name: str, feature_sets, fold_dir: str, n_jobs: int = -1, params: dict = None):
+	"""Mean CV accuracy of each feature set; all (set, fold) fits run in parallel."""
+	n_folds = read_folds(fold_dir)['n_splits']
+	tasks = [(i, k) for i in range(len(feature_sets)) for k in range(n_folds)]
+	results = Parallel(n_jobs=n_jobs)(
+		delayed(evaluate_fold)(name, fold_dir, k, params, list(feature_sets[i])) for i, k in tasks
+	)
+	scores = np.zeros((len(feature_sets), n_folds))
+	for (i, k), r in zip(tasks, results):
+		scores[i, k] = r['accuracy']
+	return scores.mean(axis=1)
+
+
+def eliminate(name: str, features, fold_dir: str, method: str = 'recursive', target: float = None,
+              tolerance: float = 0.005, min_features: int = 1, n_repeats: int = 5, seed: int = 0, n_jobs: int = -1,
+              params: dict = None):
+	"""Backward elimination; returns the path taken and the smallest set with accuracy >= target."""
+	if method not in METHODS:
+		raise ValueError(f"Unknown method '{method}'. Choose from: {METHODS}")
+	current = list(features)
+	accuracy = float(cv_accuracy(name, [current], fold_dir, n_jobs, params)[0])
+	target = accuracy - tolerance if target is None else target
+	history = [{'removed': None, 'n_features': len(current), 'accuracy': accuracy, 'features': current}]
+	print(f"  {len(current)} features: accuracy={accuracy:.4f} (target {target:.4f})")
+
+	while len(current) > min_features:
+		if method == 'recursive':
+			ranking = permutation_importance(name, current, fold_dir, n_repeats, seed, n_jobs, params)
+			drop = ranking['feature'].iloc[-1]
+			accuracy = float(cv_accuracy(name, [[c for c in current if c != drop]], fold_dir, n_jobs, params)[0])
+		else:
+			trials = [[c for c in current if c != f] for f in current]
+			scores = cv_accuracy(name, trials, fold_dir, n_jobs, params)
+			best = int(np.argmax(scores))
+			drop, accuracy = current[best], float(scores[best])
+		current = [c for c in current if c != drop]
+		history.append({'removed': drop, 'n_features': len(current), 'accuracy': accuracy, 'features': current})
+		print(f"  {len(current)} features: accuracy={accuracy:.4f} after dropping {drop}")
+		if accuracy < target:
+			break
+
+	within = [h for h in history if h['accuracy'] >= target]
+	best = min(within, key=lambda h: (h['n_features'], -h['accuracy'])) if within else history[0]
+	return {'target': target, 'best': best, 'history': history}
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--model', default='rf', help='rf, gbt, lr or full name')
+	parser.add_argument('--start', choices=('all', 'model'), default='all',
+	                    help="start from every koi_* column or from the model's current FEATURES")
+	parser.add_argument('--method', choices=METHODS, default='recursive')
+	parser.add_argument('--target', type=float, default=None, help='minimum CV accuracy (default: start - tolerance)')
+	parser.add_argument('--tolerance', type=float, default=0.005)
+	parser.add_argument('--min-features', type=int, default=1)
+	parser.add_argument('--importance-only', action='store_true', help='rank features and stop')
+	parser.add_argument('--folds', type=int, default=3)
+	parser.add_argument('--repeats', type=int, default=5, help='shuffles per feature for permutation importance')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--jobs', type=int, default=-1, help='parallel workers (default: all cores)')
+	parser.add_argument('--data', default=None)
+	parser.add_argument('--models-dir', default=None)
+	args = parser.parse_args(argv)
+
+	name = resolve_models([args.model])[0]
+	features = trainer_module(name).FEATURES if args.start == 'model' else candidate_features(args.data)
+	fold_dir = prepare_folds(features, n_splits=args.folds, seed=42, csv_path=args.data)
+	print(f"{name}: {len(features)} candidate features, {args.folds} folds")
+
+	start = time.perf_counter()
+	ranking = permutation_importance(name, features, fold_dir, args.repeats, args.seed, args.jobs)
+	print(f"\nPermutation importance ({time.perf_counter() - start:.1f}s):")
+	print(ranking.to_string(index=False, float_format='{:.4f}'.format))
+	payload = {'model': name, 'n_splits': args.folds, 'importance': ranking.to_dict(orient='records')}
+
+	if not args.importance_only:
+		print(f"\n{args.method} elimination:")
+		start = time.perf_counter()
+		result = eliminate(name, features, fold_dir, args.method, args.target, args.tolerance, args.min_features,
+		                   args.repeats, args.seed, args.jobs)
+		best = result['best']
+		print(f"\nSmallest set within target ({len(best['features'])} features, accuracy {best['accuracy']:.4f}, "
+		      f"{time.perf_counter() - start:.1f}s): {best['features']}")
+		payload.update(method=args.method, **result)
+
+	print(f"Saved to: {save_json(payload, name, 'feature_selection', args.models_dir)}")
+	return payload
+
+
+if __name__ == "__main__":
+	main()
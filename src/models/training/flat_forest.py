@@ -0,0 +1,440 @@
+"""Tree ensembles compiled to flat node arrays.
+
+compile_ensemble() turns a fitted RandomForestClassifier, GradientBoostingClassifier
+or (binary) HistGradientBoostingClassifier into one set of contiguous arrays:
+every tree's nodes concatenated, children as global indices, and leaves
+pointing at themselves. FlatForest then walks all trees for all rows at once,
+one level per NumPy step, dropping (row, tree) pairs as they reach a leaf.
+There is no per-tree Python loop and no estimator input validation, which is
+what dominates sklearn's single-row latency. sklearn's compiled traversal is
+still faster on large batches (see `latency`).
+
+The arrays are saved as uncompressed .npy files. joblib.load(..., mmap_mode='r')
+does not help tree ensembles because sklearn's Tree copies its node arrays into
+private memory when it is unpickled. load_flat(mmap_mode='r') instead maps the
+same page-cache pages into every process, and a load only opens files.
+
+    python src/models/training/flat_forest.py export src/models/trained_models/random_forest_model.joblib /tmp/rf.flat
+    python src/models/training/flat_forest.py benchmark --workers 4
+    python src/models/training/flat_forest.py latency --models rf gbt
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from catalog_cache import install_cache
+
+
+FORMAT_VERSION = 2
+META_NAME = 'meta.json'
+ARRAYS = ('roots', 'feature', 'threshold', 'children', 'missing_left', 'leaf', 'value')
+SUPPORTED = ('RandomForestClassifier', 'ExtraTreesClassifier', 'GradientBoostingClassifier',
+             'HistGradientBoostingClassifier')
+PREDICT_BLOCK_ROWS = 4096
+
+
+def _sklearn_tree(tree, value):
+	return {
+		'feature': tree.feature,
+		'threshold': tree.threshold,
+		'left': tree.children_left,
+		'right': tree.children_right,
+		'missing_left': np.asarray(tree.missing_go_to_left),
+		'value': value,
+		'depth': tree.max_depth,
+		# Weighted training impurity R(t) on the root's scale, for cost-complexity pruning.
+		'cost': tree.impurity * tree.weighted_n_node_samples / tree.weighted_n_node_samples[0],
+	}
+
+
+def _hist_tree(predictor):
+	nodes = predictor.nodes
+	if nodes['is_categorical'].any():
+		raise ValueError("Categorical splits cannot be flattened")
+	leaf = nodes['is_leaf'].astype(bool)
+	return {
+		'feature': nodes['feature_idx'],
+		'threshold': nodes['num_threshold'],
+		'left': np.where(leaf, -1, nodes['left'].astype(np.int64)),
+		'right': np.where(leaf, -1, nodes['right'].astype(np.int64)),
+		'missing_left': nodes['missing_go_to_left'],
+		'value': nodes['value'],
+		'depth': int(predictor.get_max_depth()),
+	}
+
+
+def extract_trees(model):
+	"""(kind, input dtype, per-tree node dicts) for a supported fitted ensemble."""
+	name = type(model).__name__
+	if name not in SUPPORTED:
+		raise ValueError(f"Cannot flatten {name}; supported: {SUPPORTED}")
+	if name in ('RandomForestClassifier', 'ExtraTreesClassifier'):
+		if getattr(model, 'n_outputs_', 1) != 1:
+			raise ValueError("Only single-output forests can be flattened")
+		trees = []
+		for est in model.estimators_:
+			value = est.tree_.value[:, 0, :].astype(np.float32)
+			value /= np.maximum(value.sum(axis=1, keepdims=True), np.finfo(np.float32).tiny)
+			trees.append(_sklearn_tree(est.tree_, value))
+		return 'forest', 'float32', trees
+	if len(model.classes_) != 2:
+		raise ValueError("Only binary boosting models can be flattened")
+	if name == 'GradientBoostingClassifier':
+		if model.loss != 'log_loss':
+			raise ValueError(f"Only log_loss boosting can be flattened, not {model.loss}")
+		# Bake the learning rate into the leaves, as predict_stages applies it.
+		trees = [_sklearn_tree(est.tree_, est.tree_.value[:, 0, 0] * model.learning_rate)
+		         for est in model.estimators_[:, 0]]
+		return 'boosting', 'float32', trees
+	return 'boosting', 'float64', [_hist_tree(stage[0]) for stage in model._predictors]
+
+
+def flatten_trees(model, kind: str, input_dtype: str, trees):
+	"""Concatenate extract_trees() output (possibly edited) into (arrays, meta) for FlatForest."""
+	sizes = np.array([len(t['feature']) for t in trees])
+	offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+	def children(t, offset):
+		# Interleaved [left, right] per node; leaves point at themselves.
+		own = np.arange(len(t['left'])) + offset
+		pairs = [np.where(np.asarray(t[side]) < 0, own, np.asarray(t[side]) + offset) for side in ('left', 'right')]
+		return np.stack(pairs, axis=1).ravel()
+
+	value = np.concatenate([t['value'] for t in trees])
+	arrays = {
+		'roots': offsets.astype(np.int32),
+		'feature': np.concatenate([np.maximum(t['feature'], 0) for t in trees]).astype(np.int32),
+		'threshold': np.concatenate([t['threshold'] for t in trees]).astype(np.float64),
+		'children': np.concatenate([children(t, o) for t, o in zip(trees, offsets)]).astype(np.int32),
+		'missing_left': np.concatenate([t['missing_left'] for t in trees]).astype(bool),
+		'leaf': np.concatenate([np.asarray(t['left']) < 0 for t in trees]),
+		'value': value.astype(np.float32 if kind == 'forest' else np.float64),
+	}
+	meta = {
+		'format_version': FORMAT_VERSION,
+		'kind': kind,
+		'estimator': type(model).__name__,
+		'input_dtype': input_dtype,
+		'classes': [c.item() if isinstance(c, np.generic) else c for c in model.classes_],
+		'classes_dtype': model.classes_.dtype.str if model.classes_.dtype != object else 'object',
+		'n_features': int(model.n_features_in_),
+		'n_trees': len(trees),
+		'n_nodes': int(sizes.sum()),
+		'max_depth': int(max(t['depth'] for t in trees)),
+		'baseline': 0.0,
+	}
+	if kind == 'boosting':
+		# The raw score's constant term is whatever the trees do not explain at any one point.
+		x0 = np.zeros((1, meta['n_features']))
+		meta['baseline'] = float(model.decision_function(x0)[0] - FlatForest(arrays, meta).decision_function(x0)[0])
+	return arrays, meta
+
+
+def compile_ensemble(model):
+	"""Flatten a fitted tree ensemble; returns (arrays, meta) for FlatForest."""
+	return flatten_trees(model, *extract_trees(model))
+
+
+def compile_model(model):
+	"""In-memory FlatForest for a fitted ensemble."""
+	return FlatForest(*compile_ensemble(model))
+
+
+def write_flat(arrays: dict, meta: dict, out_dir: str):
+	"""Write arrays as .npy files plus meta.json, replacing out_dir atomically; returns out_dir.
+
+	Each call builds in its own temp dir beside out_dir, so concurrent writers
+	never share a half-written directory; if another writer installs between
+	this one setting the old layout aside and renaming its own, theirs is kept.
+	"""
+	meta = dict(meta, arrays=list(arrays))
+	out_dir = os.path.abspath(out_dir)
+	os.makedirs(os.path.dirname(out_dir), exist_ok=True)
+	tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(out_dir) + '.building-', dir=os.path.dirname(out_dir))
+	try:
+		for name, arr in arrays.items():
+			np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(arr))
+		with open(os.path.join(tmp_dir, META_NAME), 'w', encoding='utf-8') as f:
+			json.dump(meta, f, indent=2)
+	except BaseException:
+		shutil.rmtree(tmp_dir, ignore_errors=True)
+		raise
+	install_cache(tmp_dir, out_dir)
+	return out_dir
+
+
+def export_forest(model, out_dir: str):
+	"""Write a fitted ensemble's flat arrays and meta.json to out_dir; returns out_dir."""
+	return write_flat(*compile_ensemble(model), out_dir)
+
+
+class FlatForest:
+	"""predict / predict_proba over flat node arrays (memory-mapped or in memory)."""
+
+	def __init__(self, arrays: dict, meta: dict):
+		self.meta = meta
+		# Keep the estimator's label dtype so predict() matches sklearn's for non-string labels too.
+		self.classes_ = np.asarray(meta['classes'], dtype=meta.get('classes_dtype', 'object'))
+		self.n_features_in_ = meta['n_features']
+		self.input_dtype = np.dtype(meta['input_dtype'])
+		# compact_forest.py layouts: children as offsets from the node, thresholds as bin codes.
+		self.relative_children = meta.get('children') == 'relative'
+		self.binned = meta.get('thresholds') == 'bins'
+		for name in meta.get('arrays', ARRAYS):
+			# asarray drops the np.memmap subclass (and its per-index overhead) but keeps the mapping.
+			setattr(self, name, np.asarray(arrays[name]))
+
+	def _check(self, X):
+		X = np.ascontiguousarray(X, dtype=self.input_dtype)
+		if X.ndim == 1:
+			X = X[None, :]
+		if X.shape[1] != self.n_features_in_:
+			raise ValueError(f"Expected {self.n_features_in_} features, got {X.shape[1]}")
+		return X
+
+	def apply(self, X):
+		"""Global index of the leaf each row reaches in each tree, shape (rows, trees)."""
+		X = self._check(X)
+		n_rows, n_features = X.shape
+		has_nan = bool(np.isnan(X).any())
+		values = (self._bin_codes(X, has_nan) if self.binned else X).ravel()
+		# One entry per (row, tree) pair still above a leaf; finished pairs drop out each level.
+		node = np.tile(self.roots, n_rows)
+		row_start = np.repeat(np.arange(n_rows, dtype=np.int32) * n_features, len(self.roots))
+		out = node.copy()
+		pending = np.arange(len(node))
+		for _ in range(self.meta['max_depth']):
+			x = values[row_start + self.feature[node]]
+			go_right = ~(x <= self.threshold[node])
+			if has_nan:
+				missing = x == self.meta['nan_code'] if self.binned else np.isnan(x)
+				go_right &= ~(missing & self.missing_left[node])
+			step = self.children[2 * node + go_right]
+			node = node + step if self.relative_children else step
+			out[pending] = node
+			live = ~self.leaf[node]
+			if not live.all():
+				pending, node, row_start = pending[live], node[live], row_start[live]
+				if not len(pending):
+					break
+		return out.reshape(n_rows, len(self.roots))
+
+	def _bin_codes(self, X, has_nan: bool):
+		# Code = number of a feature's thresholds below x, so x <= threshold k exactly when code <= k.
+		codes = np.empty(X.shape, dtype=self.threshold.dtype)
+		for f in range(X.shape[1]):
+			table = self.bin_table[self.bin_offsets[f]:self.bin_offsets[f + 1]]
+			codes[:, f] = np.searchsorted(table, X[:, f], side='left')
+		if has_nan:
+			codes[np.isnan(X)] = self.meta['nan_code']
+		return codes
+
+	def _aggregate(self, X):
+		leaves = self.value[self.apply(X)]
+		if self.meta['kind'] == 'forest':
+			return leaves.mean(axis=1, dtype=np.float64)
+		return leaves.sum(axis=1, dtype=np.float64) + self.meta['baseline']
+
+	def _blocks(self, X):
+		X = self._check(X)
+		if len(X) <= PREDICT_BLOCK_ROWS:
+			return self._aggregate(X)
+		return np.concatenate([self._aggregate(X[i:i + PREDICT_BLOCK_ROWS])
+		                       for i in range(0, len(X), PREDICT_BLOCK_ROWS)])
+
+	def decision_function(self, X):
+		if self.meta['kind'] != 'boosting':
+			raise AttributeError("decision_function is only available for boosting models")
+		return self._blocks(X)
+
+	def predict_proba(self, X):
+		if self.meta['kind'] == 'forest':
+			return self._blocks(X)
+		positive = 1.0 / (1.0 + np.exp(-self._blocks(X)))
+		return np.column_stack([1.0 - positive, positive])
+
+	def predict(self, X):
+		return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def flat_format_version(path: str):
+	"""format_version stored in a flat directory, or None if there is no readable one."""
+	try:
+		with open(os.path.join(path, META_NAME), 'r', encoding='utf-8') as f:
+			return json.load(f).get('format_version')
+	except (OSError, ValueError):
+		return None
+
+
+def load_flat(path: str, mmap_mode: str = 'r'):
+	with open(os.path.join(path, META_NAME), 'r', encoding='utf-8') as f:
+		meta = json.load(f)
+	if meta.get('format_version') != FORMAT_VERSION:
+		raise ValueError(f"{path} has format {meta.get('format_version')}, expected {FORMAT_VERSION}")
+	arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+	          for name in meta.get('arrays', ARRAYS)}
+	return FlatForest(arrays, meta)
+
+
+def _memory_mb():
+	"""(PSS, private) of this process in MB; PSS splits shared pages between the processes mapping them."""
+	try:
+		with open('/proc/self/smaps_rollup', 'r', encoding='utf-8') as f:
+			fields = {line.split(':')[0]: int(line.split()[1]) for line in f if line.split()[-1:] == ['kB']}
+		return fields['Pss'] / 1024, (fields['Private_Clean'] + fields['Private_Dirty']) / 1024
+	except OSError:
+		import resource
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, None
+
+
+def _benchmark_worker(mode: str, path: str, X, loaded, measured, results):
+	import joblib
+	import sklearn.ensemble  # noqa: F401  -- import cost is not load cost; every mode pays it up front
+	base_pss, base_private = _memory_mb()
+	start = time.perf_counter()
+	if mode == 'joblib':
+		model = joblib.load(path)
+	elif mode == 'joblib-mmap':
+		model = joblib.load(path, mmap_mode='r')
+	else:
+		model = load_flat(path, mmap_mode='r')
+	load_seconds = time.perf_counter() - start
+	model.predict_proba(X)  # touch the pages a real request would
+	loaded.wait()
+	pss, private = _memory_mb()
+	results.put({'mode': mode, 'load_seconds': load_seconds, 'pss_mb': pss - base_pss,
+	             'private_mb': None if private is None else private - base_private})
+	measured.wait()
+
+
+def benchmark_loading(model_file: str, flat_dir: str, X, workers: int = 4, modes=('joblib', 'joblib-mmap', 'flat-mmap')):
+	"""Load the model in `workers` concurrent fresh processes per mode; report load time and memory."""
+	ctx = multiprocessing.get_context('spawn')
+	rows = []
+	for mode in modes:
+		path = flat_dir if mode == 'flat-mmap' else model_file
+		loaded, measured, results = ctx.Barrier(workers), ctx.Barrier(workers), ctx.Queue()
+		procs = [ctx.Process(target=_benchmark_worker, args=(mode, path, X, loaded, measured, results))
+		         for _ in range(workers)]
+		for p in procs:
+			p.start()
+		per_worker = [results.get() for _ in procs]
+		for p in procs:
+			p.join()
+		rows.append({
+			'mode': mode,
+			'workers': workers,
+			'load_ms': 1e3 * float(np.median([r['load_seconds'] for r in per_worker])),
+			'pss_mb_total': sum(r['pss_mb'] for r in per_worker),
+			'private_mb_per_worker': float(np.median([r['private_mb'] or 0.0 for r in per_worker])),
+		})
+	return rows
+
+
+def _median_seconds(fn, calls: int):
+	timings = []
+	for _ in range(calls):
+		start = time.perf_counter()
+		fn()
+		timings.append(time.perf_counter() - start)
+	return float(np.median(timings))
+
+
+def benchmark_latency(model, X, single_row_calls: int = 200, batch_repeats: int = 5):
+	"""Agreement and latency of a compiled model against the sklearn estimator on X.
+
+	Single-row latency is one predict plus one predict_proba, as the game page
+	does per planet.
+	"""
+	flat = compile_model(model)
+	proba, flat_proba = model.predict_proba(X), flat.predict_proba(X)
+	row = X[:1]
+	result = {
+		'estimator': type(model).__name__,
+		'n_trees': flat.meta['n_trees'],
+		'n_nodes': flat.meta['n_nodes'],
+		'max_depth': flat.meta['max_depth'],
+		'max_proba_diff': float(np.max(np.abs(proba - flat_proba))),
+		'label_mismatch': float(np.mean(model.predict(X) != flat.predict(X))),
+	}
+	for tag, m in (('sklearn', model), ('flat', flat)):
+		m.predict_proba(row)  # warm up
+		result[f'row_us_{tag}'] = 1e6 * _median_seconds(lambda: (m.predict(row), m.predict_proba(row)), single_row_calls)
+		result[f'batch_ms_{tag}'] = 1e3 * _median_seconds(lambda: m.predict_proba(X), batch_repeats)
+	result['row_speedup'] = result['row_us_sklearn'] / result['row_us_flat']
+	result['batch_speedup'] = result['batch_ms_sklearn'] / result['batch_ms_flat']
+	return result
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	sub = parser.add_subparsers(dest='command', required=True)
+	exp = sub.add_parser('export', help='flatten a saved random forest')
+	exp.add_argument('model_file')
+	exp.add_argument('out_dir')
+	bench = sub.add_parser('benchmark', help='compare joblib.load with memory-mapped flat arrays')
+	bench.add_argument('--model-file', default=None, help='default: trained_models/random_forest_model.joblib')
+	bench.add_argument('--workers', type=int, default=4)
+	bench.add_argument('--data', default=None)
+	lat = sub.add_parser('latency', help='compare compiled and sklearn predict latency on saved models')
+	lat.add_argument('--models', nargs='+', default=['rf', 'gbt'])
+	lat.add_argument('--rows', type=int, default=None, help='batch size (default: the whole catalog)')
+	lat.add_argument('--calls', type=int, default=200, help='single-row calls to time')
+	lat.add_argument('--data', default=None)
+	lat.add_argument('--models-dir', default=None)
+	args = parser.parse_args(argv)
+
+	import joblib
+	if args.command == 'export':
+		export_forest(joblib.load(args.model_file), args.out_dir)
+		print(f"Wrote {args.out_dir}")
+		return
+
+	import tempfile
+	import pandas as pd
+	from artifacts import model_path, save_json
+	from catalog_cache import load_columns
+
+	if args.command == 'latency':
+		from train import resolve_models, trainer_module
+		rows = []
+		for name in resolve_models(args.models):
+			features = trainer_module(name).FEATURES
+			X = load_columns(features, csv_path=args.data, drop_rejected=True).to_numpy(dtype=np.float32)[:args.rows]
+			rows.append({'model': name, **benchmark_latency(joblib.load(model_path(name, args.models_dir)), X,
+			                                               args.calls)})
+		report = pd.DataFrame(rows).set_index('model')
+		with pd.option_context('display.width', 200, 'display.max_columns', None):
+			print(report.T.to_string(float_format=lambda v: f'{v:.4g}'))
+		print(f"Saved report to: {save_json({'rows': len(X), 'models': rows}, 'flat_forest', 'latency', args.models_dir)}")
+		return report
+
+	from random_forest import FEATURES
+
+	model_file = args.model_file or model_path('random_forest')
+	model = joblib.load(model_file)
+	X = load_columns(FEATURES, csv_path=args.data, drop_rejected=True).fillna(0).to_numpy(dtype=np.float32)[:2000]
+	work_dir = tempfile.mkdtemp(prefix='exoura_flat_')
+	try:
+		# Uncompressed copy so joblib's mmap_mode has arrays to map.
+		raw_file = os.path.join(work_dir, 'model.joblib')
+		joblib.dump(model, raw_file, compress=0)
+		flat_dir = export_forest(model, os.path.join(work_dir, 'model.flat'))
+		flat = load_flat(flat_dir)
+		diff = np.max(np.abs(flat.predict_proba(X) - model.predict_proba(X)))
+		print(f"{model_file}: {len(model.estimators_)} trees, {flat.meta['n_nodes']} nodes; "
+		      f"max |proba diff| vs sklearn = {diff:.2e}")
+		rows = benchmark_loading(raw_file, flat_dir, X, args.workers)
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+	print(pd.DataFrame(rows).set_index('mode').to_string(float_format=lambda v: f'{v:.2f}'))
+
+
+if __name__ == "__main__":
+	main()
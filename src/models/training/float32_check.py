@@ -0,0 +1,106 @@
+"""Compare the float32 pipeline against the original float64 one.
+
+Both paths start from the same CSV read. The float64 path keeps pandas'
+defaults, as the scripts did before the catalog cache existed. The float32
+path casts once at load, matching the cache and train.py's shared split. Each
+model is fitted on both with the same split and seed. The report gives, per
+model:
+
+- feature-matrix bytes;
+- peak traced memory during fit: trees given float64 make their own float32
+  copy, which the float32 path avoids;
+- fit time;
+- accuracy;
+- the share of test predictions that differ, and the largest probability gap.
+
+    python src/models/training/float32_check.py
+    python src/models/training/float32_check.py --models rf gbt
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+from artifacts import save_json
+from catalog_cache import default_catalog_path
+from train import LABEL, resolve_models, trainer_module, union_features
+
+
+def load_both(features, csv_path: str = None):
+	"""(X64, X32, y) from one CSV read, mean-imputed, rows without a label dropped."""
+	df = pd.read_csv(csv_path or default_catalog_path(), comment='#', usecols=list(features) + [LABEL],
+	                 low_memory=False)
+	df = df[df[LABEL].notna()]
+	X = df[list(features)].apply(pd.to_numeric, errors='coerce')
+	X = X.fillna(X.mean())
+	X64 = np.ascontiguousarray(X.to_numpy(dtype=np.float64))
+	return X64, X64.astype(np.float32), df[LABEL].astype(str).str.strip().to_numpy()
+
+
+def _fit(module, X, y):
+	model = module.build_model()
+	fit = getattr(module, 'fit_model', None)
+	if fit is not None:
+		fit(model, X, y)
+	else:
+		model.fit(X, y)
+	return model
+
+
+def compare_model(name: str, X64, X32, y, features, test_size: float = 0.2, seed: int = 42):
+	module = trainer_module(name)
+	cols = [features.index(c) for c in module.FEATURES]
+	train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=test_size, random_state=seed, stratify=y)
+
+	row = {'model': name}
+	probas = {}
+	for tag, X in (('float64', X64), ('float32', X32)):
+		X_model = np.ascontiguousarray(X[:, cols])
+		X_train, X_test = X_model[train_idx], X_model[test_idx]
+
+		start = time.perf_counter()
+		model = _fit(module, X_train, y[train_idx])
+		row[f'fit_s_{tag}'] = time.perf_counter() - start
+		tracemalloc.start()
+		_fit(module, X_train, y[train_idx])
+		row[f'fit_peak_mb_{tag}'] = tracemalloc.get_traced_memory()[1] / 1e6
+		tracemalloc.stop()
+
+		row[f'X_mb_{tag}'] = X_model.nbytes / 1e6
+		row[f'accuracy_{tag}'] = accuracy_score(y[test_idx], model.predict(X_test))
+		probas[tag] = model.predict_proba(X_test)
+		row[f'pred_{tag}'] = model.predict(X_test)
+
+	row['pred_diff_share'] = float(np.mean(row.pop('pred_float64') != row.pop('pred_float32')))
+	row['max_proba_diff'] = float(np.max(np.abs(probas['float64'] - probas['float32'])))
+	return row
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--models', nargs='+', default=None, help='rf, gbt, lr or full names (default: all)')
+	parser.add_argument('--seed', type=int, default=42)
+	parser.add_argument('--data', default=None, help='catalog CSV (default: src/data/keplar.csv)')
+	parser.add_argument('--models-dir', default=None)
+	args = parser.parse_args(argv)
+
+	models = resolve_models(args.models)
+	features = union_features(models)
+	X64, X32, y = load_both(features, args.data)
+	print(f"Feature matrix: {X64.nbytes / 1e6:.2f} MB as float64, {X32.nbytes / 1e6:.2f} MB as float32")
+
+	rows = [compare_model(name, X64, X32, y, features, seed=args.seed) for name in models]
+	report = pd.DataFrame(rows).set_index('model')
+	with pd.option_context('display.width', 200, 'display.max_columns', None):
+		print(report.T.to_string(float_format=lambda v: f'{v:.4g}'))
+	path = save_json({'n_rows': int(len(y)), 'features': features, 'models': rows}, 'float32', 'check', args.models_dir)
+	print(f"Saved report to: {path}")
+	return report
+
+
+if __name__ == "__main__":
+	main()
@@ -1,11 +1,40 @@
+import argparse
 import os
+import time
 import matplotlib.pyplot as plt
 from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay
 import joblib
+import numpy as np
 import pandas as pd
+from scipy.special import expit, softmax
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import GradientBoostingClassifier
-from sklearn.metrics import classification_report, accuracy_score
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.metrics import classification_report, accuracy_score, log_loss
+
+from artifacts import model_size_bytes, save_confusion_matrix, save_json, save_model
+from catalog_cache import load_columns
+from delta_ingest import cached_column_means
+from model_registry import register_model
+
+
+MODEL_NAME = 'gradient_boosted_trees'
+FEATURES = [
+	'koi_period',
+	'koi_duration',
+	'koi_depth',
+	'koi_prad',
+	'koi_model_snr',
+]
+LABEL = 'koi_pdisposition'
+
+# 'hist' bins features into 255 buckets, handles NaN natively and stops early on a
+# held-out fraction; 'classic' is the original 300-stage GradientBoostingClassifier.
+ENGINES = ('hist', 'classic')
+DEFAULT_ENGINE = 'hist'
+
+# Stop once held-out log loss has not improved for this many stages.
+EARLY_STOPPING_PATIENCE = 20
+VALIDATION_FRACTION = 0.1
 
 
 def get_project_paths():
@@ -19,31 +48,35 @@ def get_project_paths():
 	return data_path, model_path
 
 
-def load_data(dataset_path: str):
-	df = pd.read_csv(dataset_path, comment='#')
-
-	feature_cols = [
-		'koi_period',
-		'koi_duration',
-		'koi_depth',
-		'koi_prad',
-		'koi_model_snr',
-	]
+def load_data(dataset_path: str, impute: bool = True):
+	feature_cols = list(FEATURES)
 
+	df = load_columns(feature_cols + [LABEL], csv_path=dataset_path, drop_rejected=True)
 	X = df[feature_cols]
-	y = df['koi_pdisposition']
+	y = df[LABEL]
 
-	X = X.apply(pd.to_numeric, errors='coerce')
-	X = X.fillna(X.mean(numeric_only=True))
+	if impute:
+		X = X.fillna(cached_column_means(feature_cols, dataset_path))
 	return X, y, feature_cols
 
 
-def train_and_evaluate(X, y):
-	X_train, X_test, y_train, y_test = train_test_split(
-		X, y, test_size=0.2, random_state=42, stratify=y if hasattr(y, 'nunique') and y.nunique() > 1 else None
-	)
-
-	gbt = GradientBoostingClassifier(
+def build_model(engine: str = DEFAULT_ENGINE, **params):
+	if engine == 'hist':
+		defaults = dict(
+			random_state=48,
+			max_iter=500,
+			learning_rate=0.1,
+			max_leaf_nodes=31,
+			early_stopping=True,
+			scoring='loss',
+			validation_fraction=VALIDATION_FRACTION,
+			n_iter_no_change=EARLY_STOPPING_PATIENCE,
+		)
+		defaults.update(params)
+		return HistGradientBoostingClassifier(**defaults)
+	if engine != 'classic':
+		raise ValueError(f"Unknown engine '{engine}'. Choose from: {ENGINES}")
+	defaults = dict(
 		random_state=48,
 		n_estimators=300,
 		learning_rate=0.05,
@@ -51,8 +84,118 @@ def train_and_evaluate(X, y):
 		subsample=0.9,
 		max_features=None,
 	)
+	defaults.update(params)
+	return GradientBoostingClassifier(**defaults)
+
+
+def needs_imputation(engine: str = DEFAULT_ENGINE, **params):
+	"""Only the classic engine needs missing values filled; hist routes NaN itself."""
+	return engine != 'hist'
+
+
+def split_data(X, y):
+	return train_test_split(
+		X, y, test_size=0.2, random_state=42, stratify=y if hasattr(y, 'nunique') and y.nunique() > 1 else None
+	)
+
+
+def _truncate_classic(model, n_stages: int):
+	model.estimators_ = model.estimators_[:n_stages]
+	model.train_score_ = model.train_score_[:n_stages]
+	for attr in ('oob_improvement_', 'oob_scores_'):
+		if hasattr(model, attr):
+			setattr(model, attr, getattr(model, attr)[:n_stages])
+	if hasattr(model, 'oob_scores_'):
+		model.oob_score_ = model.oob_scores_[-1]
+	model.n_estimators_ = n_stages
+	model.set_params(n_estimators=n_stages)
+
+
+def _truncate_hist(model, n_iter: int):
+	# HistGradientBoostingClassifier keeps one list of predictors per iteration;
+	# prediction sums over whatever is in that list (n_iter_ is derived from it
+	# in recent sklearn releases and a plain attribute in older ones). The score
+	# arrays hold n_iter_ + 1 entries (the first is the baseline) and a later
+	# warm_start fit appends to them, so they are cut to match.
+	model._predictors = model._predictors[:n_iter]
+	if not isinstance(getattr(type(model), 'n_iter_', None), property):
+		model.n_iter_ = n_iter
+	for attr in ('train_score_', 'validation_score_'):
+		scores = getattr(model, attr, None)
+		if scores is not None and len(scores):
+			setattr(model, attr, scores[:n_iter + 1])
+	drop_stale_scores(model)
+
+
+def drop_stale_scores(model):
+	"""Empty hist score arrays that no longer cover every iteration.
+
+	A warm_start fit without early stopping adds predictors but no scores, so
+	after a continuation the arrays describe only the first stages. They are
+	reset to the empty arrays sklearn uses when it tracks no scores at all.
+	"""
+	for attr in ('train_score_', 'validation_score_'):
+		scores = getattr(model, attr, None)
+		if scores is not None and len(scores) and len(scores) != model.n_iter_ + 1:
+			setattr(model, attr, np.empty(0, dtype=np.float64))
+
 
-	gbt.fit(X_train, y_train)
+def fit_model(model, X, y, patience: int = EARLY_STOPPING_PATIENCE, validation_fraction: float = VALIDATION_FRACTION):
+	"""Fit with early stopping on held-out log loss and truncate to the best stage.
+
+	The hist engine tracks validation loss itself. For the classic engine a
+	stratified slice of the training rows is held out and a fit monitor updates
+	its raw scores one tree at a time, so every stage costs one tree prediction.
+	Returns the loss curve (per stage) and the best stage count.
+	"""
+	if isinstance(model, HistGradientBoostingClassifier):
+		model.fit(X, y)
+		val_loss = -np.asarray(model.validation_score_)
+		train_loss = -np.asarray(model.train_score_)
+		best = max(1, int(np.argmin(val_loss[1:])) + 1)
+		fitted = model.n_iter_
+		_truncate_hist(model, best)
+		return {'engine': 'hist', 'stages_fitted': int(fitted), 'best_stages': best,
+		        'train_loss': train_loss[1:].tolist(), 'validation_loss': val_loss[1:].tolist()}
+
+	X_fit, X_val, y_fit, y_val = train_test_split(
+		X, y, test_size=validation_fraction, random_state=42, stratify=y
+	)
+	X_val = np.asarray(X_val, dtype=np.float32)
+	y_val = np.asarray(y_val)
+	val_loss = []
+	state = {'raw': None}
+
+	def monitor(i, est, _locals):
+		if state['raw'] is None:
+			prior = np.clip(est.init_.predict_proba(X_val), 1e-12, 1 - 1e-12)
+			state['raw'] = np.log(prior[:, 1:] / prior[:, :1]) if prior.shape[1] == 2 else np.log(prior)
+		for k, tree in enumerate(est.estimators_[i]):
+			state['raw'][:, k] += est.learning_rate * tree.predict(X_val)
+		if state['raw'].shape[1] == 1:
+			p = expit(state['raw'][:, 0])
+			proba = np.column_stack([1 - p, p])
+		else:
+			proba = softmax(state['raw'], axis=1)
+		val_loss.append(log_loss(y_val, proba, labels=est.classes_))
+		best = int(np.argmin(val_loss))
+		return i - best >= patience
+
+	model.fit(X_fit, y_fit, monitor=monitor)
+	fitted = len(model.estimators_)
+	best = int(np.argmin(val_loss)) + 1
+	_truncate_classic(model, best)
+	return {'engine': 'classic', 'stages_fitted': fitted, 'best_stages': best,
+	        'train_loss': model.train_score_.tolist(), 'validation_loss': val_loss}
+
+
+def train_and_evaluate(X, y, engine: str = DEFAULT_ENGINE):
+	X_train, X_test, y_train, y_test = split_data(X, y)
+
+	gbt = build_model(engine)
+
+	curve = fit_model(gbt, X_train, y_train)
+	print(f"Early stopping: best {curve['best_stages']} of {curve['stages_fitted']} stages fitted")
 
 	y_pred = gbt.predict(X_test)
 	acc = accuracy_score(y_test, y_pred)
@@ -65,7 +208,7 @@ def train_and_evaluate(X, y):
 	disp.plot(cmap='Blues')
 	plt.title('Gradient Boosted Trees - Confusion Matrix')
 
-	return gbt, acc, (labels_sorted, cnf_matrix)
+	return gbt, acc, (labels_sorted, cnf_matrix), curve
 
 
 def show_feature_importance(model, feature_names):
@@ -76,26 +219,82 @@ def show_feature_importance(model, feature_names):
 		print("\nFeature Importance:")
 		print(fi_sorted)
 
-def main():
+
+def benchmark_engines(dataset_path: str, engines=ENGINES, single_row_calls: int = 200):
+	"""Fit each engine on the same split; report fit time, predict latency, size and accuracy.
+
+	The classic engine gets the usual mean-filled features; the hist engine sees
+	the raw features with NaNs left in place.
+	"""
+	X_raw, y, _ = load_data(dataset_path, impute=False)
+	X_train_raw, X_test_raw, y_train, y_test = split_data(X_raw, y)
+	means = cached_column_means(list(X_raw.columns), dataset_path)
+
+	rows = []
+	for engine in engines:
+		X_train, X_test = X_train_raw, X_test_raw
+		if engine == 'classic':
+			X_train, X_test = X_train.fillna(means), X_test.fillna(means)
+		X_train, X_test = X_train.to_numpy(), X_test.to_numpy()
+
+		model = build_model(engine)
+		start = time.perf_counter()
+		fit_model(model, X_train, y_train)
+		fit_seconds = time.perf_counter() - start
+
+		start = time.perf_counter()
+		y_pred = model.predict(X_test)
+		batch_seconds = time.perf_counter() - start
+
+		one = X_test[:1]
+		timings = []
+		for _ in range(single_row_calls):
+			start = time.perf_counter()
+			model.predict_proba(one)
+			timings.append(time.perf_counter() - start)
+
+		rows.append({
+			'engine': engine,
+			'n_stages': int(getattr(model, 'n_iter_', getattr(model, 'n_estimators_', 0))),
+			'fit_s': fit_seconds,
+			'predict_batch_ms': batch_seconds * 1e3,
+			'predict_row_us': float(np.median(timings)) * 1e6,
+			'size_kb': model_size_bytes(model) / 1024,
+			'accuracy': accuracy_score(y_test, y_pred),
+		})
+	return pd.DataFrame(rows).set_index('engine')
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Train the gradient boosted trees model.')
+	parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE)
+	parser.add_argument('--benchmark', action='store_true', help='compare both engines on the same split and exit')
+	args = parser.parse_args(argv)
+
 	dataset_path, model_path = get_project_paths()
 
-	X, y, feature_names = load_data(dataset_path)
-	model, acc, (labels_sorted, cnf_matrix) = train_and_evaluate(X, y)
+	if args.benchmark:
+		print(benchmark_engines(dataset_path).to_string(float_format=lambda v: f'{v:.4f}'))
+		return
+
+	impute = needs_imputation(args.engine)
+	X, y, feature_names = load_data(dataset_path, impute=impute)
+	model, acc, (labels_sorted, cnf_matrix), curve = train_and_evaluate(X, y, args.engine)
 	show_feature_importance(model, feature_names)
 
-	joblib.dump(model, model_path)
-	print(f"\nSaved Gradient Boosted Trees model to: {model_path}")
+	models_dir = os.path.dirname(model_path)
+	model_path = save_model(model, MODEL_NAME, models_dir)
+	X_train = split_data(X, y)[0]  # the rows train_and_evaluate fitted on
+	manifest = register_model(model_path, MODEL_NAME, model, feature_names, X_train, metrics={'accuracy': float(acc)},
+	                          params={'engine': args.engine}, imputation='mean' if impute else 'none',
+	                          models_dir=models_dir)
+	print(f"\nSaved Gradient Boosted Trees model to: {model_path} (registry v{manifest['version']})")
 
 	# Save confusion matrix as raw text (TSV)
-	models_dir = os.path.dirname(model_path)
-	cm_txt_path = os.path.join(models_dir, 'gradient_boosted_trees_confusion_matrix.txt')
-	labels = list(labels_sorted)
-	with open(cm_txt_path, 'w', encoding='utf-8') as f:
-		f.write('label\t' + '\t'.join(str(l) for l in labels) + '\n')
-		for i, lab in enumerate(labels):
-			row_vals = '\t'.join(str(int(v)) for v in cnf_matrix[i])
-			f.write(f"{lab}\t{row_vals}\n")
+	cm_txt_path = save_confusion_matrix(labels_sorted, cnf_matrix, MODEL_NAME, os.path.dirname(model_path))
 	print(f"Saved Gradient Boosted Trees confusion matrix to: {cm_txt_path}")
+	curve_path = save_json(curve, MODEL_NAME, 'loss_curve', os.path.dirname(model_path))
+	print(f"Saved Gradient Boosted Trees loss curve to: {curve_path}")
 
 	plt.show()
 
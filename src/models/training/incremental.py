@@ -0,0 +1,161 @@
+"""Refresh saved forest / boosting models after delta ingestion instead of refitting from scratch.
+
+Random forest: the oldest `--fraction` of trees are dropped and the same number
+of new trees is grown with warm_start on the current catalog. Boosting: the
+saved model continues with `--stages` more stages via warm_start. In both cases
+the refreshed model is scored against the saved one on the rows held out when
+the model was trained (<name>_holdout.json, written by train.py) plus a stable
+share of rows added since, which neither model trains on. It only replaces the
+artifact if accuracy does not regress beyond `--tolerance`.
+
+    python src/models/training/incremental.py --models rf gbt
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+from sklearn.metrics import accuracy_score
+
+from artifacts import get_models_dir, load_holdout, model_path, save_json, save_model
+from catalog_cache import ensure_cache
+from delta_ingest import read_changelog
+from gradient_boosted_trees import drop_stale_scores
+from model_registry import register_model
+from train import imputes, load_shared_data, load_split_keys, prepare_shared_data, resolve_models, trainer_module
+
+
+SUPPORTED = ('random_forest', 'gradient_boosted_trees')
+
+
+def refresh_state_path(name: str, models_dir: str = None):
+	return os.path.join(get_models_dir(models_dir), f'{name}_refresh.json')
+
+
+def _last_batch(name: str, models_dir: str = None):
+	path = refresh_state_path(name, models_dir)
+	if not os.path.exists(path):
+		return 0
+	with open(path, 'r', encoding='utf-8') as f:
+		return json.load(f).get('batch', 0)
+
+
+def refresh_forest(model, X, y, fraction: float = 0.1, seed: int = None):
+	"""Replace the oldest `fraction` of trees with new ones grown on (X, y)."""
+	n_old = len(model.estimators_)
+	n_new = max(1, int(round(n_old * fraction)))
+	model.set_params(warm_start=True, n_estimators=n_old + n_new)
+	if seed is not None:
+		model.set_params(random_state=seed)
+	model.fit(X, y)
+	model.estimators_ = model.estimators_[n_new:]
+	model.set_params(n_estimators=len(model.estimators_), warm_start=False)
+	return model, n_new
+
+
+def continue_boosting(model, X, y, stages: int = 50):
+	"""Add `stages` boosting stages on (X, y) on top of the saved ones."""
+	if hasattr(model, 'max_iter'):
+		# Early stopping would otherwise cap the continued fit at the saved n_iter_.
+		model.set_params(warm_start=True, max_iter=model.n_iter_ + stages, early_stopping=False)
+	else:
+		model.set_params(warm_start=True, n_estimators=len(model.estimators_) + stages)
+	model.fit(X, y)
+	model.set_params(warm_start=False)
+	if hasattr(model, 'max_iter'):
+		drop_stale_scores(model)
+	return model, stages
+
+
+def refresh_model(name: str, work_dir: str, models_dir: str = None, fraction: float = 0.1, stages: int = 50,
+                  tolerance: float = 0.002, seed: int = None):
+	"""Refresh one model on a split prepared from its saved held-out keys; save and register it if accuracy holds."""
+	module = trainer_module(name)
+	impute = imputes(name)
+	X_train, X_test, y_train, y_test, _ = load_shared_data(work_dir, module.FEATURES, impute)
+	path = model_path(name, models_dir)
+	saved = joblib.load(path)
+	baseline = accuracy_score(y_test, saved.predict(X_test))
+
+	candidate = copy.deepcopy(saved)
+	start = time.perf_counter()
+	if name == 'random_forest':
+		candidate, added = refresh_forest(candidate, X_train, y_train, fraction, seed)
+	else:
+		candidate, added = continue_boosting(candidate, X_train, y_train, stages)
+	fit_seconds = time.perf_counter() - start
+	acc = accuracy_score(y_test, candidate.predict(X_test))
+
+	accepted = acc >= baseline - tolerance
+	if accepted:
+		register_model(save_model(candidate, name, models_dir), name, candidate, module.FEATURES, X_train,
+		               metrics={'accuracy': float(acc), 'baseline_accuracy': float(baseline),
+		                        'n_train': int(len(y_train)), 'n_test': int(len(y_test))},
+		               imputation='mean' if impute else 'none', models_dir=models_dir)
+	return {
+		'model': name,
+		'added': added,
+		'fit_seconds': fit_seconds,
+		'baseline_accuracy': baseline,
+		'accuracy': acc,
+		'accepted': accepted,
+	}
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--models', nargs='+', default=['rf', 'gbt'])
+	parser.add_argument('--fraction', type=float, default=0.1, help='share of forest trees to replace')
+	parser.add_argument('--stages', type=int, default=50, help='boosting stages to add')
+	parser.add_argument('--tolerance', type=float, default=0.002, help='allowed accuracy drop before rejecting')
+	parser.add_argument('--seed', type=int, default=42, help='random seed for the new trees')
+	parser.add_argument('--force', action='store_true', help='refresh even if no catalog rows changed')
+	parser.add_argument('--data', default=None)
+	parser.add_argument('--models-dir', default=None)
+	args = parser.parse_args(argv)
+
+	models = [m for m in resolve_models(args.models) if m in SUPPORTED]
+	ensure_cache(args.data)
+	changelog = read_changelog(args.data)
+	latest = changelog[-1]['batch'] if changelog else 0
+
+	todo = []
+	for name in models:
+		since = _last_batch(name, args.models_dir)
+		changed = sum(len(e['new_rows']) + len(e['changed_rows']) for e in changelog if e['batch'] > since)
+		if not changed and not args.force:
+			print(f"{name}: no catalog changes since batch {since}, skipping")
+		elif not os.path.exists(model_path(name, args.models_dir)):
+			print(f"{name}: no saved model to refresh; run train.py first")
+		elif load_holdout(name, args.models_dir) is None:
+			print(f"{name}: no saved held-out split to score against; retrain with train.py first")
+		else:
+			todo.append((name, changed))
+	if not todo:
+		return
+
+	work_dir = tempfile.mkdtemp(prefix='exoura_refresh_')
+	try:
+		for name, changed in todo:
+			# Each model keeps the split it was trained on, so every one gets its own arrays.
+			model_dir = os.path.join(work_dir, name)
+			prepare_shared_data([name], model_dir, csv_path=args.data, split=load_holdout(name, args.models_dir))
+			r = refresh_model(name, model_dir, args.models_dir, args.fraction, args.stages, args.tolerance,
+			                  seed=args.seed + latest)
+			status = 'saved' if r['accepted'] else 'rejected (kept previous model)'
+			print(f"{name}: {changed} changed rows, +{r['added']} trees/stages in {r['fit_seconds']:.2f}s, "
+			      f"accuracy {r['baseline_accuracy']:.4f} -> {r['accuracy']:.4f}, {status}")
+			if r['accepted']:
+				with open(refresh_state_path(name, args.models_dir), 'w', encoding='utf-8') as f:
+					json.dump({'batch': latest, **r}, f, indent=2)
+				save_json(load_split_keys(model_dir), name, 'holdout', args.models_dir)
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+	main()
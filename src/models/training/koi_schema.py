@@ -0,0 +1,101 @@
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnSpec(NamedTuple):
+	name: str
+	dtype: str
+	unit: str
+	valid_min: Optional[float] = None
+	valid_max: Optional[float] = None
+	description: str = ''
+	min_inclusive: bool = True
+
+
+class LabelSpec(NamedTuple):
+	name: str
+	classes: Tuple[str, ...]
+	description: str = ''
+
+
+# Earth radius in solar radii, for transit depth ~ (Rp / R*)^2.
+R_EARTH_IN_R_SUN = 0.0091577
+
+FEATURE_DTYPE = np.float32
+LABEL_CODE_DTYPE = np.int8
+
+KOI_COLUMNS = {
+	spec.name: spec for spec in [
+		ColumnSpec('koi_period', 'float32', 'days', 0.0, None, 'Orbital period', min_inclusive=False),
+		ColumnSpec('koi_duration', 'float32', 'hours', 0.0, None, 'Transit duration', min_inclusive=False),
+		ColumnSpec('koi_depth', 'float32', 'ppm', 0.0, 1e6, 'Transit depth'),
+		ColumnSpec('koi_prad', 'float32', 'Earth radii', 0.0, None, 'Planetary radius', min_inclusive=False),
+		ColumnSpec('koi_dor', 'float32', 'unitless', 0.0, None, 'Planet-star distance over star radius (a/R*)', min_inclusive=False),
+		ColumnSpec('koi_impact', 'float32', 'unitless', 0.0, None, 'Impact parameter'),
+		ColumnSpec('koi_model_snr', 'float32', 'unitless', 0.0, None, 'Transit signal-to-noise'),
+		ColumnSpec('koi_teq', 'float32', 'K', 0.0, None, 'Equilibrium temperature'),
+		ColumnSpec('koi_insol', 'float32', 'Earth flux', 0.0, None, 'Insolation flux'),
+		ColumnSpec('koi_score', 'float32', 'unitless', 0.0, 1.0, 'Disposition score'),
+		ColumnSpec('koi_steff', 'float32', 'K', 0.0, None, 'Stellar effective temperature'),
+		ColumnSpec('koi_slogg', 'float32', 'log10(cm/s**2)', None, None, 'Stellar surface gravity'),
+		ColumnSpec('koi_srad', 'float32', 'Solar radii', 0.0, None, 'Stellar radius'),
+		ColumnSpec('koi_kepmag', 'float32', 'mag', None, None, 'Kepler-band magnitude'),
+		ColumnSpec('ra', 'float64', 'deg', 0.0, 360.0, 'Right ascension'),
+		ColumnSpec('dec', 'float64', 'deg', -90.0, 90.0, 'Declination'),
+	]
+}
+
+KOI_LABELS = {
+	spec.name: spec for spec in [
+		LabelSpec('koi_pdisposition', ('CANDIDATE', 'FALSE POSITIVE'), 'Disposition using Kepler data'),
+		LabelSpec('koi_disposition', ('CANDIDATE', 'CONFIRMED', 'FALSE POSITIVE'), 'Exoplanet Archive disposition'),
+	]
+}
+
+
+def column_dtype(col: str):
+	"""Storage dtype for a numeric column; unknown columns keep float64."""
+	spec = KOI_COLUMNS.get(col)
+	return np.dtype(spec.dtype) if spec else np.dtype(np.float64)
+
+
+def is_label(col: str):
+	return col in KOI_LABELS
+
+
+def label_categories(col: str, observed=()):
+	"""Declared classes first (stable codes), then any unexpected values seen in the data."""
+	declared = list(KOI_LABELS[col].classes) if col in KOI_LABELS else []
+	extras = sorted(set(str(v) for v in observed) - set(declared))
+	return declared + extras
+
+
+def encode_labels(series: pd.Series, col: str):
+	"""Return the label column as a pandas Categorical with schema-ordered categories."""
+	values = series.astype('string').str.strip()
+	categories = label_categories(col, values.dropna().unique())
+	return pd.Categorical(values, categories=categories)
+
+
+def label_code_dtype(categories):
+	return np.dtype(LABEL_CODE_DTYPE) if len(categories) < np.iinfo(LABEL_CODE_DTYPE).max else np.dtype(np.int32)
+
+
+def apply_schema(df: pd.DataFrame):
+	"""Coerce a raw catalog frame to schema dtypes: float32 features, categorical labels."""
+	out = {}
+	for col in df.columns:
+		if is_label(col):
+			out[col] = encode_labels(df[col], col)
+		elif col in KOI_COLUMNS:
+			out[col] = pd.to_numeric(df[col], errors='coerce').astype(column_dtype(col))
+		else:
+			out[col] = df[col]
+	return pd.DataFrame(out, index=df.index)
+
+
+def feature_matrix(df: pd.DataFrame, feature_cols, dtype=FEATURE_DTYPE):
+	"""C-contiguous feature matrix in the given dtype, ready to hand to sklearn."""
+	return np.ascontiguousarray(df[list(feature_cols)].to_numpy(dtype=dtype, na_value=np.nan))
@@ -1,70 +1,142 @@
+import argparse
+import time
+import warnings
 import numpy as np
 import pandas as pd
 import os
+from sklearn.compose import ColumnTransformer
+from sklearn.exceptions import ConvergenceWarning
 from sklearn.metrics import accuracy_score, ConfusionMatrixDisplay, confusion_matrix
 from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, StandardScaler
 import matplotlib.pyplot as plt
 from pathlib import Path
 import joblib
 
-
-df = pd.read_csv('src/data/keplar.csv', comment='#')
-
-
-X = df[['koi_depth', 'koi_duration', 'koi_period', 'koi_prad', 'koi_impact']]
-y = df['koi_pdisposition']
-
-X = X.fillna(X.mean())
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=50)
-
-log_reg_model = LogisticRegression()
-log_reg_model.fit(X=X_train, y=y_train)
-
-
-y_pred=log_reg_model.predict(X_test)
-print(accuracy_score(y_test,y_pred))
-
-labels_sorted = sorted(y_test.unique().tolist())
-cnf_matrix = confusion_matrix(y_test, y_pred, labels=labels_sorted)
-disp = ConfusionMatrixDisplay(confusion_matrix=cnf_matrix,
-                              display_labels=labels_sorted)
-disp.plot(cmap='Blues')
-plt.title('Logistic Regression - Confusion Matrix')
-
-plt.show()
-
-# cv_scores = cross_val_score(log_reg_model, X, y, cv=5, scoring='accuracy')
-# print("Cross-Validation Accuracy Scores:", cv_scores)
-# print("Mean CV Accuracy:", cv_scores.mean())
-
-feature_importance = pd.DataFrame({
-    'Feature': X.columns,
-    'Importance': log_reg_model.coef_[0]
-})
-print("\nFeature Importance:")
-print(feature_importance.sort_values(by='Importance', ascending=False))
-
-out_dir = Path(__file__).resolve().parent.parent / 'trained_models'
-out_dir.mkdir(parents=True, exist_ok=True)
-
-lr_model_path = out_dir / 'logistic_regression_model.joblib'
-joblib.dump(log_reg_model, lr_model_path)
-
-classes = getattr(log_reg_model, 'classes_', None)
-coef = log_reg_model.coef_
-intercept = log_reg_model.intercept_
-features = list(X.columns)
-
-print(f"Saved logistic regression model to: {lr_model_path}")
-
-cm_txt_path = out_dir / 'logistic_regression_confusion_matrix.txt'
-labels = list(labels_sorted)
-with open(cm_txt_path, 'w', encoding='utf-8') as f:
-    f.write('label\t' + '\t'.join(str(l) for l in labels) + '\n')
-    for i, lab in enumerate(labels):
-        row_vals = '\t'.join(str(int(v)) for v in cnf_matrix[i])
-        f.write(f"{lab}\t{row_vals}\n")
-
-print(f"Saved logistic regression confusion matrix to: {cm_txt_path}")
+from artifacts import save_confusion_matrix, save_model
+from catalog_cache import load_columns
+from delta_ingest import cached_column_means
+from model_registry import register_model
+
+MODEL_NAME = 'logistic_regression'
+FEATURES = ['koi_depth', 'koi_duration', 'koi_period', 'koi_prad', 'koi_impact']
+LABEL = 'koi_pdisposition'
+# Heavy-tailed, strictly positive columns that get log1p before scaling.
+LOG_FEATURES = ['koi_depth', 'koi_duration', 'koi_period', 'koi_prad']
+SOLVERS = ['lbfgs', 'saga', 'liblinear', 'newton-cholesky']
+
+
+def load_data():
+    df = load_columns(FEATURES + [LABEL], drop_rejected=True)
+    X = df[FEATURES]
+    y = df[LABEL]
+    X = X.fillna(cached_column_means(FEATURES))
+    return X, y
+
+
+def log_transform(features=FEATURES, log_features=LOG_FEATURES):
+    """Stateless log1p on the `log_features` among `features`; None if there are none.
+
+    Columns are picked by position in `features`, so the transform works on
+    plain arrays as well as DataFrames.
+    """
+    log_idx = [i for i, col in enumerate(features) if col in log_features]
+    if not log_idx:
+        return None
+    log1p = FunctionTransformer(np.log1p, feature_names_out='one-to-one')
+    return ColumnTransformer([('log1p', log1p, log_idx)], remainder='passthrough', verbose_feature_names_out=False)
+
+
+def build_model(features=FEATURES, log_features=LOG_FEATURES, scale=True, **params):
+    """log1p on heavy-tailed columns, standardize, then LogisticRegression(**params)."""
+    log = log_transform(features, log_features)
+    steps = [('log', log)] if log is not None else []
+    if scale:
+        steps.append(('scale', StandardScaler()))
+    steps.append(('clf', LogisticRegression(**params)))
+    return Pipeline(steps)
+
+
+def benchmark_solvers(X_train, X_test, y_train, y_test, solvers=SOLVERS, max_iter=1000):
+    """Fit time, iterations and accuracy per solver, on raw features and on the scaled pipeline."""
+    rows = []
+    for preprocessing in ('raw', 'log+scaled'):
+        for solver in solvers:
+            if preprocessing == 'raw':
+                model = build_model(log_features=[], scale=False, solver=solver, max_iter=max_iter)
+            else:
+                model = build_model(solver=solver, max_iter=max_iter)
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always', ConvergenceWarning)
+                start = time.perf_counter()
+                model.fit(X_train, y_train)
+                fit_s = time.perf_counter() - start
+            rows.append({
+                'preprocessing': preprocessing,
+                'solver': solver,
+                'fit_s': fit_s,
+                'n_iter': int(np.max(model[-1].n_iter_)),
+                'converged': not any(issubclass(w.category, ConvergenceWarning) for w in caught),
+                'accuracy': accuracy_score(y_test, model.predict(X_test)),
+            })
+    return pd.DataFrame(rows).set_index(['preprocessing', 'solver'])
+
+
+def coefficient_table(model):
+    """Coefficients on the standardized (and log-transformed) inputs, largest magnitude first."""
+    names = model[:-1].get_feature_names_out() if len(model) > 1 else model.feature_names_in_
+    coefs = model[-1].coef_[0]
+    table = pd.DataFrame({'Feature': names, 'Coefficient': coefs, 'Abs': np.abs(coefs)})
+    return table.sort_values(by='Abs', ascending=False).drop(columns='Abs')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the logistic regression pipeline.')
+    parser.add_argument('--benchmark', action='store_true', help='compare solvers on raw vs scaled features and exit')
+    args = parser.parse_args(argv)
+
+    X, y = load_data()
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=50)
+
+    if args.benchmark:
+        print(benchmark_solvers(X_train, X_test, y_train, y_test).to_string(float_format=lambda v: f'{v:.4f}'))
+        return
+
+    log_reg_model = build_model()
+    log_reg_model.fit(X=X_train, y=y_train)
+
+
+    y_pred=log_reg_model.predict(X_test)
+    print(accuracy_score(y_test,y_pred))
+
+    labels_sorted = sorted(y_test.unique().tolist())
+    cnf_matrix = confusion_matrix(y_test, y_pred, labels=labels_sorted)
+    disp = ConfusionMatrixDisplay(confusion_matrix=cnf_matrix,
+                                  display_labels=labels_sorted)
+    disp.plot(cmap='Blues')
+    plt.title('Logistic Regression - Confusion Matrix')
+
+    plt.show()
+
+    # cv_scores = cross_val_score(log_reg_model, X, y, cv=5, scoring='accuracy')
+    # print("Cross-Validation Accuracy Scores:", cv_scores)
+    # print("Mean CV Accuracy:", cv_scores.mean())
+
+    # Positive coefficients push towards the second class (sorted), here FALSE POSITIVE.
+    print("\nFeature Importance (standardized coefficients):")
+    print(coefficient_table(log_reg_model).to_string(index=False))
+
+    lr_model_path = save_model(log_reg_model, MODEL_NAME)
+    manifest = register_model(lr_model_path, MODEL_NAME, log_reg_model, FEATURES, X_train,
+                              metrics={'accuracy': float(accuracy_score(y_test, y_pred))})
+    print(f"Saved logistic regression model to: {lr_model_path} (registry v{manifest['version']})")
+
+    cm_txt_path = save_confusion_matrix(labels_sorted, cnf_matrix, MODEL_NAME)
+    print(f"Saved logistic regression confusion matrix to: {cm_txt_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""Versioned, content-hashed model registry under trained_models/registry.
+
+Layout:
+
+    registry/index.json                      name -> latest version and manifest paths
+    registry/<name>/<sha256[:16]>.joblib     the artifact, named by its content hash
+    registry/<name>/<sha256[:16]>.flat/      tree ensembles only: flat node arrays (see flat_forest.py)
+    registry/<name>/<sha256[:16]>.compact/   optional pruned, narrowed arrays (see compact_forest.py)
+    registry/<name>/v0003.json               manifest for version 3
+
+A manifest records the feature order and dtype, the label classes, metrics,
+per-feature training statistics, the artifact's size and sha256, and the
+library versions. Resolving a model reads index.json and one manifest; there
+is no filesystem probing. Re-registering identical bytes returns the existing
+version. Every trainer that writes <name>_model.joblib registers it right
+after (register_model), so load_cached always sees the newest model.
+
+load_cached() keeps one deserialized copy per process, shared by all callers
+(e.g. every Streamlit session), and reloads only when the resolved version or
+the artifact file changes. With mmap=True a tree ensemble is served from its
+memory-mapped flat arrays (flat_forest.py): every server process shares one
+page-cache copy, and single-row predictions skip sklearn's per-call overhead.
+The flat arrays predict exactly what the joblib artifact does. The pruned,
+narrowed layout compact_forest.py attaches does not, so it is only served
+when asked for with layout='compact'.
+
+RegisteredModel takes named inputs (a dict, a list of dicts or a DataFrame)
+and puts them in the manifest's feature order itself. A missing or unknown
+feature raises instead of being silently mis-ordered.
+
+    python src/models/training/model_registry.py list
+    python src/models/training/model_registry.py show random_forest
+    python src/models/training/model_registry.py register random_forest   # adopt <name>_model.joblib
+"""
+import argparse
+import contextlib
+import datetime
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from artifacts import get_models_dir, model_path
+
+try:
+	import fcntl
+except ImportError:  # Windows: registrations from separate processes are not serialized
+	fcntl = None
+
+
+INDEX_NAME = 'index.json'
+LOCK_NAME = '.lock'
+# Array layouts load_registered(mmap=True) can serve; 'compact' is lossy and opt-in.
+LAYOUTS = ('flat', 'compact')
+
+log = logging.getLogger(__name__)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def registry_dir(models_dir: str = None):
+	path = os.path.join(get_models_dir(models_dir), 'registry')
+	os.makedirs(path, exist_ok=True)
+	return path
+
+
+def _sha256(path: str):
+	h = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(1 << 20), b''):
+			h.update(block)
+	return h.hexdigest()
+
+
+def _write_json(payload, path: str):
+	with open(path + '.tmp', 'w', encoding='utf-8') as f:
+		json.dump(payload, f, indent=2)
+	os.replace(path + '.tmp', path)
+
+
+@contextlib.contextmanager
+def _registry_lock(models_dir: str = None):
+	"""Hold an exclusive flock on registry/.lock while the index and manifests are rewritten."""
+	if fcntl is None:
+		yield
+		return
+	with open(os.path.join(registry_dir(models_dir), LOCK_NAME), 'a') as f:
+		fcntl.flock(f, fcntl.LOCK_EX)
+		try:
+			yield
+		finally:
+			fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_index(models_dir: str = None):
+	path = os.path.join(registry_dir(models_dir), INDEX_NAME)
+	if not os.path.exists(path):
+		return {'models': {}}
+	with open(path, 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+def feature_stats(X, features):
+	"""Per-feature training statistics for the manifest (for drift and input checks)."""
+	X = np.asarray(X, dtype=np.float64)
+	return {
+		col: {
+			'mean': float(np.nanmean(X[:, i])),
+			'std': float(np.nanstd(X[:, i])),
+			'min': float(np.nanmin(X[:, i])),
+			'max': float(np.nanmax(X[:, i])),
+		}
+		for i, col in enumerate(features)
+	}
+
+
+def _library_versions():
+	import sklearn
+	return {'python': platform.python_version(), 'sklearn': sklearn.__version__, 'numpy': np.__version__}
+
+
+def _export_flat(model, name: str, sha: str, models_dir: str = None):
+	"""Write the flat arrays for a tree ensemble unless a current-format copy exists; returns their path or None."""
+	from flat_forest import FORMAT_VERSION, SUPPORTED, export_forest, flat_format_version
+	if type(model).__name__ not in SUPPORTED:
+		return None
+	flat_rel = f'{name}/{sha[:16]}.flat'
+	# Directories written by an older flat_forest are re-exported rather than reused.
+	if flat_format_version(os.path.join(registry_dir(models_dir), flat_rel)) != FORMAT_VERSION:
+		export_forest(model, os.path.join(registry_dir(models_dir), flat_rel))
+	return flat_rel
+
+
+def register_artifact(src_path: str, name: str, features, classes, dtype: str = 'float32', metrics: dict = None,
+                      train_stats: dict = None, params: dict = None, imputation: str = 'mean',
+                      models_dir: str = None):
+	"""Copy a saved model into the registry and write its manifest; returns the manifest.
+
+	`imputation` records how missing features were filled for training: 'mean'
+	(the catalog's column means) or 'none' (left as NaN for the model).
+
+	Registrations from separate processes (e.g. anytime.py's workers) are
+	serialized by a lock file in the registry directory.
+	"""
+	model = joblib.load(src_path)
+	n_in = getattr(model, 'n_features_in_', len(features))
+	if n_in != len(features):
+		raise ValueError(f"{name} expects {n_in} features but {len(features)} were given: {list(features)}")
+	names_in = getattr(model, 'feature_names_in_', None)
+	if names_in is not None and list(names_in) != list(features):
+		raise ValueError(f"{name} was fitted on {list(names_in)}, not {list(features)}")
+
+	with _registry_lock(models_dir):
+		sha = _sha256(src_path)
+		index = read_index(models_dir)
+		entry = index['models'].setdefault(name, {'latest': 0, 'versions': {}})
+		if entry['latest']:
+			latest = resolve(name, models_dir=models_dir)
+			if latest['sha256'] == sha:
+				_export_flat(model, name, sha, models_dir)
+				return latest
+
+		model_dir = os.path.join(registry_dir(models_dir), name)
+		os.makedirs(model_dir, exist_ok=True)
+		filename = f'{sha[:16]}.joblib'
+		dest = os.path.join(model_dir, filename)
+		if not os.path.exists(dest):
+			shutil.copyfile(src_path, dest + '.tmp')
+			os.replace(dest + '.tmp', dest)
+
+		flat_rel = _export_flat(model, name, sha, models_dir)
+
+		version = entry['latest'] + 1
+		manifest = {
+			'name': name,
+			'version': version,
+			'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+			'file': f'{name}/{filename}',
+			'sha256': sha,
+			'size_bytes': os.path.getsize(dest),
+			'flat': flat_rel,
+			'estimator': type(model).__name__,
+			'features': list(features),
+			'feature_dtype': dtype,
+			'imputation': imputation,
+			'classes': [str(c) for c in classes],
+			'metrics': metrics or {},
+			'train_stats': train_stats or {},
+			'params': params or {},
+			'libraries': _library_versions(),
+		}
+		manifest_rel = f'{name}/v{version:04d}.json'
+		_write_json(manifest, os.path.join(registry_dir(models_dir), manifest_rel))
+		entry['versions'][str(version)] = manifest_rel
+		entry['latest'] = version
+		_write_json(index, os.path.join(registry_dir(models_dir), INDEX_NAME))
+		return manifest
+
+
+def register_compact(name: str, arrays: dict, meta: dict, summary: dict, version=None, models_dir: str = None):
+	"""Store a compact_forest layout beside a registered version and record it in that manifest; returns the manifest."""
+	from flat_forest import write_flat
+	manifest = resolve(name, version, models_dir)
+	rel = os.path.splitext(manifest['file'])[0] + '.compact'
+	write_flat(arrays, meta, os.path.join(registry_dir(models_dir), rel))
+	with _registry_lock(models_dir):
+		manifest = resolve(name, manifest['version'], models_dir)
+		manifest['compact'] = rel
+		manifest['compaction'] = summary
+		manifest_rel = read_index(models_dir)['models'][name]['versions'][str(manifest['version'])]
+		_write_json(manifest, os.path.join(registry_dir(models_dir), manifest_rel))
+	return manifest
+
+
+def register_model(path: str, name: str, model, features, X_train=None, train_stats: dict = None, dtype: str = None,
+                   metrics: dict = None, params: dict = None, imputation: str = 'mean', models_dir: str = None):
+	"""Register a model its trainer has just written with save_model; returns the manifest.
+
+	Classes come from the fitted model and the feature dtype and training
+	statistics from `X_train`; pass `train_stats` and `dtype` instead when the
+	training rows are never held in memory at once.
+	"""
+	if X_train is not None:
+		X_train = np.asarray(X_train)
+		dtype = dtype or X_train.dtype.name
+		train_stats = train_stats or feature_stats(X_train, features)
+	dtype = dtype or 'float32'
+	return register_artifact(path, name, features, model.classes_, dtype, metrics, train_stats, params, imputation,
+	                         models_dir)
+
+
+def resolve(name: str, version=None, models_dir: str = None):
+	"""Manifest for `name` at `version` (int, or None / 'latest')."""
+	entry = read_index(models_dir)['models'].get(name)
+	if not entry or not entry['latest']:
+		raise LookupError(f"No registered versions of '{name}'. Train it with src/models/training/train.py "
+		                  f"or adopt an existing artifact with model_registry.py register {name}")
+	version = entry['latest'] if version in (None, 'latest') else int(version)
+	rel = entry['versions'].get(str(version))
+	if rel is None:
+		raise LookupError(f"'{name}' has no version {version}; available: {sorted(map(int, entry['versions']))}")
+	with open(os.path.join(registry_dir(models_dir), rel), 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+class RegisteredModel:
+	"""A loaded model plus its manifest; predicts from named features in the manifest's order."""
+
+	def __init__(self, model, manifest: dict):
+		self.model = model
+		self.manifest = manifest
+		self.features = list(manifest['features'])
+		self.dtype = np.dtype(manifest.get('feature_dtype', 'float32'))
+
+	@property
+	def classes_(self):
+		return self.model.classes_
+
+	def to_matrix(self, inputs):
+		"""Order named inputs (dict, list of dicts or DataFrame) as the model expects."""
+		if isinstance(inputs, dict):
+			inputs = [inputs]
+		if hasattr(inputs, 'columns'):
+			names = set(inputs.columns)
+			rows = None
+		else:
+			rows = list(inputs)
+			names = set().union(*(r.keys() for r in rows)) if rows else set()
+		missing = [c for c in self.features if c not in names]
+		unknown = sorted(names - set(self.features))
+		if missing or unknown:
+			raise KeyError(f"{self.manifest['name']} v{self.manifest['version']} takes {self.features}; "
+			               f"missing {missing}, unknown {unknown}")
+		if rows is None:
+			return np.ascontiguousarray(inputs[self.features].to_numpy(dtype=self.dtype))
+		return np.array([[r[c] for c in self.features] for r in rows], dtype=self.dtype)
+
+	def predict(self, inputs):
+		return self.model.predict(self.to_matrix(inputs))
+
+	def predict_proba(self, inputs):
+		return self.model.predict_proba(self.to_matrix(inputs))
+
+
+def load_registered(name: str, version=None, models_dir: str = None, verify: bool = False, mmap: bool = False,
+                    layout: str = 'flat'):
+	"""Resolve and load a registered model; verify=True re-hashes the artifact first.
+
+	mmap=True memory-maps the version's flat arrays, or with layout='compact'
+	its compact layout when it has one (see manifest['compaction'] for the
+	accuracy it gives up), then its flat arrays. It falls back to joblib when
+	the version has neither or they were written in an older flat format
+	(re-registering the artifact re-exports them).
+	"""
+	if layout not in LAYOUTS:
+		raise ValueError(f"Unknown layout '{layout}'. Choose from: {LAYOUTS}")
+	manifest = resolve(name, version, models_dir)
+	path = os.path.join(registry_dir(models_dir), manifest['file'])
+	if verify and _sha256(path) != manifest['sha256']:
+		raise ValueError(f"{path} does not match the sha256 in its manifest")
+	if mmap:
+		from flat_forest import load_flat
+		for candidate in ('compact', 'flat') if layout == 'compact' else ('flat',):
+			if not manifest.get(candidate):
+				continue
+			try:
+				return RegisteredModel(load_flat(os.path.join(registry_dir(models_dir), manifest[candidate])), manifest)
+			except ValueError as e:
+				log.warning("Skipping the %s layout of %s v%s: %s", candidate, name, manifest['version'], e)
+	return RegisteredModel(joblib.load(path), manifest)
+
+
+def load_cached(name: str, version=None, models_dir: str = None, check_interval: float = 1.0, mmap: bool = False,
+                layout: str = 'flat'):
+	"""Process-wide cached load_registered, safe to call on every request from any thread.
+
+	At most every `check_interval` seconds the index is re-resolved and the
+	artifact stat'ed. A new version, a newly attached compact layout (with
+	layout='compact'), or an
+	mtime/size change whose bytes no longer match the manifest's sha256, triggers
+	a reload; anything else returns the cached model without touching joblib.
+	If that reload fails verification (e.g. the artifact is being rewritten), a
+	warning is logged and the cached model keeps serving until a valid version
+	resolves.
+	"""
+	key = (name, version, os.path.abspath(get_models_dir(models_dir)), mmap, layout)
+	with _cache_lock:
+		entry = _cache.get(key)
+		now = time.monotonic()
+		if entry is not None and now - entry['checked'] < check_interval:
+			return entry['model']
+
+		manifest = resolve(name, version, models_dir)
+		path = os.path.join(registry_dir(models_dir), manifest['file'])
+		stat = os.stat(path)
+		signature = (stat.st_mtime_ns, stat.st_size)
+		compact = manifest.get('compact') if layout == 'compact' else None
+		if entry is not None and entry['sha256'] == manifest['sha256'] and entry['compact'] == compact:
+			if entry['signature'] == signature or _sha256(path) == manifest['sha256']:
+				entry.update(checked=now, signature=signature)
+				return entry['model']
+
+		try:
+			model = load_registered(name, version, models_dir, verify=entry is not None, mmap=mmap, layout=layout)
+		except ValueError as e:
+			if entry is None:
+				raise
+			log.warning("Keeping cached %s v%s: %s", name, entry['model'].manifest['version'], e)
+			# Remember the bad file's signature so it is only re-hashed once it changes again.
+			entry.update(checked=now, signature=signature)
+			return entry['model']
+		_cache[key] = {'model': model, 'sha256': manifest['sha256'], 'compact': compact,
+		               'signature': signature, 'checked': now}
+		return model
+
+
+def register_legacy(name: str, models_dir: str = None, csv_path: str = None):
+	"""Adopt an existing <name>_model.joblib, scoring it on train.py's default split for the manifest."""
+	import tempfile
+	from sklearn.metrics import accuracy_score
+	from train import imputes, load_shared_data, prepare_shared_data, trainer_module
+
+	path = model_path(name, models_dir)
+	work_dir = tempfile.mkdtemp(prefix='exoura_register_')
+	try:
+		meta = prepare_shared_data([name], work_dir, csv_path=csv_path)
+		features = trainer_module(name).FEATURES
+		impute = imputes(name)
+		X_train, X_test, _, y_test, _ = load_shared_data(work_dir, features, impute)
+		acc = float(accuracy_score(y_test, joblib.load(path).predict(X_test)))
+		return register_artifact(path, name, features, meta['classes'], meta['dtype'], {'accuracy': acc},
+		                         feature_stats(X_train, features), imputation='mean' if impute else 'none',
+		                         models_dir=models_dir)
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('command', choices=('list', 'show', 'register'))
+	parser.add_argument('name', nargs='?')
+	parser.add_argument('--version', default=None)
+	parser.add_argument('--data', default=None)
+	parser.add_argument('--models-dir', default=None)
+	args = parser.parse_args(argv)
+
+	if args.command == 'list':
+		for name, entry in sorted(read_index(args.models_dir)['models'].items()):
+			m = resolve(name, models_dir=args.models_dir)
+			print(f"{name}: {len(entry['versions'])} version(s), latest v{m['version']} "
+			      f"({m['size_bytes'] / 1e6:.1f} MB, accuracy {m['metrics'].get('accuracy', float('nan')):.4f})")
+		return
+	if not args.name:
+		parser.error(f"'{args.command}' needs a model name")
+	if args.command == 'show':
+		print(json.dumps(resolve(args.name, args.version, args.models_dir), indent=2))
+	else:
+		m = register_legacy(args.name, args.models_dir, args.data)
+		print(f"Registered {m['name']} v{m['version']} ({m['sha256'][:16]})")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,185 @@
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from catalog_cache import catalog_columns, get_project_root, load_columns
+from catalog_validation import validate_frame
+from koi_schema import R_EARTH_IN_R_SUN, column_dtype, label_categories
+from sky_index import apply_match_table, build_match_table, load_or_build_index
+
+
+CANONICAL_FEATURES = [
+	'koi_period',
+	'koi_duration',
+	'koi_depth',
+	'koi_prad',
+	'koi_dor',
+	'koi_impact',
+	'koi_model_snr',
+]
+CANONICAL_COLUMNS = ['source', 'object_id'] + CANONICAL_FEATURES + ['ra', 'dec', 'koi_pdisposition']
+LABEL_COL = 'koi_pdisposition'
+
+
+class CatalogSpec(NamedTuple):
+	name: str
+	filename: str
+	id_col: str
+	disposition_col: str
+	disposition_map: Dict[str, str]
+	# canonical column -> (source column, multiplicative factor to canonical unit)
+	columns: Dict[str, Tuple[str, float]]
+	stellar_radius_col: Optional[str] = None
+
+
+CATALOGS = {
+	spec.name: spec for spec in [
+		CatalogSpec(
+			name='kepler',
+			filename='keplar.csv',
+			id_col='kepoi_name',
+			disposition_col='koi_pdisposition',
+			disposition_map={'CANDIDATE': 'CANDIDATE', 'FALSE POSITIVE': 'FALSE POSITIVE'},
+			columns={col: (col, 1.0) for col in CANONICAL_FEATURES + ['ra', 'dec']},
+			stellar_radius_col='koi_srad',
+		),
+		# NASA Exoplanet Archive "K2 Planets and Candidates" (k2pandc); depth is in percent.
+		CatalogSpec(
+			name='k2',
+			filename='k2.csv',
+			id_col='pl_name',
+			disposition_col='disposition',
+			disposition_map={
+				'CONFIRMED': 'CANDIDATE',
+				'CANDIDATE': 'CANDIDATE',
+				'FALSE POSITIVE': 'FALSE POSITIVE',
+				'REFUTED': 'FALSE POSITIVE',
+			},
+			columns={
+				'koi_period': ('pl_orbper', 1.0),
+				'koi_duration': ('pl_trandur', 1.0),
+				'koi_depth': ('pl_trandep', 1e4),
+				'koi_prad': ('pl_rade', 1.0),
+				'koi_dor': ('pl_ratdor', 1.0),
+				'koi_impact': ('pl_imppar', 1.0),
+				'ra': ('ra', 1.0),
+				'dec': ('dec', 1.0),
+			},
+			stellar_radius_col='st_rad',
+		),
+		# TESS Objects of Interest; depth already in ppm, duration in hours.
+		CatalogSpec(
+			name='tess',
+			filename='toi.csv',
+			id_col='toi',
+			disposition_col='tfopwg_disp',
+			disposition_map={
+				'PC': 'CANDIDATE',
+				'APC': 'CANDIDATE',
+				'CP': 'CANDIDATE',
+				'KP': 'CANDIDATE',
+				'FP': 'FALSE POSITIVE',
+				'FA': 'FALSE POSITIVE',
+			},
+			columns={
+				'koi_period': ('pl_orbper', 1.0),
+				'koi_duration': ('pl_trandurh', 1.0),
+				'koi_depth': ('pl_trandep', 1.0),
+				'koi_prad': ('pl_rade', 1.0),
+				'ra': ('ra', 1.0),
+				'dec': ('dec', 1.0),
+			},
+			stellar_radius_col='st_rad',
+		),
+	]
+}
+
+
+def default_catalog_dir():
+	return os.path.join(get_project_root(), 'src', 'data')
+
+
+def _source_columns(spec: CatalogSpec, available):
+	wanted = [spec.id_col, spec.disposition_col] + [src for src, _ in spec.columns.values()]
+	if spec.stellar_radius_col:
+		wanted.append(spec.stellar_radius_col)
+	return [c for c in dict.fromkeys(wanted) if c in available]
+
+
+def load_catalog(spec: CatalogSpec, csv_path: str, drop_rejected: bool = False):
+	"""Load one catalog through the columnar cache and map it onto the canonical schema.
+
+	Validation runs on the canonical (unit-normalized) columns, so the same range
+	checks apply to every source.
+	"""
+	available = set(catalog_columns(csv_path))
+	raw = load_columns(_source_columns(spec, available), csv_path=csv_path)
+	n = len(raw)
+
+	out = {}
+	for col in CANONICAL_FEATURES + ['ra', 'dec']:
+		src, factor = spec.columns.get(col, (None, 1.0))
+		if src in available:
+			values = np.asarray(raw[src], dtype=np.float64)
+			out[col] = values * factor if factor != 1.0 else values
+		else:
+			out[col] = np.full(n, np.nan)
+
+	# Fill missing depths from the radius ratio: depth_ppm = (Rp / R*)^2 * 1e6.
+	if spec.stellar_radius_col in available:
+		srad = np.asarray(raw[spec.stellar_radius_col], dtype=np.float64)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			derived = (out['koi_prad'] * R_EARTH_IN_R_SUN / srad) ** 2 * 1e6
+		missing = np.isnan(out['koi_depth']) & np.isfinite(derived)
+		out['koi_depth'] = np.where(missing, derived, out['koi_depth'])
+
+	frame = pd.DataFrame({col: out[col].astype(column_dtype(col)) for col in out})
+
+	ids = raw[spec.id_col] if spec.id_col in available else pd.Series(np.arange(n))
+	frame.insert(0, 'object_id', pd.Series(np.asarray(ids)).astype('string').radd(spec.name + ':').to_numpy())
+	frame.insert(0, 'source', spec.name)
+
+	disp = pd.Series(np.asarray(raw[spec.disposition_col], dtype=object)).astype('string').str.strip().str.upper()
+	frame[LABEL_COL] = disp.map(spec.disposition_map).to_numpy()
+	frame = frame[CANONICAL_COLUMNS]
+	if drop_rejected:
+		_, _, rejected, _ = validate_frame(frame)
+		frame = frame[~rejected].reset_index(drop=True)
+	return frame
+
+
+def load_merged_catalog(catalogs=None, data_dir: str = None, skip_missing: bool = True, drop_rejected: bool = False,
+                        dedupe: bool = False):
+	"""Load every available catalog into one canonical table with a categorical `source` column.
+
+	With dedupe=True, planets that appear in more than one catalog (matched on sky
+	position and period, see sky_index.build_match_table) are kept only once.
+	"""
+	data_dir = data_dir or default_catalog_dir()
+	frames = []
+	for name in catalogs or list(CATALOGS):
+		spec = CATALOGS[name]
+		csv_path = os.path.join(data_dir, spec.filename)
+		if not os.path.exists(csv_path):
+			if skip_missing:
+				continue
+			raise FileNotFoundError(csv_path)
+		frames.append(load_catalog(spec, csv_path, drop_rejected=drop_rejected))
+	if not frames:
+		raise FileNotFoundError(f"No catalogs found in {data_dir}")
+
+	merged = pd.concat(frames, ignore_index=True)
+	merged['source'] = pd.Categorical(merged['source'], categories=list(CATALOGS))
+	merged[LABEL_COL] = pd.Categorical(merged[LABEL_COL], categories=label_categories(LABEL_COL))
+	if dedupe:
+		index = load_or_build_index('merged', merged['ra'], merged['dec'])
+		merged = apply_match_table(merged, build_match_table(merged, index=index))
+	return merged
+
+
+if __name__ == "__main__":
+	merged = load_merged_catalog()
+	print(merged.groupby('source', observed=True).size().rename('rows'))
+	print(merged.groupby(['source', LABEL_COL], observed=True).size().rename('rows'))
@@ -8,59 +8,68 @@ import matplotlib.pyplot as plt
 from pathlib import Path
 import joblib
 
-df = pd.read_csv('src/data/keplar.csv', comment='#')
-
-X = df[['koi_prad','koi_dor','koi_period','koi_duration','koi_depth']]
+from artifacts import save_confusion_matrix, save_model
+from catalog_cache import load_columns
+from delta_ingest import cached_column_means
+from model_registry import register_model
 
+MODEL_NAME = 'random_forest'
+FEATURES = ['koi_prad','koi_dor','koi_period','koi_duration','koi_depth']
+LABEL = 'koi_pdisposition'
 
 # exclude = ['koi_disposition', 'koi_pdisposition', 'koi_model_snr', 'koi_fpflag_nt', 'koi_fpflag_ss', 'koi_fpflag_co', 'koi_fpflag_ec', 'koi_score']
 # X = df[[col for col in df.columns if col.startswith('koi') and col not in exclude]]
 
-y = df['koi_pdisposition']
-X = X.apply(pd.to_numeric, errors='coerce')
-X = X.fillna(X.mean())
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+def load_data():
+    df = load_columns(FEATURES + [LABEL], drop_rejected=True)
+    X = df[FEATURES]
+    y = df[LABEL]
+    X = X.fillna(cached_column_means(FEATURES))
+    return X, y
+
+
+def build_model(**params):
+    defaults = dict(n_estimators=100, random_state=48, max_depth=25, min_samples_split=15, min_samples_leaf=1, max_features='sqrt')
+    defaults.update(params)
+    return RandomForestClassifier(**defaults)
 
-rf_model = RandomForestClassifier(n_estimators=100, random_state=48, max_depth=25, min_samples_split=15, min_samples_leaf=1, max_features='sqrt')
-rf_model.fit(X_train, y_train)
 
-y_pred = rf_model.predict(X_test)
-print("Accuracy:", accuracy_score(y_test, y_pred))
+def main():
+    X, y = load_data()
 
-labels_sorted = sorted(y_test.unique().tolist())
-cnf_matrix = confusion_matrix(y_test, y_pred, labels=labels_sorted)
-disp = ConfusionMatrixDisplay(confusion_matrix=cnf_matrix,
-                              display_labels=labels_sorted)
-disp.plot(cmap='Blues')
-plt.title('Random Forest - Confusion Matrix')
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-feature_importance = pd.DataFrame({
-    'Feature': X.columns,
-    'Importance': rf_model.feature_importances_
-})
-print("\nFeature Importance:")
-print(feature_importance.sort_values(by='Importance', ascending=False))
+    rf_model = build_model()
+    rf_model.fit(X_train, y_train)
 
+    y_pred = rf_model.predict(X_test)
+    print("Accuracy:", accuracy_score(y_test, y_pred))
 
+    labels_sorted = sorted(y_test.unique().tolist())
+    cnf_matrix = confusion_matrix(y_test, y_pred, labels=labels_sorted)
+    disp = ConfusionMatrixDisplay(confusion_matrix=cnf_matrix,
+                                  display_labels=labels_sorted)
+    disp.plot(cmap='Blues')
+    plt.title('Random Forest - Confusion Matrix')
 
-out_dir = Path(__file__).resolve().parent.parent / 'trained_models'
-out_dir.mkdir(parents=True, exist_ok=True)
+    feature_importance = pd.DataFrame({
+        'Feature': X.columns,
+        'Importance': rf_model.feature_importances_
+    })
+    print("\nFeature Importance:")
+    print(feature_importance.sort_values(by='Importance', ascending=False))
 
-model_path = out_dir / 'random_forest_model.joblib'
-joblib.dump(rf_model, model_path)
+    model_path = save_model(rf_model, MODEL_NAME)
+    manifest = register_model(model_path, MODEL_NAME, rf_model, FEATURES, X_train,
+                              metrics={'accuracy': float(accuracy_score(y_test, y_pred))})
+    cm_txt_path = save_confusion_matrix(labels_sorted, cnf_matrix, MODEL_NAME)
 
-fi_sorted = feature_importance.sort_values(by='Importance', ascending=False)
+    print(f"\nSaved model to: {model_path} (registry v{manifest['version']})")
+    print(f"Saved confusion matrix to: {cm_txt_path}")
 
-cm_txt_path = out_dir / 'random_forest_confusion_matrix.txt'
-labels = list(labels_sorted)
-with open(cm_txt_path, 'w', encoding='utf-8') as f:
-    f.write('label\t' + '\t'.join(str(l) for l in labels) + '\n')
-    for i, lab in enumerate(labels):
-        row_vals = '\t'.join(str(int(v)) for v in cnf_matrix[i])
-        f.write(f"{lab}\t{row_vals}\n")
+    plt.show()
 
-print(f"\nSaved model to: {model_path}")
-print(f"Saved confusion matrix to: {cm_txt_path}")
 
-plt.show()
+if __name__ == "__main__":
+    main()
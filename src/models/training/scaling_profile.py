@@ -0,0 +1,227 @@
+"""Profile how accuracy and cost grow with training-set size.
+
+Each model is trained on nested random subsamples of the shared training split,
+growing geometrically (--min-rows, x--factor, ..., all rows). Every fit runs in
+its own fresh worker process, so memory readings do not leak between fits. For
+each size it records:
+
+- fit time and peak memory (the worker's max RSS and its growth during the
+  fit, where the platform reports it);
+- serialized model size;
+- batch and single-row predict latency;
+- accuracy on a fixed test split.
+
+Power laws (y = a * n^b) are fitted to fit time, model size, latency and error
+rate, then extrapolated to --project-rows. The report goes to
+scaling_profile.json and, with --plot, to an image.
+
+    python src/models/training/scaling_profile.py --plot scaling.png
+    python src/models/training/scaling_profile.py --source merged --project-rows 50000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score
+
+from artifacts import model_size_bytes, save_json
+from train import imputes, load_shared_data, prepare_shared_data, resolve_models, trainer_module
+
+try:
+	import resource
+except ImportError:  # Windows
+	resource = None
+
+
+SCALED_METRICS = ['fit_seconds', 'model_bytes', 'predict_row_us', 'error']
+
+
+def subsample_sizes(n_rows: int, min_rows: int = 500, factor: float = 2.0):
+	sizes = []
+	size = min(min_rows, n_rows)
+	while size < n_rows:
+		sizes.append(int(size))
+		size *= factor
+	return sizes + [n_rows]
+
+
+def _max_rss_bytes():
+	if resource is None:
+		return None
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return rss if os.uname().sysname == 'Darwin' else rss * 1024
+
+
+def profile_fit(name: str, work_dir: str, n_rows: int, seed: int = 0, single_row_calls: int = 50):
+	"""Worker entry point: fit `name` on the first n_rows of a seeded permutation and measure it."""
+	module = trainer_module(name)
+	X_train, X_test, y_train, y_test, _ = load_shared_data(work_dir, module.FEATURES, imputes(name))
+	rows = np.sort(np.random.default_rng(seed).permutation(len(y_train))[:n_rows])
+	X, y = np.asarray(X_train[rows]), y_train[rows]
+	X_test = np.asarray(X_test)
+
+	model = module.build_model()
+	fit = getattr(module, 'fit_model', None)
+	rss_before = _max_rss_bytes()
+	start = time.perf_counter()
+	if fit is not None:
+		fit(model, X, y)
+	else:
+		model.fit(X, y)
+	fit_seconds = time.perf_counter() - start
+	rss_after = _max_rss_bytes()
+
+	start = time.perf_counter()
+	y_pred = model.predict(X_test)
+	batch_seconds = time.perf_counter() - start
+	timings = []
+	for i in range(single_row_calls):
+		row = X_test[i % len(X_test)][None, :]
+		start = time.perf_counter()
+		model.predict(row)
+		timings.append(time.perf_counter() - start)
+
+	acc = float(accuracy_score(y_test, y_pred))
+	return {
+		'model': name,
+		'n_rows': int(n_rows),
+		'fit_seconds': fit_seconds,
+		'max_rss_bytes': int(rss_after) if rss_after is not None else None,
+		'rss_growth_bytes': int(rss_after - rss_before) if rss_after is not None else None,
+		'model_bytes': model_size_bytes(model),
+		'predict_batch_ms': batch_seconds * 1e3,
+		'predict_row_us': float(np.median(timings)) * 1e6,
+		'accuracy': acc,
+		'error': 1.0 - acc,
+	}
+
+
+def _profile_task(task):
+	return profile_fit(*task)
+
+
+def fit_power_law(n, values):
+	"""Least-squares fit of log(value) = log(a) + b * log(n); returns (a, b) or None if not enough data."""
+	n, values = np.asarray(n, dtype=float), np.asarray(values, dtype=float)
+	ok = (n > 0) & (values > 0)
+	if ok.sum() < 2:
+		return None
+	b, log_a = np.polyfit(np.log(n[ok]), np.log(values[ok]), 1)
+	return float(np.exp(log_a)), float(b)
+
+
+def scaling_fits(results: pd.DataFrame, project_rows: int = None):
+	fits = {}
+	for name, group in results.groupby('model', sort=False):
+		fits[name] = {}
+		for metric in SCALED_METRICS:
+			params = fit_power_law(group['n_rows'], group[metric])
+			if params is None:
+				continue
+			a, b = params
+			entry = {'a': a, 'b': b}
+			if project_rows:
+				entry['projected'] = a * project_rows ** b
+			fits[name][metric] = entry
+	return fits
+
+
+def plot_profile(results: pd.DataFrame, path: str):
+	import matplotlib
+	matplotlib.use('Agg')
+	import matplotlib.pyplot as plt
+
+	panels = [('accuracy', 'accuracy'), ('fit_seconds', 'fit time (s)'), ('model_bytes', 'model size (bytes)'),
+	          ('predict_row_us', 'single-row predict (us)')]
+	fig, axes = plt.subplots(2, 2, figsize=(11, 8))
+	for ax, (metric, label) in zip(axes.ravel(), panels):
+		for name, group in results.groupby('model', sort=False):
+			ax.plot(group['n_rows'], group[metric], marker='o', label=name)
+		ax.set_xscale('log')
+		if metric != 'accuracy':
+			ax.set_yscale('log')
+		ax.set_xlabel('training rows')
+		ax.set_ylabel(label)
+		ax.grid(True, which='both', alpha=0.3)
+	axes[0, 0].legend()
+	fig.tight_layout()
+	fig.savefig(path, dpi=120)
+	return path
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--models', nargs='+', default=None, help='rf, gbt, lr or full names (default: all)')
+	parser.add_argument('--source', choices=('kepler', 'merged'), default='kepler',
+	                    help='cached Kepler catalog or every catalog via multi_catalog (deduplicated)')
+	parser.add_argument('--min-rows', type=int, default=500)
+	parser.add_argument('--factor', type=float, default=2.0)
+	parser.add_argument('--project-rows', type=int, default=None, help='extrapolate costs to this many training rows')
+	parser.add_argument('--workers', type=int, default=None, help='parallel fits (timings contend above core count)')
+	parser.add_argument('--seed', type=int, default=42)
+	parser.add_argument('--plot', default=None, help='write a plot to this path')
+	parser.add_argument('--data', default=None, help='catalog CSV (kepler) or directory of catalogs (merged)')
+	parser.add_argument('--models-dir', default=None)
+	args = parser.parse_args(argv)
+
+	models = resolve_models(args.models)
+	frame = None
+	if args.source == 'merged':
+		from multi_catalog import load_merged_catalog
+		frame = load_merged_catalog(data_dir=args.data, drop_rejected=True, dedupe=True)
+
+	work_dir = tempfile.mkdtemp(prefix='exoura_scaling_')
+	try:
+		csv_path = args.data if frame is None else None
+		meta = prepare_shared_data(models, work_dir, seed=args.seed, csv_path=csv_path, frame=frame)
+		sizes = subsample_sizes(meta['n_train'], args.min_rows, args.factor)
+		print(f"{meta['n_train']} training rows; sizes {sizes}")
+		tasks = [(name, n) for n in reversed(sizes) for name in models]
+		workers = args.workers or os.cpu_count() or 1
+		rows = []
+		# maxtasksperchild=1 gives every fit a fresh process; unlike ProcessPoolExecutor's
+		# max_tasks_per_child it works before Python 3.11.
+		with Pool(processes=workers, maxtasksperchild=1) as pool:
+			for r in pool.imap_unordered(_profile_task, [(name, work_dir, n, args.seed) for name, n in tasks]):
+				print(f"  {r['model']} n={r['n_rows']}: accuracy={r['accuracy']:.4f}  fit={r['fit_seconds']:.2f}s")
+				rows.append(r)
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+
+	results = pd.DataFrame(rows)
+	results['model'] = pd.Categorical(results['model'], categories=models, ordered=True)
+	results = results.sort_values(['model', 'n_rows']).reset_index(drop=True)
+	results['model'] = results['model'].astype(str)
+	fits = scaling_fits(results, args.project_rows)
+
+	with pd.option_context('display.width', 200, 'display.max_columns', None):
+		print(results.drop(columns=['error']).to_string(index=False, float_format='{:.4f}'.format))
+	for name, metrics in fits.items():
+		print(f"\n{name} scaling exponents: " + ", ".join(f"{m} ~ n^{v['b']:.2f}" for m, v in metrics.items()))
+		if args.project_rows:
+			# A metric with fewer than two positive points has no fit, so no projection.
+			p = {m: v['projected'] for m, v in metrics.items()}
+			parts = []
+			if 'fit_seconds' in p:
+				parts.append(f"fit ~{p['fit_seconds']:.2f}s")
+			if 'model_bytes' in p:
+				parts.append(f"size ~{p['model_bytes'] / 1e6:.1f} MB")
+			if 'error' in p:
+				parts.append(f"accuracy ~{1 - p['error']:.4f}")
+			print(f"  at {args.project_rows} rows: " + (", ".join(parts) if parts else "not enough points to project"))
+
+	report = {'source': args.source, 'n_train': meta['n_train'], 'sizes': sizes, 'project_rows': args.project_rows,
+	          'results': results.to_dict(orient='records'), 'fits': fits}
+	print(f"\nSaved report to: {save_json(report, 'scaling', 'profile', args.models_dir)}")
+	if args.plot:
+		print(f"Saved plot to: {plot_profile(results, args.plot)}")
+	return report
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,228 @@
+"""Train one large random forest as N shards and merge their trees.
+
+The tree budget is split into contiguous ranges. Shard i fits trees
+[start, stop) using the random state a single-process forest would have
+reached at tree `start`, the same skip-ahead sklearn uses for warm starts. The
+merged forest is therefore tree-for-tree identical to
+`build_model(n_estimators=N, random_state=seed)` fitted in one process, and
+its predictions match.
+
+Shards read the shared split written by `prepare` from a work directory. On a
+single machine `run` does everything in a process pool. Across hosts, put the
+work directory on a shared filesystem and run `shard` once per shard index
+anywhere, then `merge`:
+
+    python src/models/training/sharded_forest.py run --trees 2000 --shards 8
+    python src/models/training/sharded_forest.py prepare --work-dir /shared/rf --trees 4000 --shards 16
+    python src/models/training/sharded_forest.py shard --work-dir /shared/rf --shard 3     # on any host
+    python src/models/training/sharded_forest.py merge --work-dir /shared/rf
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+from sklearn.metrics import accuracy_score, confusion_matrix
+
+from artifacts import load_best_params, save_confusion_matrix, save_json, save_model
+from model_registry import register_model
+from train import load_shared_data, load_split_keys, prepare_shared_data, trainer_module
+
+
+MODEL_NAME = 'random_forest'
+PLAN_NAME = 'plan.json'
+MAX_INT = np.iinfo(np.int32).max  # sklearn draws one int32 seed per tree
+
+
+def shard_bounds(n_estimators: int, n_shards: int):
+	"""Contiguous [start, stop) tree ranges, as even as possible."""
+	edges = np.linspace(0, n_estimators, min(n_shards, n_estimators) + 1).round().astype(int)
+	return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:])]
+
+
+def shard_random_state(seed: int, start: int):
+	"""The forest's RandomState after `start` trees have drawn their seeds."""
+	random_state = np.random.RandomState(seed)
+	if start:
+		random_state.randint(MAX_INT, size=start)
+	return random_state
+
+
+def shard_path(work_dir: str, shard: int):
+	return os.path.join(work_dir, 'shards', f'shard_{shard:04d}.joblib')
+
+
+def read_plan(work_dir: str):
+	with open(os.path.join(work_dir, PLAN_NAME), 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+def prepare(work_dir: str, n_estimators: int, n_shards: int, seed: int = None, split_seed: int = 42,
+            test_size: float = 0.2, csv_path: str = None, params: dict = None):
+	"""Write the shared split and the shard plan to `work_dir`."""
+	params = dict(params or {})
+	if params.get('oob_score'):
+		raise ValueError("oob_score cannot be merged across shards; score the merged forest on the test split")
+	params.pop('n_estimators', None)
+	if seed is None:
+		seed = trainer_module(MODEL_NAME).build_model(**params).random_state
+	params.pop('random_state', None)
+
+	meta = prepare_shared_data([MODEL_NAME], work_dir, test_size, split_seed, csv_path)
+	os.makedirs(os.path.join(work_dir, 'shards'), exist_ok=True)
+	plan = {'n_estimators': n_estimators, 'seed': seed, 'params': params,
+	        'shards': shard_bounds(n_estimators, n_shards), 'n_train': meta['n_train']}
+	with open(os.path.join(work_dir, PLAN_NAME), 'w', encoding='utf-8') as f:
+		json.dump(plan, f, indent=2)
+	return plan
+
+
+def fit_shard(work_dir: str, shard: int):
+	"""Fit one shard's trees and write them next to the plan; safe to run on any host."""
+	plan = read_plan(work_dir)
+	start, stop = plan['shards'][shard]
+	module = trainer_module(MODEL_NAME)
+	X_train, _, y_train, _, _ = load_shared_data(work_dir, module.FEATURES)
+
+	model = module.build_model(**plan['params'], n_estimators=stop - start,
+	                           random_state=shard_random_state(plan['seed'], start))
+	began = time.perf_counter()
+	model.fit(X_train, y_train)
+	fit_seconds = time.perf_counter() - began
+
+	path = shard_path(work_dir, shard)
+	joblib.dump(model, path + '.tmp')
+	os.replace(path + '.tmp', path)
+	return {'shard': shard, 'trees': stop - start, 'fit_seconds': fit_seconds, 'path': path}
+
+
+def merge_shards(work_dir: str):
+	"""Concatenate every shard's estimators_ (in tree order) into one forest."""
+	plan = read_plan(work_dir)
+	missing = [i for i in range(len(plan['shards'])) if not os.path.exists(shard_path(work_dir, i))]
+	if missing:
+		raise FileNotFoundError(f"Shards not fitted yet: {missing}")
+
+	forest = None
+	for i in range(len(plan['shards'])):
+		part = joblib.load(shard_path(work_dir, i))
+		if forest is None:
+			forest = part
+		else:
+			forest.estimators_.extend(part.estimators_)
+	forest.set_params(n_estimators=len(forest.estimators_), random_state=plan['seed'])
+	return forest
+
+
+def evaluate_and_save(forest, work_dir: str, models_dir: str = None):
+	"""Score the merged forest on the test split, then save and register it."""
+	features = trainer_module(MODEL_NAME).FEATURES
+	X_train, X_test, _, y_test, meta = load_shared_data(work_dir, features)
+	y_pred = forest.predict(X_test)
+	labels_sorted = sorted(meta['classes'])
+	acc = float(accuracy_score(y_test, y_pred))
+	path = save_model(forest, MODEL_NAME, models_dir)
+	split = load_split_keys(work_dir)
+	if split is not None:
+		save_json(split, MODEL_NAME, 'holdout', models_dir)
+	plan = read_plan(work_dir)
+	manifest = register_model(path, MODEL_NAME, forest, features, X_train,
+	                          metrics={'accuracy': acc, 'n_train': meta['n_train'], 'n_test': meta['n_test'],
+	                                   'split_seed': meta['seed'], 'shards': len(plan['shards'])},
+	                          params={**plan['params'], 'n_estimators': plan['n_estimators'], 'random_state': plan['seed']},
+	                          models_dir=models_dir)
+	return {
+		'accuracy': acc,
+		'model_path': path,
+		'registry_version': manifest['version'],
+		'confusion_matrix_path': save_confusion_matrix(labels_sorted, confusion_matrix(y_test, y_pred, labels=labels_sorted),
+		                                               MODEL_NAME, models_dir),
+	}
+
+
+def verify_against_single(forest, work_dir: str):
+	"""Refit the same forest in one process and check the merged one predicts identically."""
+	plan = read_plan(work_dir)
+	module = trainer_module(MODEL_NAME)
+	X_train, X_test, y_train, _, _ = load_shared_data(work_dir, module.FEATURES)
+	single = module.build_model(**plan['params'], n_estimators=plan['n_estimators'], random_state=plan['seed'])
+	single.fit(X_train, y_train)
+	return bool(np.array_equal(single.predict_proba(X_test), forest.predict_proba(X_test)))
+
+
+def run_local(work_dir: str, workers: int = None):
+	plan = read_plan(work_dir)
+	todo = [i for i in range(len(plan['shards'])) if not os.path.exists(shard_path(work_dir, i))]
+	workers = workers or min(len(todo) or 1, os.cpu_count() or 1)
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		futures = [pool.submit(fit_shard, work_dir, i) for i in todo]
+		for future in as_completed(futures):
+			r = future.result()
+			print(f"  shard {r['shard']}: {r['trees']} trees in {r['fit_seconds']:.2f}s")
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('command', choices=('run', 'prepare', 'shard', 'merge'))
+	parser.add_argument('--work-dir', default=None, help='shared directory for the split, plan and shards')
+	parser.add_argument('--trees', type=int, default=1000, help='total trees in the merged forest')
+	parser.add_argument('--shards', type=int, default=None, help='number of shards (default: cores)')
+	parser.add_argument('--shard', type=int, default=None, help="shard index for 'shard'")
+	parser.add_argument('--seed', type=int, default=None, help="forest seed (default: random_forest.build_model's)")
+	parser.add_argument('--split-seed', type=int, default=42, help='train/test split seed (match train.py)')
+	parser.add_argument('--workers', type=int, default=None)
+	parser.add_argument('--tuned', action='store_true', help='use random_forest_best_params.json written by tune.py')
+	parser.add_argument('--verify', action='store_true', help='also fit a single-process forest and compare predictions')
+	parser.add_argument('--data', default=None)
+	parser.add_argument('--models-dir', default=None)
+	args = parser.parse_args(argv)
+
+	work_dir = args.work_dir
+	if work_dir is None:
+		if args.command != 'run':
+			parser.error(f"'{args.command}' needs --work-dir")
+		work_dir = tempfile.mkdtemp(prefix='exoura_shards_')
+	try:
+		return _run_command(args, parser, work_dir)
+	finally:
+		if args.work_dir is None:
+			shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _run_command(args, parser, work_dir: str):
+	if args.command in ('run', 'prepare'):
+		params = load_best_params(MODEL_NAME, args.models_dir) if args.tuned else None
+		plan = prepare(work_dir, args.trees, args.shards or os.cpu_count() or 1, args.seed, args.split_seed,
+		               csv_path=args.data, params=params)
+		print(f"Plan: {plan['n_estimators']} trees in {len(plan['shards'])} shards, seed={plan['seed']} ({work_dir})")
+		if args.command == 'prepare':
+			return plan
+
+	if args.command == 'shard':
+		if args.shard is None:
+			parser.error("'shard' needs --shard")
+		r = fit_shard(work_dir, args.shard)
+		print(f"shard {r['shard']}: {r['trees']} trees in {r['fit_seconds']:.2f}s -> {r['path']}")
+		return r
+
+	if args.command == 'run':
+		start = time.perf_counter()
+		run_local(work_dir, args.workers)
+		print(f"Fitted all shards in {time.perf_counter() - start:.2f}s wall-clock")
+
+	forest = merge_shards(work_dir)
+	result = evaluate_and_save(forest, work_dir, args.models_dir)
+	print(f"Merged forest: {len(forest.estimators_)} trees, accuracy={result['accuracy']:.4f}")
+	print(f"Saved model to: {result['model_path']} (registry v{result['registry_version']})")
+	if args.verify:
+		print(f"Matches single-process forest: {verify_against_single(forest, work_dir)}")
+	return result
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,181 @@
+import hashlib
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from catalog_cache import get_project_root
+
+
+DEFAULT_RADIUS_ARCSEC = 2.0
+# Relative period difference under which two positional matches are treated as the same planet.
+DEFAULT_PERIOD_TOLERANCE = 0.01
+ARCSEC_PER_RADIAN = 180.0 / np.pi * 3600.0
+
+
+def default_index_dir():
+	return os.path.join(get_project_root(), 'src', 'data', 'cache', 'sky')
+
+
+def radec_to_unit(ra, dec):
+	"""Vectorized (ra, dec) in degrees -> (n, 3) unit vectors."""
+	ra = np.radians(np.asarray(ra, dtype=np.float64))
+	dec = np.radians(np.asarray(dec, dtype=np.float64))
+	cos_dec = np.cos(dec)
+	return np.column_stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)])
+
+
+def arcsec_to_chord(arcsec):
+	return 2.0 * np.sin(np.asarray(arcsec, dtype=np.float64) / ARCSEC_PER_RADIAN / 2.0)
+
+
+def chord_to_arcsec(chord):
+	return 2.0 * np.arcsin(np.clip(np.asarray(chord, dtype=np.float64) / 2.0, 0.0, 1.0)) * ARCSEC_PER_RADIAN
+
+
+def coords_fingerprint(ra, dec):
+	h = hashlib.sha1()
+	h.update(np.ascontiguousarray(ra, dtype=np.float64).tobytes())
+	h.update(np.ascontiguousarray(dec, dtype=np.float64).tobytes())
+	return h.hexdigest()
+
+
+class SkyIndex:
+	"""KD-tree over unit-sphere positions; chord distance is monotonic in angular separation."""
+
+	def __init__(self, ra, dec, leaf_size: int = 40):
+		ra = np.asarray(ra, dtype=np.float64)
+		dec = np.asarray(dec, dtype=np.float64)
+		finite = np.isfinite(ra) & np.isfinite(dec)
+		self.n_rows = len(ra)
+		self.rows = np.flatnonzero(finite)
+		self.fingerprint = coords_fingerprint(ra, dec)
+		self.tree = KDTree(radec_to_unit(ra[finite], dec[finite]), leaf_size=leaf_size)
+
+	def query_cone(self, ra, dec, radius_arcsec: float = DEFAULT_RADIUS_ARCSEC):
+		"""Bulk cone search. Returns (query_row, index_row, sep_arcsec) arrays for every pair in range."""
+		ra = np.asarray(ra, dtype=np.float64)
+		dec = np.asarray(dec, dtype=np.float64)
+		finite = np.flatnonzero(np.isfinite(ra) & np.isfinite(dec))
+		if len(finite) == 0 or len(self.rows) == 0:
+			empty = np.zeros(0, dtype=np.int64)
+			return empty, empty, np.zeros(0)
+		neighbours, chords = self.tree.query_radius(
+			radec_to_unit(ra[finite], dec[finite]), r=arcsec_to_chord(radius_arcsec), return_distance=True
+		)
+		counts = np.fromiter((len(n) for n in neighbours), dtype=np.int64, count=len(neighbours))
+		query_rows = np.repeat(finite, counts)
+		index_rows = self.rows[np.concatenate(neighbours).astype(np.int64)] if counts.sum() else np.zeros(0, dtype=np.int64)
+		seps = chord_to_arcsec(np.concatenate(chords)) if counts.sum() else np.zeros(0)
+		return query_rows, index_rows, seps
+
+	def nearest(self, ra, dec, max_sep_arcsec: float = DEFAULT_RADIUS_ARCSEC):
+		"""Best match per query position: (index_row or -1, sep_arcsec or nan)."""
+		ra = np.asarray(ra, dtype=np.float64)
+		dec = np.asarray(dec, dtype=np.float64)
+		match = np.full(len(ra), -1, dtype=np.int64)
+		sep = np.full(len(ra), np.nan)
+		finite = np.flatnonzero(np.isfinite(ra) & np.isfinite(dec))
+		if len(finite) == 0 or len(self.rows) == 0:
+			return match, sep
+		chord, idx = self.tree.query(radec_to_unit(ra[finite], dec[finite]), k=1)
+		arcsec = chord_to_arcsec(chord[:, 0])
+		ok = arcsec <= max_sep_arcsec
+		match[finite[ok]] = self.rows[idx[ok, 0]]
+		sep[finite[ok]] = arcsec[ok]
+		return match, sep
+
+	def save(self, path: str):
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+		joblib.dump(self, path)
+
+	@staticmethod
+	def load(path: str):
+		return joblib.load(path)
+
+
+def load_or_build_index(name: str, ra, dec, index_dir: str = None):
+	"""Reuse the persisted index for `name` when its coordinates are unchanged."""
+	path = os.path.join(index_dir or default_index_dir(), f'{name}.joblib')
+	if os.path.exists(path):
+		index = SkyIndex.load(path)
+		if index.fingerprint == coords_fingerprint(ra, dec):
+			return index
+	index = SkyIndex(ra, dec)
+	index.save(path)
+	return index
+
+
+def cross_match(left: pd.DataFrame, right: pd.DataFrame, radius_arcsec: float = DEFAULT_RADIUS_ARCSEC,
+                right_index: SkyIndex = None):
+	"""All (left_row, right_row) pairs within radius_arcsec, with their separations."""
+	index = right_index or SkyIndex(right['ra'], right['dec'])
+	left_rows, right_rows, seps = index.query_cone(left['ra'], left['dec'], radius_arcsec)
+	return pd.DataFrame({'left_row': left_rows, 'right_row': right_rows, 'sep_arcsec': seps})
+
+
+def build_match_table(merged: pd.DataFrame, radius_arcsec: float = DEFAULT_RADIUS_ARCSEC,
+                      period_tolerance: float = DEFAULT_PERIOD_TOLERANCE, index: SkyIndex = None):
+	"""Cross-source duplicate table for a merged catalog (see multi_catalog.load_merged_catalog).
+
+	Rows from different sources count as the same planet when they lie within
+	radius_arcsec and their periods agree within period_tolerance; position alone
+	is not enough because multi-planet systems share coordinates. Rows are visited
+	in priority order (earliest source, then lowest row); a row is dropped as a
+	duplicate of the closest already-kept row it matches directly, otherwise it
+	is kept. Matches never chain, so every dropped row lies within radius_arcsec
+	of its keeper. Returns one row per dropped duplicate.
+	"""
+	index = index or SkyIndex(merged['ra'], merged['dec'])
+	a, b, seps = index.query_cone(merged['ra'], merged['dec'], radius_arcsec)
+
+	source = np.asarray(pd.Categorical(merged['source']).codes)
+	period = np.asarray(merged['koi_period'], dtype=np.float64)
+	with np.errstate(invalid='ignore', divide='ignore'):
+		rel = np.abs(period[a] - period[b]) / np.maximum(np.abs(period[a]), np.abs(period[b]))
+	n = len(merged)
+	rank = np.empty(n, dtype=np.int64)
+	rank[np.lexsort((np.arange(n), source))] = np.arange(n)
+	# Orient each pair from the lower-priority row `a` to the higher-priority row `b`.
+	edge = (rank[b] < rank[a]) & (source[a] != source[b]) & (rel <= period_tolerance)
+	a, b, seps = a[edge], b[edge], seps[edge]
+
+	# Edges sorted by the lower row's priority, closest candidate first: by the time
+	# a row is visited, every row that outranks it has already been kept or dropped.
+	keep_row = np.arange(n)
+	for i in np.lexsort((rank[b], seps, rank[a])):
+		if keep_row[a[i]] == a[i] and keep_row[b[i]] == b[i]:
+			keep_row[a[i]] = b[i]
+
+	dropped = np.flatnonzero(keep_row != np.arange(n))
+	object_id = np.asarray(merged['object_id'], dtype=object)
+	xyz_dropped = radec_to_unit(np.asarray(merged['ra'])[dropped], np.asarray(merged['dec'])[dropped])
+	xyz_kept = radec_to_unit(np.asarray(merged['ra'])[keep_row[dropped]], np.asarray(merged['dec'])[keep_row[dropped]])
+	sep = chord_to_arcsec(np.linalg.norm(xyz_dropped - xyz_kept, axis=1))
+	return pd.DataFrame({
+		'row': dropped,
+		'object_id': object_id[dropped],
+		'source': np.asarray(merged['source'], dtype=object)[dropped],
+		'duplicate_of_row': keep_row[dropped],
+		'duplicate_of': object_id[keep_row[dropped]],
+		'sep_arcsec': sep,
+	})
+
+
+def apply_match_table(merged: pd.DataFrame, match_table: pd.DataFrame):
+	"""Drop the duplicate rows listed in the match table."""
+	return merged.drop(index=merged.index[match_table['row'].to_numpy()]).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+	from multi_catalog import load_merged_catalog
+
+	merged = load_merged_catalog()
+	index = load_or_build_index('merged', merged['ra'], merged['dec'])
+	table = build_match_table(merged, index=index)
+	out_path = os.path.join(default_index_dir(), 'merged_matches.csv')
+	table.to_csv(out_path, index=False)
+	print(f"{len(merged)} rows, {len(table)} cross-catalog duplicates")
+	print(f"Saved match table to: {out_path}")
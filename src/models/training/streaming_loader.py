@@ -0,0 +1,187 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from catalog_cache import ensure_cache
+from catalog_validation import load_rejected_mask
+from koi_schema import FEATURE_DTYPE, label_categories, label_code_dtype
+
+
+DEFAULT_CHUNKSIZE = 50_000
+
+
+class ColumnStats:
+	"""Running per-column count / sum / min / max, updated one block at a time."""
+
+	def __init__(self, columns):
+		self.columns = list(columns)
+		k = len(self.columns)
+		self.n_rows = 0
+		self.count = np.zeros(k, dtype=np.int64)
+		self.total = np.zeros(k, dtype=np.float64)
+		self.min = np.full(k, np.inf)
+		self.max = np.full(k, -np.inf)
+
+	def update(self, block: np.ndarray):
+		block = np.asarray(block, dtype=np.float64)
+		if block.size == 0:
+			return self
+		finite = ~np.isnan(block)
+		self.n_rows += block.shape[0]
+		self.count += finite.sum(axis=0)
+		self.total += np.where(finite, block, 0.0).sum(axis=0)
+		self.min = np.fmin(self.min, np.where(finite, block, np.inf).min(axis=0))
+		self.max = np.fmax(self.max, np.where(finite, block, -np.inf).max(axis=0))
+		return self
+
+	def merge(self, other: 'ColumnStats'):
+		if other.columns != self.columns:
+			raise ValueError("Cannot merge stats over different columns")
+		self.n_rows += other.n_rows
+		self.count += other.count
+		self.total += other.total
+		self.min = np.fmin(self.min, other.min)
+		self.max = np.fmax(self.max, other.max)
+		return self
+
+	@property
+	def mean(self):
+		with np.errstate(invalid='ignore', divide='ignore'):
+			return np.where(self.count > 0, self.total / np.maximum(self.count, 1), np.nan)
+
+	def to_dict(self):
+		return {
+			'columns': self.columns,
+			'n_rows': int(self.n_rows),
+			'count': self.count.tolist(),
+			'total': self.total.tolist(),
+			'min': self.min.tolist(),
+			'max': self.max.tolist(),
+		}
+
+	@classmethod
+	def from_dict(cls, d: dict):
+		stats = cls(d['columns'])
+		stats.n_rows = int(d['n_rows'])
+		stats.count = np.asarray(d['count'], dtype=np.int64)
+		stats.total = np.asarray(d['total'], dtype=np.float64)
+		stats.min = np.asarray(d['min'], dtype=np.float64)
+		stats.max = np.asarray(d['max'], dtype=np.float64)
+		return stats
+
+	def to_frame(self):
+		return pd.DataFrame({
+			'count': self.count,
+			'mean': self.mean,
+			'min': np.where(self.count > 0, self.min, np.nan),
+			'max': np.where(self.count > 0, self.max, np.nan),
+		}, index=self.columns)
+
+
+def iter_catalog_chunks(columns, csv_path: str = None, chunksize: int = DEFAULT_CHUNKSIZE, drop_rejected: bool = False):
+	"""Yield DataFrame chunks holding only `columns`, sliced from the memory-mapped column cache.
+
+	Reading the cache rather than the CSV means ingested deltas are included. A
+	cold cache is built from the CSV chunk by chunk too (catalog_cache.build_cache),
+	so memory stays bounded by the chunk size either way.
+	With drop_rejected=True, rows that failed validation are left out, matching
+	load_columns(..., drop_rejected=True).
+	"""
+	cache_dir, manifest = ensure_cache(csv_path)
+	missing = [c for c in columns if c not in manifest['columns']]
+	if missing:
+		raise KeyError(f"Columns not in catalog: {missing}")
+	arrays = {col: np.load(os.path.join(cache_dir, manifest['columns'][col]['file']), mmap_mode='r') for col in columns}
+	rejected = load_rejected_mask(cache_dir) if drop_rejected else None
+	for start in range(0, manifest['n_rows'], chunksize):
+		stop = min(start + chunksize, manifest['n_rows'])
+		data = {}
+		for col in columns:
+			meta = manifest['columns'][col]
+			block = np.asarray(arrays[col][start:stop])
+			if meta['kind'] == 'category':
+				block = pd.Categorical.from_codes(block, categories=meta['categories'])
+			data[col] = block
+		chunk = pd.DataFrame(data, columns=list(columns))
+		if rejected is not None:
+			chunk = chunk[~rejected[start:stop]]
+		yield chunk
+
+
+def _feature_block(chunk: pd.DataFrame, feature_cols, dtype=np.float64):
+	X = chunk[feature_cols].apply(pd.to_numeric, errors='coerce')
+	return np.ascontiguousarray(X.to_numpy(dtype=dtype, na_value=np.nan))
+
+
+def compute_column_stats(feature_cols, label_col: str = None, csv_path: str = None, chunksize: int = DEFAULT_CHUNKSIZE,
+                         drop_rejected: bool = False):
+	"""First pass: one sweep over the catalog for per-column stats and the label vocabulary."""
+	columns = list(feature_cols) + ([label_col] if label_col else [])
+	stats = ColumnStats(feature_cols)
+	labels = set()
+	for chunk in iter_catalog_chunks(columns, csv_path, chunksize, drop_rejected):
+		stats.update(_feature_block(chunk, feature_cols))
+		if label_col:
+			labels.update(chunk[label_col].dropna().astype(str).str.strip().unique().tolist())
+	return stats, label_categories(label_col, labels) if label_col else []
+
+
+def iter_imputed_blocks(feature_cols, label_col: str = None, stats: ColumnStats = None, csv_path: str = None,
+                        chunksize: int = DEFAULT_CHUNKSIZE, dtype=FEATURE_DTYPE, drop_rejected: bool = False):
+	"""Second pass: yield (X_block, y_block) with NaNs replaced by the first-pass column means.
+
+	Only one chunk is held in memory at a time. y_block is None when no label column is given.
+	"""
+	if stats is None:
+		stats, _ = compute_column_stats(feature_cols, None, csv_path, chunksize, drop_rejected)
+	fill = stats.mean.astype(dtype)
+	columns = list(feature_cols) + ([label_col] if label_col else [])
+	for chunk in iter_catalog_chunks(columns, csv_path, chunksize, drop_rejected):
+		X = _feature_block(chunk, feature_cols, dtype)
+		nan_rows, nan_cols = np.nonzero(np.isnan(X))
+		X[nan_rows, nan_cols] = fill[nan_cols]
+		y = chunk[label_col].astype(str).str.strip().to_numpy() if label_col else None
+		yield X, y
+
+
+def write_imputed_memmap(feature_cols, out_dir: str, label_col: str = None, csv_path: str = None,
+                         chunksize: int = DEFAULT_CHUNKSIZE, dtype=FEATURE_DTYPE, drop_rejected: bool = False):
+	"""Run both passes and write X.npy (and y.npy label codes) as memory-mappable arrays.
+
+	Returns (X, y, label_classes, stats) where X and y are read-only memmaps.
+	"""
+	stats, label_classes = compute_column_stats(feature_cols, label_col, csv_path, chunksize, drop_rejected)
+	os.makedirs(out_dir, exist_ok=True)
+	x_path = os.path.join(out_dir, 'X.npy')
+	y_path = os.path.join(out_dir, 'y.npy')
+
+	X_out = np.lib.format.open_memmap(x_path, mode='w+', dtype=dtype, shape=(stats.n_rows, len(feature_cols)))
+	y_out = None
+	if label_col:
+		y_out = np.lib.format.open_memmap(y_path, mode='w+', dtype=label_code_dtype(label_classes), shape=(stats.n_rows,))
+	label_index = pd.Index(label_classes)
+
+	start = 0
+	for X_block, y_block in iter_imputed_blocks(feature_cols, label_col, stats, csv_path, chunksize, dtype, drop_rejected):
+		stop = start + X_block.shape[0]
+		X_out[start:stop] = X_block
+		if y_out is not None:
+			y_out[start:stop] = label_index.get_indexer(y_block)
+		start = stop
+	X_out.flush()
+	del X_out
+	if y_out is not None:
+		y_out.flush()
+		del y_out
+
+	X = np.load(x_path, mmap_mode='r')
+	y = np.load(y_path, mmap_mode='r') if label_col else None
+	return X, y, label_classes, stats
+
+
+if __name__ == "__main__":
+	feature_cols = ['koi_period', 'koi_duration', 'koi_depth', 'koi_prad', 'koi_model_snr']
+	stats, labels = compute_column_stats(feature_cols, 'koi_pdisposition')
+	print(f"Rows: {stats.n_rows}  Labels: {labels}")
+	print(stats.to_frame())
@@ -0,0 +1,183 @@
+"""Out-of-core logistic regression: SGD on the logistic loss, fitted with partial_fit.
+
+The catalog is streamed once through streaming_loader into an imputed
+memory-mapped matrix, so only one block of rows is ever held in memory. The
+stream reads the column cache with rows that failed validation dropped, so it
+sees the same rows (ingested deltas included) as load_columns(...,
+drop_rejected=True) in the batch trainers. Training then walks that matrix in
+row blocks:
+
+- the heavy-tailed columns get the same log1p as the batch model
+  (logistic_regression.log_transform), which is stateless;
+- a StandardScaler is updated block by block with partial_fit, which keeps a
+  running mean and variance;
+- an SGDClassifier(loss='log_loss') gets each standardized block through
+  partial_fit, for several epochs. Block order and the rows inside each block
+  are reshuffled every epoch.
+
+The result is a log + scaler + SGD pipeline saved as logistic_regression_streaming.
+Pass --benchmark to also fit the batch LogisticRegression from
+logistic_regression.py on the same rows and compare.
+
+    python src/models/training/streaming_logistic.py --epochs 5 --benchmark
+"""
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, confusion_matrix
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from artifacts import save_confusion_matrix, save_model
+from logistic_regression import FEATURES, LABEL, build_model as build_batch_model, log_transform
+from model_registry import register_model
+from streaming_loader import DEFAULT_CHUNKSIZE, ColumnStats, write_imputed_memmap
+
+
+MODEL_NAME = 'logistic_regression_streaming'
+DEFAULT_BATCH_ROWS = 4096
+
+
+def build_model(**params):
+	defaults = dict(loss='log_loss', alpha=1e-4, average=True, random_state=0)
+	defaults.update(params)
+	return SGDClassifier(**defaults)
+
+
+def iter_row_blocks(n_rows: int, batch_rows: int, rng=None):
+	"""[start, stop) row ranges, in shuffled order when `rng` is given."""
+	starts = np.arange(0, n_rows, batch_rows)
+	if rng is not None:
+		starts = rng.permutation(starts)
+	for start in starts:
+		yield int(start), int(min(start + batch_rows, n_rows))
+
+
+def split_rows(y_codes, test_size: float = 0.2, seed: int = 42):
+	"""Boolean test mask over labelled rows, from a seeded per-row coin flip."""
+	rng = np.random.default_rng(seed)
+	return (rng.random(len(y_codes)) < test_size) & (np.asarray(y_codes) >= 0)
+
+
+def fit_streaming(X, y_codes, classes, train_mask, epochs: int = 5, batch_rows: int = DEFAULT_BATCH_ROWS,
+                  seed: int = 0, **params):
+	"""Fit scaler then SGD block by block over the rows where train_mask is set.
+
+	X holds the FEATURES columns, in order.
+	"""
+	labelled = train_mask & (np.asarray(y_codes) >= 0)
+	classes = np.asarray(classes, dtype=object)
+	n_rows = X.shape[0]
+
+	# The log step keeps no statistics; fitting it on a few rows only records the column count.
+	log = log_transform().fit(X[:min(n_rows, batch_rows)])
+	scaler = StandardScaler()
+	for start, stop in iter_row_blocks(n_rows, batch_rows):
+		rows = labelled[start:stop]
+		if rows.any():
+			scaler.partial_fit(log.transform(X[start:stop][rows]))
+
+	clf = build_model(**params)
+	rng = np.random.default_rng(seed)
+	for _ in range(epochs):
+		for start, stop in iter_row_blocks(n_rows, batch_rows, rng):
+			rows = np.flatnonzero(labelled[start:stop])
+			if not len(rows):
+				continue
+			rows = rng.permutation(rows) + start
+			clf.partial_fit(scaler.transform(log.transform(X[rows])), classes[y_codes[rows]], classes=classes)
+	return Pipeline([('log', log), ('scale', scaler), ('sgd', clf)])
+
+
+def train_stats(X, mask, batch_rows: int = DEFAULT_BATCH_ROWS):
+	"""model_registry.feature_stats over the rows where mask is set, one block at a time."""
+	stats = ColumnStats(FEATURES)
+	squares = np.zeros(len(FEATURES))
+	for start, stop in iter_row_blocks(X.shape[0], batch_rows):
+		block = np.asarray(X[start:stop][mask[start:stop]], dtype=np.float64)
+		stats.update(block)
+		squares += np.nansum(block ** 2, axis=0)
+	mean = stats.mean
+	std = np.sqrt(np.maximum(squares / np.maximum(stats.count, 1) - mean ** 2, 0.0))
+	return {col: {'mean': float(mean[i]), 'std': float(std[i]), 'min': float(stats.min[i]), 'max': float(stats.max[i])}
+	        for i, col in enumerate(FEATURES)}
+
+
+def predict_blocks(model, X, mask, batch_rows: int = DEFAULT_BATCH_ROWS):
+	"""Predict the rows where mask is set, one block at a time."""
+	out = []
+	for start, stop in iter_row_blocks(X.shape[0], batch_rows):
+		rows = np.flatnonzero(mask[start:stop]) + start
+		if len(rows):
+			out.append(model.predict(X[rows]))
+	return np.concatenate(out) if out else np.array([], dtype=object)
+
+
+def _measure(fn):
+	tracemalloc.start()
+	start = time.perf_counter()
+	result = fn()
+	seconds = time.perf_counter() - start
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return result, seconds, peak
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--epochs', type=int, default=5)
+	parser.add_argument('--batch-rows', type=int, default=DEFAULT_BATCH_ROWS, help='rows per partial_fit call')
+	parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='catalog rows read at a time')
+	parser.add_argument('--test-size', type=float, default=0.2)
+	parser.add_argument('--seed', type=int, default=42)
+	parser.add_argument('--benchmark', action='store_true', help='also fit the batch LogisticRegression and compare')
+	parser.add_argument('--data', default=None, help='catalog CSV (default: src/data/keplar.csv)')
+	parser.add_argument('--models-dir', default=None)
+	args = parser.parse_args(argv)
+
+	work_dir = tempfile.mkdtemp(prefix='exoura_sgd_')
+	try:
+		X, y_codes, classes, stats = write_imputed_memmap(FEATURES, work_dir, LABEL, args.data, args.chunksize,
+		                                                     drop_rejected=True)
+		test_mask = split_rows(y_codes, args.test_size, args.seed)
+		train_mask = ~test_mask & (np.asarray(y_codes) >= 0)
+		y_test = np.asarray(classes, dtype=object)[y_codes[test_mask]]
+		print(f"{stats.n_rows} rows streamed; {int(train_mask.sum())} train / {int(test_mask.sum())} test")
+
+		model, seconds, peak = _measure(lambda: fit_streaming(X, y_codes, classes, train_mask, args.epochs,
+		                                                      args.batch_rows, seed=args.seed))
+		y_pred = predict_blocks(model, X, test_mask, args.batch_rows)
+		acc = accuracy_score(y_test, y_pred)
+		print(f"streaming SGD: accuracy={acc:.4f}  fit={seconds:.2f}s  peak={peak / 1e6:.1f} MB  ({args.epochs} epochs)")
+
+		if args.benchmark:
+			def fit_batch():
+				X_train = np.asarray(X[train_mask])
+				y_train = np.asarray(classes, dtype=object)[y_codes[train_mask]]
+				return build_batch_model().fit(X_train, y_train)
+			batch, seconds, peak = _measure(fit_batch)
+			batch_acc = accuracy_score(y_test, batch.predict(np.asarray(X[test_mask])))
+			print(f"batch LogisticRegression: accuracy={batch_acc:.4f}  fit={seconds:.2f}s  peak={peak / 1e6:.1f} MB")
+
+		labels_sorted = sorted(str(c) for c in classes)
+		path = save_model(model, MODEL_NAME, args.models_dir)
+		manifest = register_model(path, MODEL_NAME, model, FEATURES,
+		                          train_stats=train_stats(X, train_mask, args.batch_rows), dtype=X.dtype.name,
+		                          metrics={'accuracy': float(acc), 'n_train': int(train_mask.sum()),
+		                                   'n_test': int(test_mask.sum()), 'epochs': args.epochs},
+		                          models_dir=args.models_dir)
+		print(f"Saved model to: {path} (registry v{manifest['version']})")
+		save_confusion_matrix(labels_sorted, confusion_matrix(y_test, y_pred, labels=labels_sorted), MODEL_NAME,
+		                      args.models_dir)
+		return model
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,279 @@
+"""Train any of the three models from one shared, preprocessed split.
+
+The catalog is loaded and mean-imputed once, split once with a single seed,
+and written as .npy files that every worker process memory-maps instead of
+receiving a pickled copy. Models then train concurrently in a process pool.
+Trainers that handle NaN natively (hist gradient boosting) get the same split
+without imputation; the choice is recorded in each registry manifest.
+
+    python src/models/training/train.py                 # all models
+    python src/models/training/train.py --models rf gbt --workers 2
+    python src/models/training/train.py --tuned          # use tune.py's best params
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.metrics import accuracy_score, confusion_matrix
+from sklearn.model_selection import train_test_split
+
+from artifacts import get_models_dir, load_best_params, save_confusion_matrix, save_json, save_model
+from catalog_cache import load_columns
+from delta_ingest import cached_column_means
+from koi_schema import FEATURE_DTYPE
+from model_registry import feature_stats, register_artifact
+
+
+TRAINERS = {
+	'random_forest': 'random_forest',
+	'gradient_boosted_trees': 'gradient_boosted_trees',
+	'logistic_regression': 'logistic_regression',
+}
+ALIASES = {'rf': 'random_forest', 'gbt': 'gradient_boosted_trees', 'lr': 'logistic_regression'}
+LABEL = 'koi_pdisposition'
+KEY = 'kepoi_name'
+SPLIT_NAME = 'split.json'
+
+
+def resolve_models(names):
+	resolved = []
+	for name in names or list(TRAINERS):
+		name = ALIASES.get(name, name)
+		if name not in TRAINERS:
+			raise ValueError(f"Unknown model '{name}'. Choose from: {sorted(TRAINERS) + sorted(ALIASES)}")
+		if name not in resolved:
+			resolved.append(name)
+	return resolved
+
+
+def trainer_module(name: str):
+	return importlib.import_module(TRAINERS[name])
+
+
+def imputes(name: str, params: dict = None):
+	"""Whether model `name`, built with `params`, trains on the mean-imputed split.
+
+	A trainer module that handles missing values itself exposes
+	needs_imputation(**params) returning False.
+	"""
+	needs = getattr(trainer_module(name), 'needs_imputation', None)
+	return True if needs is None else bool(needs(**(params or {})))
+
+
+def union_features(models):
+	"""Every column any of `models` needs, in first-seen order."""
+	features = []
+	for name in models:
+		for col in trainer_module(name).FEATURES:
+			if col not in features:
+				features.append(col)
+	return features
+
+
+def _hashed_holdout(keys, test_size: float):
+	"""Stable held-out assignment for rows that are new since a saved split: True = held out."""
+	digests = np.array([int(hashlib.sha1(str(k).encode()).hexdigest()[:8], 16) for k in keys], dtype=np.float64)
+	return digests / 2.0 ** 32 < test_size
+
+
+def prepare_shared_data(models, work_dir: str, test_size: float = 0.2, seed: int = 42, csv_path: str = None,
+                        frame=None, dtype=FEATURE_DTYPE, split: dict = None):
+	"""Load, impute and split the union of all model features once; write memory-mappable arrays.
+
+	The unimputed features are written alongside (load_shared_data(impute=False)).
+
+	`frame` replaces the cached Kepler catalog, e.g. with multi_catalog.load_merged_catalog().
+	The cached catalog is imputed with the means delta_ingest keeps in its manifest.
+	Features are written as `dtype` (float32 by default, which sklearn's trees use
+	internally, so fitting and predicting need no converted copy).
+
+	The row keys of each side are written to split.json (see load_split_keys).
+	Passing such a `split` back reproduces it on a changed catalog: its test rows
+	stay held out, and rows added since are held out by a stable hash of their key
+	at the same test_size, so a held-out row is never one a saved model trained on.
+	"""
+	features = union_features(models)
+	if frame is None:
+		df = load_columns(features + [LABEL, KEY], csv_path=csv_path, drop_rejected=True)
+		means = cached_column_means(features, csv_path)
+	else:
+		df = frame[features + [LABEL] + ([KEY] if KEY in frame.columns else [])]
+		means = df[features].mean()
+	df = df[df[LABEL].notna()]
+	X = df[features]
+	y = df[LABEL]
+
+	classes = [str(c) for c in y.cat.categories] if hasattr(y, 'cat') else sorted(y.unique().tolist())
+	codes = np.asarray(y.cat.codes if hasattr(y, 'cat') else np.searchsorted(classes, y), dtype=np.int8)
+
+	keys = df[KEY].astype(str).to_numpy() if KEY in df.columns else None
+	if split is None:
+		idx = np.arange(len(df))
+		train_idx, test_idx = train_test_split(idx, test_size=test_size, random_state=seed, stratify=codes)
+	else:
+		if keys is None:
+			raise ValueError(f"Reusing a saved split needs the '{KEY}' column")
+		held = np.isin(keys, split['test'])
+		new = np.flatnonzero(~held & ~np.isin(keys, split['train']))
+		held[new] = _hashed_holdout(keys[new], split.get('test_size', test_size))
+		train_idx, test_idx = np.flatnonzero(~held), np.flatnonzero(held)
+		seed, test_size = split.get('seed', seed), split.get('test_size', test_size)
+	X_raw = np.ascontiguousarray(X.to_numpy(dtype=dtype, na_value=np.nan))
+	X_all = np.ascontiguousarray(X.fillna(means).to_numpy(dtype=dtype, na_value=np.nan))
+
+	os.makedirs(work_dir, exist_ok=True)
+	np.save(os.path.join(work_dir, 'X_train.npy'), X_all[train_idx])
+	np.save(os.path.join(work_dir, 'X_test.npy'), X_all[test_idx])
+	np.save(os.path.join(work_dir, 'X_train_raw.npy'), X_raw[train_idx])
+	np.save(os.path.join(work_dir, 'X_test_raw.npy'), X_raw[test_idx])
+	np.save(os.path.join(work_dir, 'y_train.npy'), codes[train_idx])
+	np.save(os.path.join(work_dir, 'y_test.npy'), codes[test_idx])
+	meta = {'features': features, 'classes': classes, 'seed': seed, 'test_size': test_size, 'dtype': np.dtype(dtype).name,
+	        'n_train': int(len(train_idx)), 'n_test': int(len(test_idx))}
+	with open(os.path.join(work_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+		json.dump(meta, f)
+	if keys is not None:
+		with open(os.path.join(work_dir, SPLIT_NAME), 'w', encoding='utf-8') as f:
+			json.dump({'key': KEY, 'seed': seed, 'test_size': test_size,
+			           'train': keys[train_idx].tolist(), 'test': keys[test_idx].tolist()}, f)
+	return meta
+
+
+def load_split_keys(work_dir: str):
+	"""Row keys on each side of the shared split, or None when the catalog had no key column."""
+	path = os.path.join(work_dir, SPLIT_NAME)
+	if not os.path.exists(path):
+		return None
+	with open(path, 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+def load_shared_data(work_dir: str, feature_cols=None, impute: bool = True):
+	"""Memory-map the shared split; optionally select a model's feature columns (in its order).
+
+	impute=False returns the features with their missing values left as NaN.
+	"""
+	with open(os.path.join(work_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+		meta = json.load(f)
+	suffix = '' if impute else '_raw'
+	X_train = np.load(os.path.join(work_dir, f'X_train{suffix}.npy'), mmap_mode='r')
+	X_test = np.load(os.path.join(work_dir, f'X_test{suffix}.npy'), mmap_mode='r')
+	classes = np.asarray(meta['classes'], dtype=object)
+	y_train = classes[np.load(os.path.join(work_dir, 'y_train.npy'))]
+	y_test = classes[np.load(os.path.join(work_dir, 'y_test.npy'))]
+	if feature_cols is not None:
+		cols = [meta['features'].index(c) for c in feature_cols]
+		X_train, X_test = X_train[:, cols], X_test[:, cols]
+	return X_train, X_test, y_train, y_test, meta
+
+
+def train_one(name: str, work_dir: str, models_dir: str = None, params: dict = None):
+	"""Worker entry point: fit one model on the shared split and write its artifacts."""
+	module = trainer_module(name)
+	impute = imputes(name, params)
+	X_train, X_test, y_train, y_test, meta = load_shared_data(work_dir, module.FEATURES, impute)
+
+	model = module.build_model(**(params or {}))
+	fit = getattr(module, 'fit_model', None)
+	start = time.perf_counter()
+	curve = None
+	if fit is not None:
+		curve = fit(model, X_train, y_train)
+	else:
+		model.fit(X_train, y_train)
+	fit_seconds = time.perf_counter() - start
+	if curve is not None:
+		save_json(curve, name, 'loss_curve', models_dir)
+
+	y_pred = model.predict(X_test)
+	acc = accuracy_score(y_test, y_pred)
+	labels_sorted = sorted(meta['classes'])
+	cnf_matrix = confusion_matrix(y_test, y_pred, labels=labels_sorted)
+
+	return {
+		'model': name,
+		'accuracy': float(acc),
+		'fit_seconds': fit_seconds,
+		'model_path': save_model(model, name, models_dir),
+		'confusion_matrix_path': save_confusion_matrix(labels_sorted, cnf_matrix, name, models_dir),
+		'features': list(module.FEATURES),
+		'classes': meta['classes'],
+		'dtype': meta['dtype'],
+		'imputation': 'mean' if impute else 'none',
+		'train_stats': feature_stats(X_train, module.FEATURES),
+	}
+
+
+def train_all(models=None, workers: int = None, test_size: float = 0.2, seed: int = 42,
+              csv_path: str = None, models_dir: str = None, params: dict = None, tuned: bool = False,
+              dtype=FEATURE_DTYPE):
+	models = resolve_models(models)
+	models_dir = get_models_dir(models_dir)
+	params = dict(params or {})
+	if tuned:
+		for name in models:
+			if name not in params and load_best_params(name, models_dir) is not None:
+				params[name] = load_best_params(name, models_dir)
+				print(f"Using tuned parameters for {name}: {params[name]}")
+	work_dir = tempfile.mkdtemp(prefix='exoura_train_')
+	try:
+		meta = prepare_shared_data(models, work_dir, test_size, seed, csv_path, dtype=dtype)
+		print(f"Shared split: {meta['n_train']} train / {meta['n_test']} test rows, seed={seed}, {meta['dtype']}")
+		workers = workers or min(len(models), os.cpu_count() or 1)
+		results = []
+		with ProcessPoolExecutor(max_workers=workers) as pool:
+			futures = {pool.submit(train_one, name, work_dir, models_dir, params.get(name)): name for name in models}
+			for future in as_completed(futures):
+				result = future.result()
+				print(f"  {result['model']}: accuracy={result['accuracy']:.4f}  fit={result['fit_seconds']:.2f}s")
+				results.append(result)
+		split = load_split_keys(work_dir)
+		# Registered here rather than in the workers so the registry index has a single writer.
+		for r in results:
+			if split is not None:
+				save_json(split, r['model'], 'holdout', models_dir)
+			manifest = register_artifact(
+				r['model_path'], r['model'], r['features'], r['classes'], r['dtype'],
+				metrics={'accuracy': r['accuracy'], 'fit_seconds': r['fit_seconds'], 'n_train': meta['n_train'],
+				         'n_test': meta['n_test'], 'split_seed': seed},
+				train_stats=r['train_stats'], params=params.get(r['model']), imputation=r['imputation'],
+				models_dir=models_dir,
+			)
+			r['registry_version'] = manifest['version']
+		return sorted(results, key=lambda r: models.index(r['model']))
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--models', nargs='+', default=None, help='rf, gbt, lr or full names (default: all)')
+	parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per model)')
+	parser.add_argument('--seed', type=int, default=42, help='train/test split seed shared by all models')
+	parser.add_argument('--test-size', type=float, default=0.2)
+	parser.add_argument('--data', default=None, help='catalog CSV (default: src/data/keplar.csv)')
+	parser.add_argument('--models-dir', default=None, help='artifact directory (default: src/models/trained_models)')
+	parser.add_argument('--tuned', action='store_true', help='use <model>_best_params.json written by tune.py')
+	parser.add_argument('--dtype', choices=('float32', 'float64'), default='float32', help='feature dtype end to end')
+	args = parser.parse_args(argv)
+
+	start = time.perf_counter()
+	results = train_all(args.models, args.workers, args.test_size, args.seed, args.data, args.models_dir,
+	                    tuned=args.tuned, dtype=args.dtype)
+	wall = time.perf_counter() - start
+	print(f"\nTrained {len(results)} model(s) in {wall:.2f}s wall-clock "
+	      f"(sum of fit times {sum(r['fit_seconds'] for r in results):.2f}s)")
+	for r in results:
+		print(f"Saved {r['model']} to: {r['model_path']} (registry v{r['registry_version']})")
+	return results
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,188 @@
+"""Successive-halving hyperparameter search for the forest and boosting models.
+
+Candidates are sampled from a search space, scored on cached CV folds with a
+small slice of the training rows, and only the best 1/eta survive to the next
+rung, which gets eta times more rows. Every (candidate, budget, fold) result is
+appended to a JSONL trial log, so an interrupted search resumes where it left
+off. The winner is written to <model>_best_params.json in trained_models,
+which `train.py --tuned` picks up.
+
+    python src/models/training/tune.py --model rf
+    python src/models/training/tune.py --model gbt --candidates 48 --eta 3
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from scipy.stats import loguniform, randint
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import ParameterSampler
+
+from artifacts import best_params_path, get_models_dir
+from cv_folds import load_fold, prepare_folds, read_folds
+from train import resolve_models, trainer_module
+
+
+SEARCH_SPACES = {
+	'random_forest': {
+		'n_estimators': randint(50, 400),
+		'max_depth': [8, 12, 16, 20, 25, 32, None],
+		'min_samples_split': randint(2, 30),
+		'min_samples_leaf': randint(1, 10),
+		'max_features': ['sqrt', 'log2', 0.5, None],
+	},
+	# Default 'hist' engine; see gradient_boosted_trees.build_model.
+	'gradient_boosted_trees': {
+		'max_iter': randint(100, 800),
+		'learning_rate': loguniform(0.02, 0.3),
+		'max_leaf_nodes': randint(8, 64),
+		'min_samples_leaf': randint(5, 60),
+		'l2_regularization': loguniform(1e-4, 10.0),
+	},
+}
+
+
+def trial_log_path(name: str, models_dir: str = None):
+	tuning_dir = os.path.join(get_models_dir(models_dir), 'tuning')
+	os.makedirs(tuning_dir, exist_ok=True)
+	return os.path.join(tuning_dir, f'{name}_trials.jsonl')
+
+
+def _to_json(value):
+	if isinstance(value, np.generic):
+		return value.item()
+	return value
+
+
+def candidate_id(params: dict):
+	return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _trial_key(candidate: str, folds: str, seed: int, fraction: float, fold: int):
+	"""`folds` is the cv_folds key (catalog, deltas, features, k), so a changed catalog or seed never resumes stale trials."""
+	return candidate, folds, seed, round(fraction, 6), fold
+
+
+def _read_trials(path: str):
+	trials = {}
+	if not os.path.exists(path):
+		return trials
+	with open(path, 'r', encoding='utf-8') as f:
+		for line in f:
+			if not line.strip():
+				continue
+			try:
+				t = json.loads(line)
+			except ValueError:
+				continue  # a partially written last line from an interrupted run
+			trials[_trial_key(t['candidate'], t.get('folds'), t.get('seed'), t['fraction'], t['fold'])] = t
+	return trials
+
+
+def _subsample(n: int, fraction: float, seed: int):
+	order = np.random.default_rng(seed).permutation(n)
+	return np.sort(order[:max(1, int(math.ceil(n * fraction)))])
+
+
+def evaluate_trial(name: str, params: dict, fold_dir: str, fold: int, fraction: float, seed: int):
+	module = trainer_module(name)
+	X_train, X_val, y_train, y_val = load_fold(fold_dir, fold, module.FEATURES)
+	rows = _subsample(len(y_train), fraction, seed + fold)
+	model = module.build_model(**params)
+	start = time.perf_counter()
+	model.fit(X_train[rows], y_train[rows])
+	fit_seconds = time.perf_counter() - start
+	return accuracy_score(y_val, model.predict(X_val)), fit_seconds
+
+
+def successive_halving(name: str, n_candidates: int = 27, eta: int = 3, min_fraction: float = None,
+                       n_splits: int = 3, seed: int = 0, n_jobs: int = -1, models_dir: str = None,
+                       csv_path: str = None):
+	"""Run (or resume) a successive-halving search and write the best config."""
+	module = trainer_module(name)
+	fold_dir = prepare_folds(module.FEATURES, n_splits=n_splits, seed=42, csv_path=csv_path)
+	n_folds = read_folds(fold_dir)['n_splits']
+	folds = os.path.basename(fold_dir)
+
+	candidates = [
+		{k: _to_json(v) for k, v in p.items()}
+		for p in ParameterSampler(SEARCH_SPACES[name], n_iter=n_candidates, random_state=seed)
+	]
+	n_rungs = max(1, int(math.floor(math.log(n_candidates, eta))) + 1)
+	min_fraction = min_fraction or eta ** -(n_rungs - 1)
+
+	log_path = trial_log_path(name, models_dir)
+	trials = _read_trials(log_path)
+	survivors = candidates
+	scores = {}
+	for rung in range(n_rungs):
+		fraction = min(1.0, min_fraction * eta ** rung)
+		todo = [
+			(p, fold) for p in survivors for fold in range(n_folds)
+			if _trial_key(candidate_id(p), folds, seed, fraction, fold) not in trials
+		]
+		print(f"Rung {rung}: {len(survivors)} candidates x {n_folds} folds at {fraction:.0%} of rows "
+		      f"({len(todo)} to run, {len(survivors) * n_folds - len(todo)} resumed)")
+		results = Parallel(n_jobs=n_jobs)(
+			delayed(evaluate_trial)(name, p, fold_dir, fold, fraction, seed) for p, fold in todo
+		)
+		with open(log_path, 'a', encoding='utf-8') as f:
+			for (p, fold), (acc, fit_seconds) in zip(todo, results):
+				t = {'candidate': candidate_id(p), 'rung': rung, 'folds': folds, 'seed': seed, 'n_folds': n_folds,
+				     'fold': fold, 'fraction': fraction, 'params': p, 'accuracy': acc, 'fit_seconds': fit_seconds}
+				trials[_trial_key(t['candidate'], folds, seed, fraction, fold)] = t
+				f.write(json.dumps(t) + '\n')
+
+		scores = {}
+		for p in survivors:
+			cid = candidate_id(p)
+			scores[cid] = float(np.mean([trials[_trial_key(cid, folds, seed, fraction, k)]['accuracy'] for k in range(n_folds)]))
+		keep = max(1, len(survivors) // eta) if rung < n_rungs - 1 else 1
+		survivors = sorted(survivors, key=lambda p: scores[candidate_id(p)], reverse=True)[:keep]
+
+	best = survivors[0]
+	result = {
+		'model': name,
+		'params': best,
+		'cv_accuracy': scores[candidate_id(best)],
+		'n_candidates': n_candidates,
+		'eta': eta,
+		'n_splits': n_folds,
+		'trial_log': log_path,
+	}
+	with open(best_params_path(name, models_dir), 'w', encoding='utf-8') as f:
+		json.dump(result, f, indent=2)
+	return result
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--model', required=True, help='rf or gbt')
+	parser.add_argument('--candidates', type=int, default=27)
+	parser.add_argument('--eta', type=int, default=3)
+	parser.add_argument('--folds', type=int, default=3)
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--jobs', type=int, default=-1, help='parallel workers (default: all cores)')
+	parser.add_argument('--models-dir', default=None)
+	parser.add_argument('--data', default=None)
+	args = parser.parse_args(argv)
+
+	name = resolve_models([args.model])[0]
+	if name not in SEARCH_SPACES:
+		parser.error(f"No search space for {name}; choose from {sorted(SEARCH_SPACES)}")
+
+	start = time.perf_counter()
+	result = successive_halving(name, args.candidates, args.eta, n_splits=args.folds, seed=args.seed,
+	                            n_jobs=args.jobs, models_dir=args.models_dir, csv_path=args.data)
+	print(f"\nBest {name} (cv accuracy {result['cv_accuracy']:.4f}) in {time.perf_counter() - start:.1f}s:")
+	print(json.dumps(result['params'], indent=2))
+	print(f"Saved to: {best_params_path(name, args.models_dir)}")
+
+
+if __name__ == "__main__":
+	main()
@@ -1,9 +1,11 @@
 import streamlit as st
-import numpy as np
-import joblib
+import sys
 from pathlib import Path
 import matplotlib.pyplot as plt
 
+sys.path.append(str(Path(__file__).resolve().parents[2] / 'src' / 'models' / 'training'))
+from model_registry import load_cached
+
 # ------------------ PAGE CONFIG ------------------
 st.set_page_config(
     page_title="Demo - Exoura",
@@ -190,22 +192,12 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def load_demo_model():
-    """Load the Random Forest model from common locations.
-    Tries the page directory, the web/pages path, and the trained_models path.
-    """
-    here = Path(__file__).parent
-    repo_root = here.parents[2] if len(here.parents) >= 2 else Path.cwd()
-    candidates = [
-        here / 'random_forest_model.joblib',
-        here.parent / 'pages' / 'random_forest_model.joblib',
-        repo_root / 'web' / 'pages' / 'random_forest_model.joblib',
-        repo_root / 'src' / 'models' / 'trained_models' / 'random_forest_model.joblib',
-    ]
-    for p in candidates:
-        if p.exists():
-            return joblib.load(p)
-    st.error("Couldn't find random_forest_model.joblib. Tried: " + ", ".join(str(p) for p in candidates))
-    raise FileNotFoundError("random_forest_model.joblib not found in expected locations")
+    """Latest registered random forest, deserialized once per process and shared by all sessions."""
+    try:
+        return load_cached('random_forest', mmap=True)
+    except LookupError as e:
+        st.error(str(e))
+        raise
 
 model = load_demo_model()
 
@@ -222,14 +214,14 @@ with input_cols[3]:
 with input_cols[4]:
     koi_dor = st.number_input('Orbit Ratio (a/R*)', value=0.0, step=0.1, format="%f", key='koi_dor', help='Ratio of orbital distance to stellar radius (unitless).')
 
-# Model expects features in this order: ['koi_prad','koi_dor','koi_period','koi_duration','koi_depth']
-inputs = [koi_prad, koi_dor, koi_period, koi_duration, koi_depth]
+# Named inputs; the registered model orders them (as float32) from its manifest.
+inputs = {'koi_prad': koi_prad, 'koi_dor': koi_dor, 'koi_period': koi_period,
+          'koi_duration': koi_duration, 'koi_depth': koi_depth}
 
-if any(x != 0.0 for x in inputs):
-    input_array = np.array([inputs])
-    predicted_label = model.predict(input_array)[0]
+if any(x != 0.0 for x in inputs.values()):
+    predicted_label = model.predict(inputs)[0]
     labels = list(getattr(model, 'classes_', [])) or ['CONFIRMED', 'FALSE POSITIVE']
-    probs = model.predict_proba(input_array)[0]
+    probs = model.predict_proba(inputs)[0]
     fig, ax = plt.subplots(figsize=(4,4))
     pie_result = ax.pie(
         probs, labels=labels, autopct='%1.1f%%', startangle=90,
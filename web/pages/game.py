@@ -1,11 +1,14 @@
 import streamlit as st
 import random
-import joblib
+import sys
 import pandas as pd
 from pathlib import Path
 import time
 from streamlit.components.v1 import html
 
+sys.path.append(str(Path(__file__).resolve().parents[2] / 'src' / 'models' / 'training'))
+from model_registry import load_cached
+
 # ------------------ PAGE CONFIG ------------------
 st.set_page_config(
     page_title="Exoura - Game",
@@ -144,33 +147,18 @@ def get_parameter_info():
 
 def load_model():
     """
-    Load the trained Random Forest model.
+    Latest registered Random Forest, deserialized once per process and shared by all sessions.
     """
-    # Try common locations relative to this file and the repo root
-    here = Path(__file__).parent
-    repo_root = here.parents[2] if len(here.parents) >= 2 else Path.cwd()
-    candidates = [
-        here / 'random_forest_model.joblib',
-        here.parent / 'pages' / 'random_forest_model.joblib',
-        repo_root / 'web' / 'pages' / 'random_forest_model.joblib',
-        repo_root / 'src' / 'models' / 'trained_models' / 'random_forest_model.joblib',
-    ]
-    for p in candidates:
-        if p.exists():
-            return joblib.load(p)
-    st.error("Couldn't find random_forest_model.joblib. Tried: " + ", ".join(str(p) for p in candidates))
-    raise FileNotFoundError("random_forest_model.joblib not found in expected locations")
+    try:
+        return load_cached('random_forest', mmap=True)
+    except LookupError as e:
+        st.error(str(e))
+        raise
 
 def predict_planet(model, planet_data):
-    # Model trained on 5 features in this exact order:
-    # ['koi_prad','koi_dor','koi_period','koi_duration','koi_depth']
-    x = [[
-        planet_data.get('koi_prad', 0.0),
-        planet_data.get('koi_dor', 0.0),
-        planet_data.get('koi_period', 0.0),
-        planet_data.get('koi_duration', 0.0),
-        planet_data.get('koi_depth', 0.0),
-    ]]
+    # The registered model puts these in its manifest's feature order; a feature
+    # the game did not generate raises KeyError instead of being guessed.
+    x = {col: planet_data[col] for col in model.features}
     pred_raw = model.predict(x)[0]
     proba = model.predict_proba(x)[0]
     classes = list(getattr(model,'classes_',[]))